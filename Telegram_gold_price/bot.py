@@ -1,6 +1,10 @@
 # bot.py
+import asyncio
 import logging
-from telegram import Update, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram import (
+    Update, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton,
+    InputMediaPhoto, InputMediaDocument
+)
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -11,8 +15,17 @@ from telegram.ext import (
     CallbackQueryHandler
 )
 from telegram.constants import ParseMode
-from config import BOT_TOKEN, ADMIN_IDS, MANAGER_NAME, MANAGER_CHAT_ID
+from config import (
+    BOT_TOKEN, ADMIN_IDS, MANAGER_NAME, MANAGER_CHAT_ID,
+    BROADCAST_RATE, BROADCAST_CONCURRENCY, BROADCAST_PER_CHAT_INTERVAL, BROADCAST_PROGRESS_INTERVAL,
+    FORWARD_TEXT_WINDOW, FORWARD_ALBUM_WINDOW,
+    BOT_MODE, WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_QUEUE_SIZE
+)
 from database import Database
+from broadcast import Broadcaster
+from broadcast_jobs import BroadcastJobStore
+from forwarding import BurstBuffer
+from webhook import run_webhook
 
 # Настройка логирования
 logging.basicConfig(
@@ -37,6 +50,10 @@ BLACKLIST = [5043662171, 66472916]  # ID заблокированных поль
 # Инициализация базы данных
 db = Database()
 
+# Незавершенные рассылки (переживают перезапуск) и рассылки, идущие сейчас
+broadcast_jobs = BroadcastJobStore(db)
+running_broadcasts = {}  # id рассылки -> (Broadcaster, asyncio.Task)
+
 
 # ============ ОБЩИЕ ФУНКЦИИ ============
 
@@ -50,42 +67,101 @@ def is_blocked(user_id):
     return user_id in BLACKLIST
 
 
+# Кэш отрисованного сообщения с ценами: перестраивается только при смене версии цен
+_price_message_cache = {"version": None, "text": None}
+
+
 def format_prices():
-    """Форматирует цены для сообщение"""
-    gold_price_NDS = db.get_gold_price_NDS()
-    gold_price_no_NDS = db.get_gold_price_no_NDS()
-    silver_price_NDS = db.get_silver_price_NDS()
-    silver_price_no_NDS = db.get_silver_price_no_NDS()
+    """Возвращает сообщение с ценами из кэша"""
+    return price_message()[1]
 
-    message = "💰 *Добрый день! Предлагаем аффинированный металл в гранулах 999,9:*\n\n"
 
-    if gold_price_NDS > 0:
-        message += f"• Золото c НДС: *{gold_price_NDS}* руб./г\n"
-    else:
-        message += "• Золото c НДС: *нет в продаже*\n"
+def price_message():
+    """Возвращает (версия цен, текст сообщения), перерисовывая текст только после изменения цен"""
+    if _price_message_cache["version"] != db.prices_version:
+        _price_message_cache["text"] = render_prices()
+        _price_message_cache["version"] = db.prices_version
+    return _price_message_cache["version"], _price_message_cache["text"]
 
-    if gold_price_no_NDS > 0:
-        message += f"• Золото без НДС: *{gold_price_no_NDS}* руб./г\n"
-    else:
-        message += "• Золото без НДС: *нет в продаже*\n"
 
-    if silver_price_NDS > 0:
-        message += f"• Серебро c НДС: *{silver_price_NDS}* руб./г\n"
-    else:
-        message += "• Серебро c НДС: *нет в продаже*\n"
+# Строки сообщения с ценами: (ключ в базе, подпись)
+PRICE_LINES = [
+    ("gold_price_nds", "Золото c НДС"),
+    ("gold_price_no_nds", "Золото без НДС"),
+    ("silver_price_nds", "Серебро c НДС"),
+    ("silver_price_no_nds", "Серебро без НДС"),
+]
 
-    if silver_price_no_NDS > 0:
-        message += f"• Серебро без НДС: *{silver_price_no_NDS}* руб./г\n"
-    else:
-        message += "• Серебро без НДС: *нет в продаже*\n"
+# Кэш сообщения об изменениях: зависит и от текущих цен, и от цен последней рассылки
+_changes_message_cache = {"version": None, "text": None}
 
-    # Добавляем информацию о менеджере
-    message += "\n📞 *Для заказа можно*\n"
+
+def price_line(label, price):
+    """Строка с ценой одного металла"""
+    if price > 0:
+        return f"• {label}: *{price}* руб./г\n"
+    return f"• {label}: *нет в продаже*\n"
+
+
+def manager_footer():
+    """Информация о менеджере в конце сообщения"""
+    message = "\n📞 *Для заказа можно*\n"
     message += f"👉 [НАПИСАТЬ МЕНЕДЖЕРУ](https://t.me/{MANAGER_NAME}) 👈\n\n"
+    return message
+
+
+def render_prices():
+    """Форматирует цены для сообщение"""
+    prices = db.get_prices()
+
+    message = "💰 *Добрый день! Предлагаем аффинированный металл в гранулах 999,9:*\n\n"
+    for key, label in PRICE_LINES:
+        message += price_line(label, prices[key])
+
+    # Добавляем информацию о менеджере
+    message += manager_footer()
 
     return message
 
 
+def changed_prices():
+    """Ключи цен, изменившихся с последней рассылки"""
+    previous = db.get_broadcast_prices()
+    current = db.get_prices()
+    return [key for key, _ in PRICE_LINES if current[key] != previous.get(key)]
+
+
+def changes_message():
+    """Возвращает (версия, текст) сообщения только с изменившимися ценами"""
+    version = (db.prices_version, db.broadcast_prices_version)
+    if _changes_message_cache["version"] != version:
+        _changes_message_cache["text"] = render_price_changes()
+        _changes_message_cache["version"] = version
+    return _changes_message_cache["version"], _changes_message_cache["text"]
+
+
+def render_price_changes():
+    """Форматирует только изменившиеся цены с предыдущим значением"""
+    previous = db.get_broadcast_prices()
+    current = db.get_prices()
+    changed = changed_prices()
+    if not changed:
+        # Цены вернулись к разосланным - отправляем полный прайс
+        return render_prices()
+
+    message = "💰 *Изменение цен на аффинированный металл 999,9:*\n\n"
+    for key, label in PRICE_LINES:
+        if key not in changed:
+            continue
+        message += price_line(label, current[key])
+        old_price = previous.get(key)
+        if old_price is not None:
+            message += f"   _было: {old_price if old_price > 0 else 'нет в продаже'}_\n"
+
+    message += manager_footer()
+    return message
+
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /start"""
     user_id = update.effective_user.id
@@ -127,7 +203,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Меню для администратора
         keyboard = [
             [KeyboardButton("💰 Поменять цену")],
-            [KeyboardButton("📢 Сделать рассылку")]
+            [KeyboardButton("📢 Сделать рассылку")],
+            [KeyboardButton("📢 Разослать изменения")],
+            [KeyboardButton("⛔ Остановить рассылку")]
         ]
         reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
         await update.message.reply_text(
@@ -136,7 +214,10 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
     else:
         # Меню для обычного пользователя
-        keyboard = [[KeyboardButton("💰 Узнать актуальную цену")]]
+        keyboard = [
+            [KeyboardButton("💰 Узнать актуальную цену")],
+            [KeyboardButton("📈 Цена за неделю"), KeyboardButton("📈 Цена за месяц")]
+        ]
         reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
         await update.message.reply_text(
             "👋 Добро пожаловать! Я бот для отслеживания цен на драгоценные металлы.\n\n"
@@ -162,11 +243,35 @@ def escape_markdown(text):
     return text
 
 
+def user_header(user, date):
+    """Шапка сообщения менеджеру с данными пользователя"""
+    user_name = user.full_name or "Неизвестный пользователь"
+    username = user.username or "без username"
+    return (
+        f"👤 *Имя:* {escape_markdown(user_name)}\n"
+        f"🆔 *ID:* `{user.id}`\n"
+        f"📝 *Username:* @{username if username != 'без username' else 'отсутствует'}\n"
+        f"📅 *Время:* {date.strftime('%d.%m.%Y %H:%M:%S')}\n\n"
+    )
+
+
+def write_to_user_keyboard(user, suffix=""):
+    """Инлайн-кнопка для быстрого перехода к диалогу с пользователем"""
+    user_name = user.full_name or "Неизвестный пользователь"
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(
+            f"💬 Написать {user_name[:20]} {suffix}",
+            url=f"tg://user?id={user.id}"
+        )]
+    ])
+
+
 async def forward_to_manager(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Перенаправляет сообщения пользователей менеджеру"""
+    """Перенаправляет сообщения пользователей менеджеру.
+
+    Несколько сообщений подряд от одного пользователя объединяются в одно уведомление.
+    """
     user_id = update.effective_user.id
-    user_name = update.effective_user.full_name or "Неизвестный пользователь"
-    username = update.effective_user.username or "без username"
 
     # Пропускаем администраторов
     if check_admin(user_id):
@@ -180,56 +285,53 @@ async def forward_to_manager(update: Update, context: ContextTypes.DEFAULT_TYPE)
         )
         return
 
-    # Получаем текст сообщения
-    if update.message.text:
-        message_text = update.message.text
-    elif update.message.caption:
-        message_text = update.message.caption
-    else:
-        message_text = "Сообщение без текста"
+    text_bursts.add(user_id, (update, context))
+
+
+async def send_text_burst(user_id, items):
+    """Отправляет менеджеру одно уведомление на серию сообщений пользователя"""
+    first_update, context = items[0]
+    last_update = items[-1][0]
+    user = first_update.effective_user
+    user_name = user.full_name or "Неизвестный пользователь"
+
+    # Получаем тексты сообщений
+    texts = []
+    for update, _ in items:
+        if update.message.text:
+            texts.append(update.message.text)
+        elif update.message.caption:
+            texts.append(update.message.caption)
+        else:
+            texts.append("Сообщение без текста")
+    message_text = "\n\n".join(texts)
+
+    title = "📨 *НОВОЕ СООБЩЕНИЕ ОТ ПОЛЬЗОВАТЕЛЯ*" if len(items) == 1 \
+        else f"📨 *НОВЫЕ СООБЩЕНИЯ ОТ ПОЛЬЗОВАТЕЛЯ ({len(items)})*"
 
     # Создаем сообщение для менеджера
     manager_message = (
-        f"📨 *НОВОЕ СООБЩЕНИЕ ОТ ПОЛЬЗОВАТЕЛЯ*\n\n"
-        f"👤 *Имя:* {escape_markdown(user_name)}\n"
-        f"🆔 *ID:* `{user_id}`\n"
-        f"📝 *Username:* @{username if username != 'без username' else 'отсутствует'}\n"
-        f"📅 *Время:* {update.message.date.strftime('%d.%m.%Y %H:%M:%S')}\n\n"
+        f"{title}\n\n"
+        f"{user_header(user, first_update.message.date)}"
         f"💬 *Сообщение:*\n```\n{escape_markdown(message_text)}\n```\n\n"
     )
 
-    # Добавляем информацию о прикрепленных файлах
-    if update.message.photo:
-        manager_message += f"📎 *Прикреплено:* {len(update.message.photo)} фото\n"
-    if update.message.document:
-        doc_name = escape_markdown(
-            update.message.document.file_name) if update.message.document.file_name else "Неизвестный файл"
-        manager_message += f"📎 *Прикреплен документ:* {doc_name}\n"
-
-    # Создаем инлайн-кнопку для быстрого перехода к диалогу с пользователем
-    reply_keyboard = InlineKeyboardMarkup([
-        [InlineKeyboardButton(
-            f"💬 Написать {user_name[:20]} ",
-            url=f"tg://user?id={user_id}"
-        )]
-    ])
-
     try:
         # Отправляем сообщение менеджеру по chat_id
         await context.bot.send_message(
             chat_id=MANAGER_CHAT_ID,
             text=manager_message,
             parse_mode='Markdown',
-            reply_markup=reply_keyboard
+            reply_markup=write_to_user_keyboard(user)
         )
 
-        # Уведомляем пользователя
-        await update.message.reply_text(
+        # Уведомляем пользователя один раз на всю серию
+        await last_update.message.reply_text(
             "✅ Ваше сообщение отправлено менеджеру! Он свяжется с вами в ближайшее время.\n\n"
             f"Также вы можете написать напрямую: @{MANAGER_NAME}"
         )
 
-        logger.info(f"Сообщение от пользователя {user_id} ({user_name}) перенаправлено менеджеру")
+        logger.info(f"Сообщения от пользователя {user_id} ({user_name}) перенаправлены менеджеру: {len(items)}")
 
     except Exception as e:
         logger.error(f"Ошибка при отправке сообщения менеджеру: {e}")
@@ -238,9 +340,10 @@ async def forward_to_manager(update: Update, context: ContextTypes.DEFAULT_TYPE)
         logger.error(f"Детали ошибки: {error_details}")
 
         logger.error(
-            f"Пользователь: {user_name} (ID: {user_id}), Время: {update.message.date}, Сообщение: {message_text[:100]}...")
+            f"Пользователь: {user_name} (ID: {user_id}), Время: {first_update.message.date}, "
+            f"Сообщение: {message_text[:100]}...")
 
-        await update.message.reply_text(
+        await last_update.message.reply_text(
             f"❌ К сожалению, не удалось отправить сообщение автоматически.\n\n"
             f"Пожалуйста, напишите менеджеру напрямую: @{MANAGER_NAME}\n"
             f"Ошибка: {error_details[:100]}..." if len(error_details) > 100 else f"Ошибка: {error_details}"
@@ -248,10 +351,11 @@ async def forward_to_manager(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
 
 async def forward_media_to_manager(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Перенаправляет медиафайлы менеджеру"""
+    """Перенаправляет медиафайлы менеджеру.
+
+    Альбомы (сообщения с общим media_group_id) собираются и пересылаются одной группой.
+    """
     user_id = update.effective_user.id
-    user_name = update.effective_user.full_name or "Неизвестный пользователь"
-    username = update.effective_user.username or "без username"
 
     # Пропускаем администраторов
     if check_admin(user_id):
@@ -265,25 +369,37 @@ async def forward_media_to_manager(update: Update, context: ContextTypes.DEFAULT
         )
         return
 
+    if update.message.media_group_id:
+        album_bursts.add(update.message.media_group_id, (update, context))
+    else:
+        await send_media_burst(None, [(update, context)])
+
+
+def input_media(message):
+    """Превращает сообщение с фото или документом в элемент медиагруппы"""
+    if message.photo:
+        return InputMediaPhoto(media=message.photo[-1].file_id)
+    return InputMediaDocument(media=message.document.file_id)
+
+
+async def send_media_burst(media_group_id, items):
+    """Отправляет менеджеру одну шапку и все медиа альбома одной группой"""
+    first_update, context = items[0]
+    last_update = items[-1][0]
+    user = first_update.effective_user
+    username = user.username or "без username"
+
     # Создаем текстовое сообщение для менеджера
     manager_message = (
         f"📨 *НОВОЕ МЕДИАСООБЩЕНИЕ ОТ ПОЛЬЗОВАТЕЛЯ*\n\n"
-        f"👤 *Имя:* {escape_markdown(user_name)}\n"
-        f"🆔 *ID:* `{user_id}`\n"
-        f"📝 *Username:* @{username if username != 'без username' else 'отсутствует'}\n"
-        f"📅 *Время:* {update.message.date.strftime('%d.%m.%Y %H:%M:%S')}\n\n"
+        f"{user_header(user, first_update.message.date)}"
     )
 
-    if update.message.caption:
-        manager_message += f"📝 *Подпись:* {escape_markdown(update.message.caption)}\n\n"
-
-    # Создаем инлайн-кнопку для быстрого перехода к диалогу с пользователем
-    reply_keyboard = InlineKeyboardMarkup([
-        [InlineKeyboardButton(
-            f"💬 Написать {user_name[:20]} напрямую",
-            url=f"tg://user?id={user_id}"
-        )]
-    ])
+    captions = [update.message.caption for update, _ in items if update.message.caption]
+    if captions:
+        manager_message += f"📝 *Подпись:* {escape_markdown(' '.join(captions))}\n\n"
+    if len(items) > 1:
+        manager_message += f"📎 *Файлов в альбоме:* {len(items)}\n"
 
     try:
         # Сначала отправляем текстовое сообщение менеджеру
@@ -291,25 +407,35 @@ async def forward_media_to_manager(update: Update, context: ContextTypes.DEFAULT
             chat_id=MANAGER_CHAT_ID,
             text=manager_message,
             parse_mode='Markdown',
-            reply_markup=reply_keyboard
+            reply_markup=write_to_user_keyboard(user, "напрямую")
         )
 
         # Затем пересылаем само медиа
-        if update.message.photo:
-            await context.bot.send_photo(
-                chat_id=MANAGER_CHAT_ID,
-                photo=update.message.photo[-1].file_id,
-                caption=f"Фото от @{username if username != 'без username' else 'пользователя'}"
-            )
-        elif update.message.document:
-            await context.bot.send_document(
-                chat_id=MANAGER_CHAT_ID,
-                document=update.message.document.file_id,
-                caption=f"Документ от @{username if username != 'без username' else 'пользователя'}"
-            )
-
-        # Уведомляем пользователя
-        await update.message.reply_text(
+        messages = [update.message for update, _ in items]
+        if len(messages) == 1:
+            message = messages[0]
+            if message.photo:
+                await context.bot.send_photo(
+                    chat_id=MANAGER_CHAT_ID,
+                    photo=message.photo[-1].file_id,
+                    caption=f"Фото от @{username if username != 'без username' else 'пользователя'}"
+                )
+            elif message.document:
+                await context.bot.send_document(
+                    chat_id=MANAGER_CHAT_ID,
+                    document=message.document.file_id,
+                    caption=f"Документ от @{username if username != 'без username' else 'пользователя'}"
+                )
+        else:
+            # Документы нельзя смешивать с фото в одной группе, в группе не больше 10 элементов
+            photos = [input_media(message) for message in messages if message.photo]
+            documents = [input_media(message) for message in messages if not message.photo]
+            for media in (photos, documents):
+                for start in range(0, len(media), 10):
+                    await context.bot.send_media_group(chat_id=MANAGER_CHAT_ID, media=media[start:start + 10])
+
+        # Уведомляем пользователя один раз на весь альбом
+        await last_update.message.reply_text(
             "✅ Ваши файлы отправлены менеджеру! Он свяжется с вами в ближайшее время.\n\n"
             f"Также вы можете написать напрямую: @{MANAGER_NAME}"
         )
@@ -318,12 +444,17 @@ async def forward_media_to_manager(update: Update, context: ContextTypes.DEFAULT
         logger.error(f"Ошибка при отправке медиа менеджеру: {e}")
         logger.error(f"Детали ошибки: {str(e)}")
 
-        await update.message.reply_text(
+        await last_update.message.reply_text(
             f"❌ К сожалению, не удалось отправить файлы автоматически.\n\n"
             f"Пожалуйста, напишите менеджеру напрямую: @{MANAGER_NAME}"
         )
 
 
+# Серии сообщений пользователей и части альбомов копятся и отправляются менеджеру пачкой
+text_bursts = BurstBuffer(FORWARD_TEXT_WINDOW, send_text_burst)
+album_bursts = BurstBuffer(FORWARD_ALBUM_WINDOW, send_media_burst)
+
+
 # ============ ФУНКЦИИ ДЛЯ АДМИНИСТРАТОРА ============
 
 async def admin_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -334,7 +465,9 @@ async def admin_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     keyboard = [
         [KeyboardButton("💰 Поменять цену")],
-        [KeyboardButton("📢 Сделать рассылку")]
+        [KeyboardButton("📢 Сделать рассылку")],
+        [KeyboardButton("📢 Разослать изменения")],
+        [KeyboardButton("⛔ Остановить рассылку")]
     ]
     reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
     await update.message.reply_text("Выберите действие:", reply_markup=reply_markup)
@@ -525,31 +658,96 @@ async def admin_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("⛔ У вас нет прав администратора!")
         return
 
-    message = format_prices()
+    job = broadcast_jobs.create(update.effective_chat.id)
+    start_broadcast(context.bot, job)
 
-    users = db.get_all_users()
-    success_count = 0
-    error_count = 0
 
-    await update.message.reply_text(f"📤 Начинаю рассылку для {len(users)} пользователей...")
+async def admin_broadcast_changes(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Кнопка 'Разослать изменения' - рассылка только изменившихся с прошлой рассылки цен"""
+    if not check_admin(update.effective_user.id):
+        await update.message.reply_text("⛔ У вас нет прав администратора!")
+        return
 
-    for user_id in users:
-        try:
-            await context.bot.send_message(
-                chat_id=user_id,
-                text=message,
-                parse_mode='Markdown'
-            )
-            success_count += 1
-        except Exception as e:
-            logger.error(f"Ошибка при отправке пользователю {user_id}: {e}")
-            error_count += 1
+    if not changed_prices():
+        await update.message.reply_text("ℹ️ Цены не менялись с последней рассылки")
+        return
 
-    await update.message.reply_text(
-        f"✅ Рассылка завершена!\n"
-        f"Успешно отправлено: {success_count}\n"
-        f"Не удалось отправить: {error_count}"
+    job = broadcast_jobs.create(update.effective_chat.id, kind="changes")
+    start_broadcast(context.bot, job)
+
+
+def start_broadcast(bot, job):
+    """Запускает рассылку в фоне, чтобы бот продолжал обрабатывать другие обновления"""
+    broadcaster = Broadcaster(
+        bot,
+        rate=BROADCAST_RATE,
+        concurrency=BROADCAST_CONCURRENCY,
+        per_chat_interval=BROADCAST_PER_CHAT_INTERVAL,
+        progress_interval=BROADCAST_PROGRESS_INTERVAL
     )
+    task = asyncio.create_task(run_broadcast(broadcaster, job))
+    running_broadcasts[job.id] = (broadcaster, task)
+
+
+async def run_broadcast(broadcaster, job):
+    """Рассылка цен с сохранением прогресса.
+
+    Текст берется из price_message() (или changes_message() для рассылки изменений):
+    если цены поменяются во время рассылки, оставшиеся пользователи получат уже
+    новый текст. Курсор и обработанные ID сохраняются каждую секунду, поэтому
+    после перезапуска рассылка продолжится без повторов.
+    """
+    try:
+        users = job.targets(db.get_all_users())
+        message_source = changes_message if job.kind == "changes" else price_message
+        result = await broadcaster.run(
+            users, message_source,
+            parse_mode='Markdown',
+            progress_chat_id=job.admin_chat_id,
+            # заблокировавшие бота удаляются одним пакетом в конце, вместе с найденными
+            # до перезапуска (они уже за курсором и в dead_chats не попадут)
+            prune=lambda dead_chats: db.remove_users(set(job.dead).union(dead_chats)),
+            on_done=job.mark_done,
+            checkpoint=broadcast_jobs.save
+        )
+
+        if result.cancelled and job.status == "running":
+            # Бот останавливается: рассылка продолжится после перезапуска
+            logger.info(f"Рассылка {job.id} приостановлена, отправлено {job.sent}")
+        else:
+            broadcast_jobs.finish(job, "cancelled" if result.cancelled else "done")
+            if not result.cancelled:
+                # Запоминаем разосланные цены - следующая рассылка изменений считается от них
+                db.set_broadcast_prices(db.get_prices())
+        await broadcast_jobs.save()
+
+        logger.info(
+            f"Рассылка {job.id}: {result.sent}/{result.total} за {result.elapsed:.1f} с, "
+            f"ошибок: {result.failed}, повторов: {result.retries}, удалено подписчиков: {result.pruned}"
+        )
+    except Exception as e:
+        logger.error(f"Ошибка рассылки {job.id}: {e}")
+    finally:
+        running_broadcasts.pop(job.id, None)
+
+
+async def admin_cancel_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Кнопка 'Остановить рассылку' для админа"""
+    if not check_admin(update.effective_user.id):
+        await update.message.reply_text("⛔ У вас нет прав администратора!")
+        return
+
+    if not running_broadcasts:
+        await update.message.reply_text("ℹ️ Сейчас нет активных рассылок")
+        return
+
+    for job_id, (broadcaster, _) in list(running_broadcasts.items()):
+        job = broadcast_jobs.jobs.get(job_id)
+        if job:
+            job.status = "cancelled"
+        broadcaster.cancel()
+
+    await update.message.reply_text("⛔ Останавливаю рассылку...")
 
 
 # ============ ФУНКЦИИ ДЛЯ ПОЛЬЗОВАТЕЛЯ ============
@@ -571,12 +769,35 @@ async def user_get_price(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 
+async def user_price_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Кнопки 'Цена за неделю' и 'Цена за месяц' - график по истории цен"""
+    if is_blocked(update.effective_user.id):
+        await update.message.reply_text(
+            "❌ Бот неисправен",
+            parse_mode='Markdown'
+        )
+        return
+
+    if update.message.text.endswith("неделю"):
+        message = db.history.chart(7, "Цена за неделю")
+    else:
+        message = db.history.chart(30, "Цена за месяц")
+
+    await update.message.reply_text(
+        message,
+        parse_mode='Markdown'
+    )
+
+
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Отмена операции"""
     if check_admin(update.effective_user.id):
         await admin_menu(update, context)
     else:
-        keyboard = [[KeyboardButton("💰 Узнать актуальную цену")]]
+        keyboard = [
+            [KeyboardButton("💰 Узнать актуальную цену")],
+            [KeyboardButton("📈 Цена за неделю"), KeyboardButton("📈 Цена за месяц")]
+        ]
         reply_markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
         await update.message.reply_text("Операция отменена.", reply_markup=reply_markup)
 
@@ -585,10 +806,51 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # ============ ОСНОВНАЯ ФУНКЦИЯ ============
 
+async def on_startup(application: Application):
+    """Возобновляем рассылки, прерванные остановкой или падением бота"""
+    for job in broadcast_jobs.running():
+        try:
+            await application.bot.send_message(
+                job.admin_chat_id,
+                f"♻️ Возобновляю прерванную рассылку (уже отправлено: {job.sent})"
+            )
+        except Exception as e:
+            logger.error(f"Не удалось уведомить админа {job.admin_chat_id}: {e}")
+        start_broadcast(application.bot, job)
+
+
+async def on_stop(application: Application):
+    """Отправляем менеджеру накопленные сообщения, приостанавливаем идущие рассылки
+    и сохраняем их прогресс"""
+    await asyncio.gather(text_bursts.flush_all(), album_bursts.flush_all())
+
+    tasks = []
+    for broadcaster, task in list(running_broadcasts.values()):
+        broadcaster.cancel()
+        tasks.append(task)
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def on_shutdown(application: Application):
+    """Сбрасываем несохраненные изменения базы при остановке бота"""
+    db.close()
+    logger.info(f"Статистика сохранения базы: {db.persistence_stats()}")
+
+
 def main():
     """Запуск бота"""
     # Создаем приложение
-    application = Application.builder().token(BOT_TOKEN).build()
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .post_init(on_startup)
+        .post_stop(on_stop)
+        .post_shutdown(on_shutdown)
+    )
+    if BOT_MODE == "webhook":
+        # Обновления принимает свой сервер вебхука, очередь ограничена по размеру
+        builder = builder.update_queue(asyncio.Queue(maxsize=WEBHOOK_QUEUE_SIZE)).updater(None)
+    application = builder.build()
 
     # ConversationHandler для изменения цен
     conv_handler = ConversationHandler(
@@ -624,9 +886,12 @@ def main():
 
     # Обработчик рассылки
     application.add_handler(MessageHandler(filters.Regex("^📢 Сделать рассылку$"), admin_broadcast))
+    application.add_handler(MessageHandler(filters.Regex("^📢 Разослать изменения$"), admin_broadcast_changes))
+    application.add_handler(MessageHandler(filters.Regex("^⛔ Остановить рассылку$"), admin_cancel_broadcast))
 
     # Обработчик для пользователей
     application.add_handler(MessageHandler(filters.Regex("^💰 Узнать актуальную цену$"), user_get_price))
+    application.add_handler(MessageHandler(filters.Regex("^📈 Цена за (неделю|месяц)$"), user_price_history))
 
     # Обработчик для возврата в меню админа
     application.add_handler(CommandHandler("menu", admin_menu))
@@ -637,7 +902,10 @@ def main():
         filters.TEXT & ~filters.COMMAND &
         ~filters.Regex("^💰 Поменять цену$") &
         ~filters.Regex("^📢 Сделать рассылку$") &
+        ~filters.Regex("^📢 Разослать изменения$") &
+        ~filters.Regex("^⛔ Остановить рассылку$") &
         ~filters.Regex("^💰 Узнать актуальную цену$") &
+        ~filters.Regex("^📈 Цена за (неделю|месяц)$") &
         ~filters.Regex("^❌ Отмена$"),
         forward_to_manager
     ))
@@ -649,8 +917,14 @@ def main():
     ))
 
     # Запускаем бота
-    print("Бот запущен...")
-    application.run_polling(allowed_updates=Update.ALL_TYPES, close_loop=False)
+    if BOT_MODE == "webhook":
+        print(f"Бот запущен (вебхук {WEBHOOK_URL}{WEBHOOK_PATH})...")
+        asyncio.run(run_webhook(
+            application, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_URL
+        ))
+    else:
+        print("Бот запущен...")
+        application.run_polling(allowed_updates=Update.ALL_TYPES, close_loop=False)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,377 @@
+# broadcast.py
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
+
+logger = logging.getLogger(__name__)
+
+# Ошибки BadRequest, после которых чат считается мертвым
+DEAD_CHAT_ERRORS = ("chat not found", "user not found", "peer_id_invalid")
+
+
+# ============ ОГРАНИЧИТЕЛИ СКОРОСТИ ============
+
+class TokenBucket:
+    """Глобальный ограничитель скорости отправки (token bucket)"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds):
+        """Останавливает выдачу токенов (например, после RetryAfter от Telegram)"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+    async def acquire(self):
+        """Ждет, пока появится свободный токен, и забирает его"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    self.updated = time.monotonic()
+                    continue
+
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class ChatLimiter:
+    """Ограничение частоты сообщений в один чат"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.next_allowed = {}
+
+    async def wait(self, chat_id):
+        now = time.monotonic()
+        allowed_at = self.next_allowed.get(chat_id, 0.0)
+        self.next_allowed[chat_id] = max(now, allowed_at) + self.interval
+        if allowed_at > now:
+            await asyncio.sleep(allowed_at - now)
+
+
+def is_dead_chat(error):
+    """Пользователь заблокировал бота, удалил аккаунт или чат не существует"""
+    if isinstance(error, Forbidden):
+        return True
+    if isinstance(error, BadRequest):
+        message = str(error).lower()
+        return any(reason in message for reason in DEAD_CHAT_ERRORS)
+    return False
+
+
+def retry_after_seconds(error):
+    """Возвращает задержку из RetryAfter в секундах (int или timedelta в разных версиях PTB)"""
+    delay = error.retry_after
+    if isinstance(delay, timedelta):
+        return delay.total_seconds()
+    return float(delay)
+
+
+# ============ РАССЫЛКА ============
+
+@dataclass
+class BroadcastResult:
+    """Итоги рассылки"""
+    total: int = 0
+    sent: int = 0
+    failed: int = 0
+    retries: int = 0
+    flood_waits: int = 0
+    message_updates: int = 0
+    dead_chats: list = field(default_factory=list)
+    pruned: int = 0
+    saved_seconds: float = 0.0
+    cancelled: bool = False
+    started: float = field(default_factory=time.monotonic)
+    finished: float = 0.0
+
+    @property
+    def done(self):
+        return self.sent + self.failed
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def throughput(self):
+        return self.done / self.elapsed if self.elapsed > 0 else 0.0
+
+    def progress_text(self):
+        percent = round(self.done / self.total * 100) if self.total else 100
+        return (
+            f"📤 Рассылка: {self.done}/{self.total} ({percent}%)\n"
+            f"Успешно: {self.sent}, ошибок: {self.failed}\n"
+            f"Скорость: {self.throughput:.1f} сообщ./с"
+        )
+
+    def summary_text(self):
+        title = "⛔ Рассылка остановлена" if self.cancelled else "✅ Рассылка завершена!"
+        text = (
+            f"{title}\n"
+            f"Успешно отправлено: {self.sent}\n"
+            f"Не удалось отправить: {self.failed}\n"
+        )
+        if self.message_updates:
+            text += f"Сообщение обновлялось во время рассылки: {self.message_updates} раз(а)\n"
+        text += f"Время: {self.elapsed:.1f} с ({self.throughput:.1f} сообщ./с)"
+        if self.pruned:
+            text += (
+                f"\n🧹 Удалено неактивных подписчиков: {self.pruned}\n"
+                f"Следующая рассылка будет быстрее на ~{self.saved_seconds:.1f} с"
+            )
+        return text
+
+
+class Broadcaster:
+    """Конкурентная рассылка с глобальным и поканальным ограничением скорости"""
+
+    def __init__(self, bot, rate=30, concurrency=20, per_chat_interval=1.0,
+                 max_retries=3, progress_interval=3.0, checkpoint_interval=1.0):
+        self.bot = bot
+        self.bucket = TokenBucket(rate)
+        self.chat_limiter = ChatLimiter(per_chat_interval)
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.progress_interval = progress_interval
+        self.checkpoint_interval = checkpoint_interval
+        self.cancelled = False
+        self._message_source = None
+        self._message_version = None
+        self._on_done = None
+
+    def cancel(self):
+        """Останавливает рассылку: неотправленные сообщения пропускаются"""
+        self.cancelled = True
+
+    def _current_text(self, result):
+        """Текущий текст рассылки: источник сообщает версию, при смене версии берем новый текст"""
+        version, text = self._message_source()
+        if version != self._message_version:
+            if self._message_version is not None:
+                logger.info("Сообщение изменилось во время рассылки, отправляем новую версию")
+                result.message_updates += 1
+            self._message_version = version
+        return text
+
+    async def run(self, chat_ids, text, parse_mode=None, progress_chat_id=None, prune=None,
+                  on_done=None, checkpoint=None):
+        """Отправляет text во все chat_ids и возвращает BroadcastResult.
+
+        text - строка или функция без аргументов, возвращающая (версия, текст).
+        prune - функция, получающая список мертвых чатов одним пакетом и
+        возвращающая число удаленных подписчиков.
+        on_done(chat_id, outcome) - вызывается, когда по чату получен окончательный
+        результат: "sent", "failed" или "dead".
+        checkpoint - корутина без аргументов, вызывается каждые checkpoint_interval
+        секунд и в конце рассылки (для сохранения прогресса).
+        """
+        chat_ids = list(chat_ids)
+        result = BroadcastResult(total=len(chat_ids))
+        self._on_done = on_done
+
+        if callable(text):
+            self._message_source = text
+        else:
+            self._message_source = lambda: (0, text)
+        self._message_version = None
+
+        queue = asyncio.Queue()
+        for chat_id in chat_ids:
+            queue.put_nowait((chat_id, 0))
+
+        progress_message = None
+        if progress_chat_id is not None:
+            progress_message = await self.bot.send_message(progress_chat_id, result.progress_text())
+
+        workers = [
+            asyncio.create_task(self._worker(queue, parse_mode, result))
+            for _ in range(min(self.concurrency, len(chat_ids)) or 1)
+        ]
+        background = []
+        if progress_message:
+            background.append(asyncio.create_task(self._progress_loop(progress_message, result)))
+        if checkpoint:
+            background.append(asyncio.create_task(self._checkpoint_loop(checkpoint)))
+
+        try:
+            await queue.join()
+        finally:
+            for task in workers + background:
+                task.cancel()
+            await asyncio.gather(*workers, *background, return_exceptions=True)
+            result.finished = time.monotonic()
+            result.cancelled = self.cancelled
+            if checkpoint:
+                await checkpoint()
+
+        if prune:
+            result.pruned = prune(result.dead_chats)
+            # Каждый удаленный чат экономил один токен ограничителя в следующей рассылке
+            result.saved_seconds = result.pruned / self.bucket.rate
+
+        if progress_message:
+            await self._edit_progress(progress_message, result.summary_text())
+        return result
+
+    async def _worker(self, queue, parse_mode, result):
+        while True:
+            chat_id, attempt = await queue.get()
+            try:
+                if not self.cancelled:
+                    await self._send_one(queue, chat_id, attempt, parse_mode, result)
+            finally:
+                queue.task_done()
+
+    def _finish(self, chat_id, outcome, result):
+        """Фиксирует окончательный результат отправки в чат"""
+        if outcome == "sent":
+            result.sent += 1
+        else:
+            result.failed += 1
+            if outcome == "dead":
+                result.dead_chats.append(chat_id)
+        if self._on_done:
+            self._on_done(chat_id, outcome)
+
+    async def _send_one(self, queue, chat_id, attempt, parse_mode, result):
+        await self.bucket.acquire()
+        await self.chat_limiter.wait(chat_id)
+        try:
+            await self.bot.send_message(chat_id=chat_id, text=self._current_text(result), parse_mode=parse_mode)
+            self._finish(chat_id, "sent", result)
+        except RetryAfter as e:
+            # Флуд-контроль действует на весь бот: приостанавливаем всех
+            delay = retry_after_seconds(e)
+            logger.warning(f"Флуд-контроль Telegram, пауза {delay} с")
+            result.flood_waits += 1
+            self.bucket.pause(delay)
+            self._retry(queue, chat_id, attempt, result, e)
+        except (Forbidden, BadRequest) as e:
+            if is_dead_chat(e):
+                logger.info(f"Пользователь {chat_id} недоступен ({e}), будет удален из рассылки")
+                self._finish(chat_id, "dead", result)
+            else:
+                logger.error(f"Ошибка при отправке пользователю {chat_id}: {e}")
+                self._finish(chat_id, "failed", result)
+        except (TimedOut, NetworkError) as e:
+            # Временная ошибка сети: повторяем с нарастающей паузой
+            await asyncio.sleep(min(2 ** attempt, 10))
+            self._retry(queue, chat_id, attempt, result, e)
+        except Exception as e:
+            logger.error(f"Ошибка при отправке пользователю {chat_id}: {e}")
+            self._finish(chat_id, "failed", result)
+
+    def _retry(self, queue, chat_id, attempt, result, error):
+        if attempt >= self.max_retries:
+            logger.error(f"Не удалось отправить пользователю {chat_id} после {attempt + 1} попыток: {error}")
+            self._finish(chat_id, "failed", result)
+            return
+        result.retries += 1
+        queue.put_nowait((chat_id, attempt + 1))
+
+    async def _checkpoint_loop(self, checkpoint):
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            try:
+                await checkpoint()
+            except Exception as e:
+                logger.error(f"Не удалось сохранить прогресс рассылки: {e}")
+
+    async def _progress_loop(self, message, result):
+        last_done = -1
+        while True:
+            await asyncio.sleep(self.progress_interval)
+            if result.done != last_done:
+                last_done = result.done
+                await self._edit_progress(message, result.progress_text())
+
+    async def _edit_progress(self, message, text):
+        await self.bucket.acquire()
+        try:
+            await self.bot.edit_message_text(chat_id=message.chat_id, message_id=message.message_id, text=text)
+        except RetryAfter as e:
+            self.bucket.pause(retry_after_seconds(e))
+        except Exception as e:
+            logger.debug(f"Не удалось обновить прогресс рассылки: {e}")
+
+
+# ============ БЕНЧМАРК ============
+
+async def run_benchmark(users, rate, concurrency, latency, flood_rate, forbidden_rate, baseline):
+    """Рассылка через локальный фейковый Bot API с выводом пропускной способности"""
+    from telegram import Bot
+    from telegram.request import HTTPXRequest
+    from fake_bot_api import FakeBotAPI
+
+    api = FakeBotAPI(latency=latency, flood_rate=flood_rate, forbidden_rate=forbidden_rate)
+    await api.start()
+    bot = Bot(
+        token="123:FAKE",
+        base_url=f"{api.url}/bot",
+        request=HTTPXRequest(connection_pool_size=concurrency + 2)
+    )
+    await bot.initialize()
+
+    chat_ids = range(1, users + 1)
+    text = "💰 Тестовая рассылка цен"
+    try:
+        if baseline:
+            # Старое поведение: по одному сообщению без ограничителя
+            result = BroadcastResult(total=users)
+            for chat_id in chat_ids:
+                try:
+                    await bot.send_message(chat_id=chat_id, text=text)
+                    result.sent += 1
+                except Exception:
+                    result.failed += 1
+            result.finished = time.monotonic()
+        else:
+            broadcaster = Broadcaster(bot, rate=rate, concurrency=concurrency, progress_interval=1.0)
+            result = await broadcaster.run(chat_ids, text, progress_chat_id=0, prune=len)
+    finally:
+        await bot.shutdown()
+        await api.stop()
+
+    mode = "последовательно" if baseline else f"конкурентно (rate={rate}, concurrency={concurrency})"
+    print(f"Режим: {mode}")
+    print(f"Пользователей: {users}")
+    print(f"Время: {result.elapsed:.2f} с, пропускная способность: {result.throughput:.1f} сообщ./с")
+    print(f"Успешно: {result.sent}, ошибок: {result.failed} ({result.failed / users * 100:.1f}%)")
+    print(f"Повторов: {result.retries}, ответов 429: {api.stats['flood']}, ответов 403: {api.stats['forbidden']}")
+    print(f"Мертвых чатов: {len(result.dead_chats)}, экономия в следующей рассылке: {result.saved_seconds:.1f} с")
+    return result
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Бенчмарк рассылки против локального фейкового Bot API")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=30)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка ответа API, с")
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="доля случайных ответов 429")
+    parser.add_argument("--forbidden-rate", type=float, default=0.02, help="доля чатов, заблокировавших бота")
+    parser.add_argument("--baseline", action="store_true", help="старая последовательная рассылка")
+    args = parser.parse_args()
+
+    asyncio.run(run_benchmark(
+        args.users, args.rate, args.concurrency, args.latency,
+        args.flood_rate, args.forbidden_rate, args.baseline
+    ))
@@ -0,0 +1,101 @@
+# broadcast_jobs.py
+import asyncio
+import time
+import uuid
+
+
+class BroadcastJob:
+    """Сохраняемая рассылка: курсор по отсортированному списку подписчиков
+    и множество ID, обработанных за курсором"""
+
+    def __init__(self, record):
+        self.id = record["id"]
+        self.status = record.get("status", "running")
+        # full - полный прайс, changes - только изменившиеся с прошлой рассылки цены
+        self.kind = record.get("kind", "full")
+        self.admin_chat_id = record["admin_chat_id"]
+        self.created_at = record.get("created_at", time.time())
+        # Все подписчики с ID <= cursor уже обработаны
+        self.cursor = record.get("cursor")
+        # Обработанные подписчики с ID > cursor (отправка идет конкурентно, не по порядку)
+        self.delivered = set(record.get("delivered", []))
+        self.dead = list(record.get("dead", []))
+        self.sent = record.get("sent", 0)
+        self.failed = record.get("failed", 0)
+        self._targets = []
+        self._position = 0
+
+    @classmethod
+    def new(cls, admin_chat_id, kind="full"):
+        return cls({"id": uuid.uuid4().hex[:8], "admin_chat_id": admin_chat_id, "kind": kind})
+
+    def targets(self, users):
+        """Подписчики, которым рассылка еще не уходила (в порядке возрастания ID)"""
+        self._targets = [
+            user_id for user_id in sorted(users)
+            if (self.cursor is None or user_id > self.cursor) and user_id not in self.delivered
+        ]
+        self._position = 0
+        return self._targets
+
+    def mark_done(self, chat_id, outcome):
+        """Отмечает чат обработанным и сдвигает курсор через непрерывный обработанный префикс"""
+        self.delivered.add(chat_id)
+        if outcome == "sent":
+            self.sent += 1
+        else:
+            self.failed += 1
+            if outcome == "dead":
+                self.dead.append(chat_id)
+
+        while self._position < len(self._targets) and self._targets[self._position] in self.delivered:
+            self.cursor = self._targets[self._position]
+            self.delivered.discard(self.cursor)
+            self._position += 1
+
+    def to_record(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "kind": self.kind,
+            "admin_chat_id": self.admin_chat_id,
+            "created_at": self.created_at,
+            "cursor": self.cursor,
+            "delivered": sorted(
+                user_id for user_id in self.delivered if self.cursor is None or user_id > self.cursor
+            ),
+            "dead": self.dead,
+            "sent": self.sent,
+            "failed": self.failed,
+        }
+
+
+class BroadcastJobStore:
+    """Хранилище незавершенных рассылок в зашифрованном файле базы"""
+
+    def __init__(self, db):
+        self.db = db
+        self.jobs = {}
+        self._save_lock = asyncio.Lock()
+        for record in db.load_broadcast_jobs():
+            job = BroadcastJob(record)
+            self.jobs[job.id] = job
+
+    def create(self, admin_chat_id, kind="full"):
+        job = BroadcastJob.new(admin_chat_id, kind)
+        self.jobs[job.id] = job
+        return job
+
+    def running(self):
+        return [job for job in self.jobs.values() if job.status == "running"]
+
+    def finish(self, job, status):
+        """Завершенные и отмененные рассылки больше не храним"""
+        job.status = status
+        self.jobs.pop(job.id, None)
+
+    async def save(self):
+        """Сохраняет состояние всех рассылок (шифрование и запись - в отдельном потоке)"""
+        async with self._save_lock:
+            records = [job.to_record() for job in self.jobs.values()]
+            await asyncio.to_thread(self.db.save_broadcast_jobs, records)
@@ -1,5 +1,6 @@
 # config.py
 import os
+import secrets
 from dotenv import load_dotenv
 from typing import List
 
@@ -15,10 +16,37 @@ ADMIN_IDS = [int(id.strip()) for id in os.getenv("ADMIN_IDS", "").split(",") if
 # Файл для хранения данных
 DATA_FILE = os.getenv("DATA_FILE", "bot_data.json")
 
+# Через сколько записей журнала сворачивать его в снимок
+JOURNAL_COMPACT_EVERY = int(os.getenv("JOURNAL_COMPACT_EVERY", "1000"))
+
+# Сколько секунд копить изменения перед сбросом на диск
+PERSIST_INTERVAL = float(os.getenv("PERSIST_INTERVAL", "1.0"))
+
 # Имя менеджера (username без @)
 MANAGER_NAME = os.getenv("MANAGER_NAME", "GUSAROV_NIK")
 MANAGER_CHAT_ID = int(os.getenv("MANAGER_CHAT_ID"))
 
+# Настройки рассылки
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "30"))  # сообщений в секунду на весь бот
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "20"))  # одновременных запросов
+BROADCAST_PER_CHAT_INTERVAL = float(os.getenv("BROADCAST_PER_CHAT_INTERVAL", "1.0"))  # секунд между сообщениями в чат
+BROADCAST_PROGRESS_INTERVAL = float(os.getenv("BROADCAST_PROGRESS_INTERVAL", "3.0"))  # частота обновления прогресса
+
+# Объединение сообщений для менеджера
+FORWARD_TEXT_WINDOW = float(os.getenv("FORWARD_TEXT_WINDOW", "3.0"))  # пауза, после которой серия текстов уходит менеджеру
+FORWARD_ALBUM_WINDOW = float(os.getenv("FORWARD_ALBUM_WINDOW", "1.0"))  # ожидание остальных частей альбома
+
+# Режим получения обновлений: polling (по умолчанию) или webhook
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+
+# Настройки вебхука
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")  # публичный адрес бота, например https://bot.example.com
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or secrets.token_urlsafe(32)  # если не задан - новый при каждом запуске
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))  # необработанных обновлений в очереди
+
 # Дополнительные переменные (если нужны)
 # LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 # DEBUG = os.getenv("DEBUG", "False").lower() == "true"
@@ -27,6 +55,12 @@ MANAGER_CHAT_ID = int(os.getenv("MANAGER_CHAT_ID"))
 if not BOT_TOKEN:
     raise ValueError("BOT_TOKEN не установлен в .env файле")
 
+if BOT_MODE not in ("polling", "webhook"):
+    raise ValueError("BOT_MODE должен быть polling или webhook")
+
+if BOT_MODE == "webhook" and not WEBHOOK_URL:
+    raise ValueError("WEBHOOK_URL не установлен в .env файле (нужен для BOT_MODE=webhook)")
+
 if not ADMIN_IDS:
     print("⚠️  ВНИМАНИЕ: ADMIN_IDS не установлены или пустые")
     ADMIN_IDS = []
@@ -1,15 +1,70 @@
 # database.py (зашифрованная версия - ЗАМЕНЯЕТ старый файл)
 import json
 import os
-from cryptography.fernet import Fernet
-from config import DATA_FILE
+import sys
+import threading
+import time
+from array import array
+from cryptography.fernet import Fernet, InvalidToken
+from config import DATA_FILE, JOURNAL_COMPACT_EVERY, PERSIST_INTERVAL
+from price_history import PriceHistory
+
+# Журнал изменений и список пользователей лежат рядом со снимком данных
+JOURNAL_FILE = f"{DATA_FILE}.journal"
+USERS_FILE = f"{DATA_FILE}.users"
+BROADCASTS_FILE = f"{DATA_FILE}.broadcasts"
+PRICE_HISTORY_FILE = f"{DATA_FILE}.history"
+
+PRICE_KEYS = ("gold_price_nds", "gold_price_no_nds", "silver_price_nds", "silver_price_no_nds")
+
+
+def pack_users(users):
+    """Сериализует множество ID в отсортированный бинарный блок int64 (little-endian)"""
+    packed = array('q', sorted(users))
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def unpack_users(blob):
+    """Восстанавливает множество ID из бинарного блока pack_users"""
+    packed = array('q')
+    packed.frombytes(blob)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return set(packed)
 
 
 class Database:
     def __init__(self):
         self.key = self._load_or_generate_key()
         self.cipher = Fernet(self.key)
+        self.journal_records = 0
+        # Версия цен: растет при каждом реальном изменении любой цены
+        self.prices_version = 0
+        # Версия цен последней рассылки (база для рассылки только изменений)
+        self.broadcast_prices_version = 0
+        self.history = PriceHistory(PRICE_HISTORY_FILE)
+
+        # Отложенная запись: изменения копятся в памяти и сбрасываются фоновым потоком
+        self.mutations = 0
+        self.flushes = 0
+        self._pending = []
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._closed = False
+
         self.data = self._load_data()
+        self.users = self._load_users()
+        self._replay_journal()
+
+        # Сжимаем журнал, накопившийся с прошлого запуска
+        if self.journal_records >= JOURNAL_COMPACT_EVERY:
+            self._compact()
+
+        self._persister = threading.Thread(target=self._persist_loop, name="db-persister", daemon=True)
+        self._persister.start()
 
     def _ensure_data_file_exists(self):
         """Проверяем существование файла и создаем если нужно"""
@@ -59,25 +114,195 @@ class Database:
             "gold_price_nds": 5000.0,
             "gold_price_no_nds": 5000.0,
             "silver_price_nds": 60.0,
-            "silver_price_no_nds": 60.0,
-            "users": []
+            "silver_price_no_nds": 60.0
         }
 
-    def _save_data(self):
-        """Шифруем и сохраняем данные"""
-        # Преобразуем данные в JSON
-        json_str = json.dumps(self.data, ensure_ascii=False, indent=4)
+    def _load_users(self):
+        """Загружаем множество подписчиков из бинарного блока"""
+        # Старый формат: пользователи хранились JSON-списком внутри снимка
+        legacy_users = self.data.pop("users", None)
+
+        if not os.path.exists(USERS_FILE):
+            return set(legacy_users or [])
 
-        # Шифруем
-        encrypted = self.cipher.encrypt(json_str.encode('utf-8'))
+        try:
+            with open(USERS_FILE, 'rb') as f:
+                return unpack_users(self.cipher.decrypt(f.read()))
+        except Exception as e:
+            print(f"⚠️  Ошибка расшифровки списка пользователей: {e}")
+            return set(legacy_users or [])
+
+    def _write_encrypted(self, path, payload):
+        """Шифруем payload и атомарно записываем в path"""
+        encrypted = self.cipher.encrypt(payload)
 
-        # Сохраняем
-        with open(DATA_FILE, 'wb') as f:
+        tmp_file = f"{path}.tmp"
+        with open(tmp_file, 'wb') as f:
             f.write(encrypted)
+            f.flush()
+            os.fsync(f.fileno())
 
         # Защищаем файл (на Linux/Mac)
         if os.name != 'nt':
-            os.chmod(DATA_FILE, 0o600)
+            os.chmod(tmp_file, 0o600)
+
+        os.replace(tmp_file, path)
+
+    def _save_data(self):
+        """Шифруем и сохраняем полный снимок данных"""
+        # Копируем состояние под блокировкой, шифруем и пишем уже без нее
+        with self._lock:
+            users, data = set(self.users), dict(self.data)
+
+        # Пользователи - отдельным бинарным блоком, цены - JSON
+        self._write_encrypted(USERS_FILE, pack_users(users))
+
+        json_str = json.dumps(data, ensure_ascii=False, indent=4)
+        self._write_encrypted(DATA_FILE, json_str.encode('utf-8'))
+
+    # ========== ЖУРНАЛ ИЗМЕНЕНИЙ ==========
+
+    def _apply(self, record):
+        """Применяет одну запись журнала к данным в памяти"""
+        op = record["op"]
+        if op == "set":
+            if self.data.get(record["key"]) != record["value"]:
+                self.prices_version += 1
+            self.data[record["key"]] = record["value"]
+        elif op == "broadcast_prices":
+            self.data["broadcast_prices"] = record["prices"]
+            self.broadcast_prices_version += 1
+        elif op == "add_user":
+            self.users.add(record["user_id"])
+        elif op == "remove_user":
+            self.users.discard(record["user_id"])
+        elif op == "remove_users":
+            self.users.difference_update(record["user_ids"])
+
+    def _replay_journal(self):
+        """Проигрываем журнал поверх снимка при запуске"""
+        if not os.path.exists(JOURNAL_FILE):
+            return
+
+        with open(JOURNAL_FILE, 'rb') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(self.cipher.decrypt(line).decode('utf-8'))
+                except (InvalidToken, ValueError) as e:
+                    # Оборванная последняя запись после сбоя - пропускаем
+                    print(f"⚠️  Пропущена поврежденная запись журнала: {e}")
+                    continue
+                self._apply(record)
+                self.journal_records += 1
+
+    def _append(self, record):
+        """Применяет изменение в памяти и ставит запись в очередь на запись в журнал.
+
+        Диск не трогаем: это делает фоновый поток, объединяя несколько изменений в один сброс.
+        """
+        with self._wakeup:
+            self._apply(record)
+            self._pending.append(record)
+            self.mutations += 1
+            self._wakeup.notify()
+
+    def _persist_loop(self):
+        """Фоновый поток: ждет изменений, выжидает PERSIST_INTERVAL и сбрасывает их разом"""
+        while True:
+            with self._wakeup:
+                while not self._pending and not self._closed:
+                    self._wakeup.wait()
+                if self._closed:
+                    return
+                # Даем накопиться соседним изменениям
+                self._wakeup.wait(PERSIST_INTERVAL)
+            self.flush()
+
+    def flush(self):
+        """Дописывает накопленные изменения в журнал одной записью на диск"""
+        with self._io_lock:
+            with self._lock:
+                records, self._pending = self._pending, []
+            if not records:
+                return
+
+            try:
+                lines = b"".join(
+                    self.cipher.encrypt(json.dumps(record, ensure_ascii=False).encode('utf-8')) + b"\n"
+                    for record in records
+                )
+                is_new = not os.path.exists(JOURNAL_FILE)
+                with open(JOURNAL_FILE, 'ab') as f:
+                    f.write(lines)
+                    f.flush()
+                    os.fsync(f.fileno())
+                if is_new and os.name != 'nt':
+                    os.chmod(JOURNAL_FILE, 0o600)
+            except Exception as e:
+                print(f"⚠️  Ошибка записи журнала: {e}")
+                # Вернем записи в очередь, попробуем при следующем сбросе
+                with self._lock:
+                    self._pending[:0] = records
+                return
+
+            # Изменения цен дописываем во временной ряд истории
+            try:
+                self.history.append([
+                    (record["ts"], record["key"], record["value"])
+                    for record in records
+                    if record["op"] == "set" and "ts" in record
+                ])
+            except Exception as e:
+                print(f"⚠️  Ошибка записи истории цен: {e}")
+
+            self.flushes += 1
+            self.journal_records += len(records)
+            if self.journal_records >= JOURNAL_COMPACT_EVERY:
+                self._compact()
+
+    def _compact(self):
+        """Сворачиваем журнал в новый снимок.
+
+        Если процесс упадет между записью снимка и очисткой журнала,
+        журнал проиграется повторно - все операции идемпотентны.
+        """
+        self._save_data()
+        with open(JOURNAL_FILE, 'wb'):
+            pass
+        self.journal_records = 0
+
+    def close(self):
+        """Останавливает фоновый поток и сбрасывает все несохраненные изменения"""
+        with self._wakeup:
+            self._closed = True
+            self._wakeup.notify()
+        self._persister.join()
+        self.flush()
+        print(f"💾 Сохранено изменений: {self.mutations}, сбросов на диск: {self.flushes}")
+
+    def persistence_stats(self):
+        """Счетчики отложенной записи: сколько изменений и сколько реальных сбросов на диск"""
+        return {"mutations": self.mutations, "flushes": self.flushes, "pending": len(self._pending)}
+
+    # ========== НЕЗАВЕРШЕННЫЕ РАССЫЛКИ ==========
+
+    def load_broadcast_jobs(self):
+        """Загружаем сохраненные рассылки"""
+        if not os.path.exists(BROADCASTS_FILE):
+            return []
+        try:
+            with open(BROADCASTS_FILE, 'rb') as f:
+                return json.loads(self.cipher.decrypt(f.read()).decode('utf-8'))
+        except Exception as e:
+            print(f"⚠️  Ошибка расшифровки рассылок: {e}")
+            return []
+
+    def save_broadcast_jobs(self, records):
+        """Сохраняем состояние рассылок (вызывается из фонового потока)"""
+        self._write_encrypted(BROADCASTS_FILE, json.dumps(records).encode('utf-8'))
 
     # ========== МЕТОДЫ ДЛЯ РАБОТЫ С ЦЕНАМИ ==========
 
@@ -93,34 +318,44 @@ class Database:
     def get_silver_price_no_NDS(self):
         return self.data.get("silver_price_no_nds", 60.0)
 
+    def _set_price(self, key, price):
+        self._append({"op": "set", "key": key, "value": float(price), "ts": time.time()})
+
+    def get_prices(self):
+        """Текущие цены по ключам"""
+        return {key: self.data.get(key) for key in PRICE_KEYS}
+
+    def get_broadcast_prices(self):
+        """Цены на момент последней рассылки (пусто, если рассылок еще не было)"""
+        return self.data.get("broadcast_prices", {})
+
+    def set_broadcast_prices(self, prices):
+        self._append({"op": "broadcast_prices", "prices": prices})
+
     def set_gold_price_NDS(self, price):
         try:
-            self.data["gold_price_nds"] = float(price)
-            self._save_data()
+            self._set_price("gold_price_nds", price)
             return True
         except:
             return False
 
     def set_gold_price_no_NDS(self, price):
         try:
-            self.data["gold_price_no_nds"] = float(price)
-            self._save_data()
+            self._set_price("gold_price_no_nds", price)
             return True
         except:
             return False
 
     def set_silver_price_NDS(self, price):
         try:
-            self.data["silver_price_nds"] = float(price)
-            self._save_data()
+            self._set_price("silver_price_nds", price)
             return True
         except:
             return False
 
     def set_silver_price_no_NDS(self, price):
         try:
-            self.data["silver_price_no_nds"] = float(price)
-            self._save_data()
+            self._set_price("silver_price_no_nds", price)
             return True
         except:
             return False
@@ -128,21 +363,23 @@ class Database:
     # ========== МЕТОДЫ ДЛЯ РАБОТЫ С ПОЛЬЗОВАТЕЛЯМИ ==========
 
     def add_user(self, user_id):
-        if "users" not in self.data:
-            self.data["users"] = []
-
-        if user_id not in self.data["users"]:
-            self.data["users"].append(user_id)
-            self._save_data()
+        if user_id not in self.users:
+            self._append({"op": "add_user", "user_id": user_id})
             return True
         return False
 
     def get_all_users(self):
-        return self.data.get("users", [])
+        return sorted(self.users)
 
     def remove_user(self, user_id):
-        if user_id in self.data.get("users", []):
-            self.data["users"].remove(user_id)
-            self._save_data()
+        if user_id in self.users:
+            self._append({"op": "remove_user", "user_id": user_id})
             return True
-        return False
\ No newline at end of file
+        return False
+
+    def remove_users(self, user_ids):
+        """Удаляет пачку пользователей одной записью журнала, возвращает число удаленных"""
+        to_remove = [user_id for user_id in set(user_ids) if user_id in self.users]
+        if to_remove:
+            self._append({"op": "remove_users", "user_ids": to_remove})
+        return len(to_remove)
\ No newline at end of file
@@ -0,0 +1,173 @@
+# fake_bot_api.py
+"""Локальный фейковый Bot API для бенчмарков (без внешних зависимостей)"""
+import asyncio
+import collections
+import json
+import random
+import time
+from urllib.parse import parse_qsl
+
+
+class FakeBotAPI:
+    """Минимальный HTTP-сервер, отвечающий как api.telegram.org"""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.05, rate_limit=30,
+                 flood_rate=0.0, forbidden_rate=0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.flood_rate = flood_rate
+        self.forbidden_rate = forbidden_rate
+        self.stats = collections.Counter()
+        self.sent = []
+        self._window = collections.deque()
+        self._message_id = 0
+        self._server = None
+        # Обновления для getUpdates и адрес вебхука из setWebhook
+        self.updates = []
+        self.webhook_url = ""
+        self._new_updates = asyncio.Event()
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def push_update(self, update):
+        """Ставит обновление в очередь, его заберет следующий getUpdates"""
+        self.updates.append(update)
+        self._new_updates.set()
+
+    # ============ HTTP ============
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode().split(" ", 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, value = line.decode().split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                status, payload = await self.handle(path, headers, body)
+
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} OK\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    def _parse_params(self, headers, body):
+        if not body:
+            return {}
+        if headers.get("content-type", "").startswith("application/json"):
+            return json.loads(body)
+        params = {}
+        for key, value in parse_qsl(body.decode()):
+            try:
+                params[key] = json.loads(value)
+            except ValueError:
+                params[key] = value
+        return params
+
+    # ============ МЕТОДЫ BOT API ============
+
+    async def handle(self, path, headers, body):
+        api_method = path.rsplit("/", 1)[-1]
+        params = self._parse_params(headers, body)
+        self.stats[api_method] += 1
+
+        if api_method == "getMe":
+            return 200, {"ok": True, "result": {
+                "id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"
+            }}
+
+        if api_method == "getUpdates":
+            return await self._get_updates(params)
+
+        await asyncio.sleep(self.latency)
+
+        if api_method in ("setWebhook", "deleteWebhook"):
+            self.webhook_url = params.get("url", "")
+            return 200, {"ok": True, "result": True}
+
+        if api_method in ("sendMessage", "editMessageText"):
+            return self._send_message(params)
+
+        return 200, {"ok": True, "result": True}
+
+    async def _get_updates(self, params):
+        """Long polling: ждет обновления до timeout секунд, затем отдает пачку"""
+        offset = int(params.get("offset", 0))
+        self.updates = [update for update in self.updates if update["update_id"] >= offset]
+        if not self.updates:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), float(params.get("timeout", 0)))
+            except asyncio.TimeoutError:
+                pass
+
+        batch = self.updates[:int(params.get("limit", 100))]
+        # Задержка сети до бота
+        await asyncio.sleep(self.latency)
+        return 200, {"ok": True, "result": batch}
+
+    def _flood_check(self):
+        now = time.monotonic()
+        while self._window and now - self._window[0] > 1.0:
+            self._window.popleft()
+        if len(self._window) >= self.rate_limit or random.random() < self.flood_rate:
+            return True
+        self._window.append(now)
+        return False
+
+    def _send_message(self, params):
+        chat_id = int(params.get("chat_id", 0))
+
+        if self._flood_check():
+            self.stats["flood"] += 1
+            return 429, {
+                "ok": False, "error_code": 429,
+                "description": "Too Many Requests: retry after 1",
+                "parameters": {"retry_after": 1}
+            }
+
+        # Одни и те же чаты всегда "заблокировали" бота
+        if chat_id and random.Random(chat_id).random() < self.forbidden_rate:
+            self.stats["forbidden"] += 1
+            return 403, {
+                "ok": False, "error_code": 403,
+                "description": "Forbidden: bot was blocked by the user"
+            }
+
+        self._message_id += 1
+        self.sent.append((chat_id, params.get("text")))
+        return 200, {"ok": True, "result": {
+            "message_id": params.get("message_id", self._message_id),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "text": params.get("text", "")
+        }}
@@ -0,0 +1,62 @@
+# forwarding.py
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class BurstBuffer:
+    """Копит сообщения по ключу и отдает их одной пачкой, когда поток сообщений затих.
+
+    Пачка отправляется через window секунд после последнего сообщения,
+    но не позже чем через max_wait секунд после первого.
+    """
+
+    def __init__(self, window, flush, max_wait=None):
+        self.window = window
+        self.max_wait = max_wait or window * 3
+        self.flush = flush
+        self._items = {}
+        self._started = {}
+        self._timers = {}
+        # Пачки, которые отправляются прямо сейчас
+        self._running = set()
+
+    def add(self, key, item):
+        now = time.monotonic()
+        self._items.setdefault(key, []).append(item)
+        started = self._started.setdefault(key, now)
+
+        timer = self._timers.get(key)
+        if timer:
+            timer.cancel()
+        delay = max(0.0, min(self.window, started + self.max_wait - now))
+        self._timers[key] = asyncio.get_running_loop().call_later(delay, self._fire, key)
+
+    def _fire(self, key):
+        items = self._items.pop(key, [])
+        self._started.pop(key, None)
+        self._timers.pop(key, None)
+        if items:
+            task = asyncio.create_task(self._run(key, items))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def flush_all(self):
+        """Отправляет все накопленные пачки, не дожидаясь окна, и ждет отправки
+        уже начатых. Вызывается при остановке бота, чтобы сообщения не потерялись."""
+        for timer in self._timers.values():
+            timer.cancel()
+        pending = list(self._items.items())
+        self._items.clear()
+        self._started.clear()
+        self._timers.clear()
+        running = list(self._running)
+        await asyncio.gather(*running, *(self._run(key, items) for key, items in pending))
+
+    async def _run(self, key, items):
+        try:
+            await self.flush(key, items)
+        except Exception as e:
+            logger.error(f"Ошибка при отправке пачки сообщений {key}: {e}")
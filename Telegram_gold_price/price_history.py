@@ -0,0 +1,167 @@
+# price_history.py
+import mmap
+import os
+import struct
+import threading
+import time
+from datetime import datetime
+
+# Запись: время (unix, double), металл (0 - золото, 1 - серебро), НДС (0/1), цена (double)
+RECORD = struct.Struct('<dBBd')
+
+# Ключ цены в базе -> (металл, НДС)
+SERIES = {
+    "gold_price_nds": (0, 1),
+    "gold_price_no_nds": (0, 0),
+    "silver_price_nds": (1, 1),
+    "silver_price_no_nds": (1, 0),
+}
+
+LABELS = {
+    (0, 1): "Золото c НДС",
+    (0, 0): "Золото без НДС",
+    (1, 1): "Серебро c НДС",
+    (1, 0): "Серебро без НДС",
+}
+
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+CHART_POINTS = 14
+
+
+class PriceHistory:
+    """Временной ряд цен в бинарном файле фиксированных записей.
+
+    Файл только дописывается, читается через mmap с бинарным поиском по времени.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.version = 0
+        self._lock = threading.Lock()
+        self._mmap = None
+        self._mapped_size = 0
+        self._charts = {}
+
+    def append(self, records):
+        """Дописывает [(время, ключ цены, цена), ...]; вызывается из фонового потока базы"""
+        data = b"".join(
+            RECORD.pack(timestamp, *SERIES[key], price)
+            for timestamp, key, price in records
+            if key in SERIES
+        )
+        if not data:
+            return
+        with self._lock:
+            with open(self.path, 'ab') as f:
+                f.write(data)
+            self.version += 1
+
+    def _view(self):
+        """Отображение файла в память (переотображается, если файл вырос)"""
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        size -= size % RECORD.size
+        if size == 0:
+            return None, 0
+        if size != self._mapped_size:
+            if self._mmap:
+                self._mmap.close()
+            with open(self.path, 'rb') as f:
+                self._mmap = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+            self._mapped_size = size
+        return self._mmap, size // RECORD.size
+
+    def _timestamp(self, view, index):
+        return RECORD.unpack_from(view, index * RECORD.size)[0]
+
+    def query(self, since):
+        """Записи начиная с момента since плюс последнее значение каждого ряда до него"""
+        with self._lock:
+            view, count = self._view()
+            if not view:
+                return [], []
+
+            # Бинарный поиск первой записи не раньше since
+            low, high = 0, count
+            while low < high:
+                middle = (low + high) // 2
+                if self._timestamp(view, middle) < since:
+                    low = middle + 1
+                else:
+                    high = middle
+
+            # Значения, действовавшие на начало периода
+            before = {}
+            index = low - 1
+            while index >= 0 and len(before) < len(SERIES):
+                timestamp, metal, vat, price = RECORD.unpack_from(view, index * RECORD.size)
+                before.setdefault((metal, vat), (timestamp, metal, vat, price))
+                index -= 1
+
+            records = [RECORD.unpack_from(view, i * RECORD.size) for i in range(low, count)]
+            return list(before.values()), records
+
+    def chart(self, days, title):
+        """Текстовый график цен за days дней; строится один раз на период и версию ряда"""
+        today = datetime.now().date()
+        cache_key = (days, today)
+        cached = self._charts.get(cache_key)
+        if cached and cached[0] == self.version:
+            return cached[1]
+
+        text = self._render(days, title)
+        self._charts = {key: value for key, value in self._charts.items() if key[1] == today}
+        self._charts[cache_key] = (self.version, text)
+        return text
+
+    def _render(self, days, title):
+        end = time.time()
+        start = end - days * 86400
+        before, records = self.query(start)
+        if not before and not records:
+            return f"📈 *{title}*\n\nИстория цен пока пуста"
+
+        step = (end - start) / CHART_POINTS
+        lines = [
+            f"📈 *{title}* "
+            f"({datetime.fromtimestamp(start).strftime('%d.%m')} – {datetime.fromtimestamp(end).strftime('%d.%m')})\n"
+        ]
+        for series, label in LABELS.items():
+            value = next((price for _, metal, vat, price in before if (metal, vat) == series), None)
+            points = []
+            position = 0
+            series_records = [(timestamp, price) for timestamp, metal, vat, price in records if (metal, vat) == series]
+            for point in range(CHART_POINTS):
+                bucket_end = start + (point + 1) * step
+                while position < len(series_records) and series_records[position][0] <= bucket_end:
+                    value = series_records[position][1]
+                    position += 1
+                points.append(value)
+
+            known = [point for point in points if point]
+            if not known:
+                lines.append(f"• {label}: {'нет данных' if value is None else 'нет в продаже'}")
+                continue
+
+            first, last = known[0], points[-1]
+            if last:
+                change = (last - first) / first * 100
+                lines.append(f"• {label}: {first} → {last} руб./г ({change:+.1f}%)")
+            else:
+                lines.append(f"• {label}: {first} руб./г → нет в продаже")
+            lines.append(f"`{sparkline(points)}`")
+        return "\n".join(lines)
+
+
+def sparkline(points):
+    """Строка из блоков ▁..█ по значениям (None/0 - нет в продаже)"""
+    known = [point for point in points if point]
+    low, high = min(known), max(known)
+    chars = []
+    for point in points:
+        if not point:
+            chars.append(" ")
+        elif high == low:
+            chars.append(SPARK_CHARS[len(SPARK_CHARS) // 2])
+        else:
+            chars.append(SPARK_CHARS[round((point - low) / (high - low) * (len(SPARK_CHARS) - 1))])
+    return "".join(chars)
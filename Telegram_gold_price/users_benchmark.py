@@ -0,0 +1,83 @@
+# users_benchmark.py
+"""Микро-бенчмарк хранения подписчиков: старый JSON-список против множества + array('q')"""
+import json
+import os
+import random
+import time
+
+from cryptography.fernet import Fernet
+
+# database.py импортирует config, которому нужны переменные окружения
+os.environ.setdefault("BOT_TOKEN", "benchmark")
+os.environ.setdefault("MANAGER_CHAT_ID", "0")
+
+from database import pack_users, unpack_users
+
+SIZES = [10_000, 100_000, 1_000_000]
+OPERATIONS = 1000
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def bench_size(size, cipher):
+    ids = random.sample(range(10 ** 6, 10 ** 10), size + OPERATIONS)
+    existing, new_ids = ids[:size], ids[size:]
+    lookups = random.sample(existing, OPERATIONS // 2) + new_ids[:OPERATIONS // 2]
+
+    # ---------- Старый вариант: список ----------
+    old_users = list(existing)
+
+    def old_add():
+        for user_id in new_ids:
+            if user_id not in old_users:
+                old_users.append(user_id)
+
+    old_blob = cipher.encrypt(json.dumps({"users": existing}, indent=4).encode('utf-8'))
+
+    def old_load():
+        json.loads(cipher.decrypt(old_blob).decode('utf-8'))["users"]
+
+    old_results = {
+        "add": timed(old_add),
+        "lookup": timed(lambda: [user_id in old_users for user_id in lookups]),
+        "load": timed(old_load),
+        "size": len(old_blob),
+    }
+
+    # ---------- Новый вариант: множество + бинарный блок ----------
+    new_users = set(existing)
+
+    def new_add():
+        for user_id in new_ids:
+            if user_id not in new_users:
+                new_users.add(user_id)
+
+    new_blob = cipher.encrypt(pack_users(existing))
+
+    new_results = {
+        "add": timed(new_add),
+        "lookup": timed(lambda: [user_id in new_users for user_id in lookups]),
+        "load": timed(lambda: unpack_users(cipher.decrypt(new_blob))),
+        "size": len(new_blob),
+    }
+    return old_results, new_results
+
+
+def main():
+    cipher = Fernet(Fernet.generate_key())
+    print(f"{'пользователей':>13} | {'операция':>12} | {'список':>12} | {'множество':>12} | ускорение")
+    for size in SIZES:
+        old, new = bench_size(size, cipher)
+        for name in ("add", "lookup", "load"):
+            label = f"{name} x{OPERATIONS}" if name != "load" else name
+            speedup = old[name] / new[name] if new[name] else float("inf")
+            print(f"{size:>13} | {label:>12} | {old[name] * 1000:>9.2f} мс | {new[name] * 1000:>9.2f} мс | x{speedup:.0f}")
+        print(f"{size:>13} | {'файл':>12} | {old['size'] / 1024:>9.0f} КБ | {new['size'] / 1024:>9.0f} КБ |")
+
+
+if __name__ == '__main__':
+    main()
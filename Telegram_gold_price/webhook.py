@@ -0,0 +1,110 @@
+# webhook.py
+"""Прием обновлений через вебхук: свой aiohttp-сервер вместо long polling"""
+import asyncio
+import collections
+import hmac
+import logging
+import signal
+
+from aiohttp import web
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """HTTP-сервер вебхука.
+
+    Проверяет секретный токен и кладет обновления в ограниченную очередь приложения.
+    Если очередь заполнена, отвечает 503 - Telegram повторит доставку позже.
+    """
+
+    def __init__(self, application, host, port, path, secret):
+        self.application = application
+        self.host = host
+        self.port = port
+        self.path = path
+        self.secret = secret
+        self.stats = collections.Counter()
+        self._runner = None
+
+    async def handle(self, request):
+        token = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(token, self.secret):
+            self.stats["rejected"] += 1
+            return web.Response(status=403)
+
+        try:
+            update = Update.de_json(await request.json(), self.application.bot)
+        except Exception as e:
+            self.stats["invalid"] += 1
+            logger.warning(f"Некорректное обновление от вебхука: {e}")
+            return web.Response(status=400)
+
+        try:
+            self.application.update_queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.stats["overflow"] += 1
+            return web.Response(status=503)
+
+        self.stats["accepted"] += 1
+        return web.Response()
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        # При port=0 узнаем порт, выбранный системой
+        self.port = self._runner.addresses[0][1]
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+async def run_webhook(application, host, port, path, secret, url):
+    """Запуск бота в режиме вебхука (аналог application.run_polling).
+
+    Порядок запуска и остановки такой же, как у run_polling, включая post_init,
+    post_stop и post_shutdown.
+    """
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            # Windows: остановка по Ctrl+C через KeyboardInterrupt
+            pass
+
+    server = WebhookServer(application, host, port, path, secret)
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+
+        await server.start()
+        await application.bot.set_webhook(
+            url=f"{url.rstrip('/')}{path}",
+            secret_token=secret,
+            allowed_updates=Update.ALL_TYPES
+        )
+        await application.start()
+        logger.info(f"Вебхук слушает {host}:{server.port}{path}")
+        await stop_event.wait()
+    finally:
+        # Сначала перестаем принимать обновления, затем дорабатываем очередь
+        await server.stop()
+        if application.running:
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+        logger.info(f"Статистика вебхука: {dict(server.stats)}")
@@ -0,0 +1,171 @@
+# webhook_benchmark.py
+"""Сравнение задержки обработки обновлений: long polling против вебхука.
+
+Синтетические обновления идут с заданной частотой. Задержка считается от появления
+обновления (в очереди фейкового Bot API или отправки POST на вебхук) до вызова обработчика.
+Запуск: python webhook_benchmark.py --updates 2000 --rate 200
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import aiohttp
+from telegram.ext import Application, MessageHandler, filters
+
+from fake_bot_api import FakeBotAPI
+from webhook import SECRET_HEADER, WebhookServer
+
+SECRET = "benchmark-secret"
+WEBHOOK_PATH = "/telegram"
+
+
+def make_update(update_id):
+    """Сообщение пользователя в формате Bot API"""
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": update_id, "type": "private"},
+            "from": {"id": update_id, "is_bot": False, "first_name": "User"},
+            "text": "💰 Узнать актуальную цену"
+        }
+    }
+
+
+class LatencyRecorder:
+    """Запоминает время появления каждого обновления и задержку до обработчика"""
+
+    def __init__(self, total, handler_time):
+        self.total = total
+        self.handler_time = handler_time
+        self.sent_at = {}
+        self.latencies = []
+        self.first_sent = None
+        self.last_handled = None
+        self.done = asyncio.Event()
+
+    def mark_sent(self, update_id):
+        now = time.perf_counter()
+        self.sent_at[update_id] = now
+        if self.first_sent is None:
+            self.first_sent = now
+
+    async def handler(self, update, context):
+        now = time.perf_counter()
+        self.latencies.append(now - self.sent_at[update.update_id])
+        self.last_handled = now
+        if len(self.latencies) >= self.total:
+            self.done.set()
+        # Имитация работы обработчика
+        if self.handler_time:
+            await asyncio.sleep(self.handler_time)
+
+
+def build_application(api, recorder, queue_size=None):
+    builder = Application.builder().token("123:FAKE").base_url(f"{api.url}/bot")
+    if queue_size:
+        builder = builder.update_queue(asyncio.Queue(maxsize=queue_size)).updater(None)
+    application = builder.build()
+    application.add_handler(MessageHandler(filters.ALL, recorder.handler))
+    return application
+
+
+async def run_polling(api, recorder, updates, rate):
+    application = build_application(api, recorder)
+    await application.initialize()
+    await application.updater.start_polling(poll_interval=0.0, timeout=10)
+    await application.start()
+    try:
+        for update_id in range(1, updates + 1):
+            recorder.mark_sent(update_id)
+            api.push_update(make_update(update_id))
+            await asyncio.sleep(1 / rate)
+        await asyncio.wait_for(recorder.done.wait(), 60)
+    finally:
+        await application.updater.stop()
+        await application.stop()
+        await application.shutdown()
+    return {"getUpdates": api.stats["getUpdates"]}
+
+
+async def run_webhook(api, recorder, updates, rate, latency, queue_size):
+    application = build_application(api, recorder, queue_size)
+    server = WebhookServer(application, "127.0.0.1", 0, WEBHOOK_PATH, SECRET)
+    await application.initialize()
+    await server.start()
+    await application.start()
+    url = f"http://127.0.0.1:{server.port}{WEBHOOK_PATH}"
+    retries = 0
+
+    async def deliver(session, update_id):
+        """Доставка как у Telegram: задержка сети и повтор при ответе 503"""
+        nonlocal retries
+        await asyncio.sleep(latency)
+        while True:
+            async with session.post(url, json=make_update(update_id), headers={SECRET_HEADER: SECRET}) as response:
+                if response.status != 503:
+                    return
+            retries += 1
+            await asyncio.sleep(0.1)
+
+    try:
+        async with aiohttp.ClientSession() as session:
+            # Запрос с чужим секретом должен быть отклонен
+            async with session.post(url, json=make_update(0), headers={SECRET_HEADER: "wrong"}) as response:
+                assert response.status == 403, response.status
+
+            tasks = []
+            for update_id in range(1, updates + 1):
+                recorder.mark_sent(update_id)
+                tasks.append(asyncio.create_task(deliver(session, update_id)))
+                await asyncio.sleep(1 / rate)
+            await asyncio.gather(*tasks)
+            await asyncio.wait_for(recorder.done.wait(), 60)
+    finally:
+        await server.stop()
+        await application.stop()
+        await application.shutdown()
+    return {**server.stats, "retries": retries}
+
+
+async def run_benchmark(mode, updates, rate, latency, handler_time, queue_size):
+    api = FakeBotAPI(latency=latency)
+    await api.start()
+    recorder = LatencyRecorder(updates, handler_time)
+    try:
+        if mode == "polling":
+            stats = await run_polling(api, recorder, updates, rate)
+        else:
+            stats = await run_webhook(api, recorder, updates, rate, latency, queue_size)
+    finally:
+        await api.stop()
+
+    latencies = sorted(recorder.latencies)
+    elapsed = recorder.last_handled - recorder.first_sent
+    print(f"Режим: {mode}")
+    print(f"Обновлений: {len(latencies)}, время: {elapsed:.2f} с, {len(latencies) / elapsed:.1f} обновл./с")
+    print(
+        f"Задержка, мс: p50 {statistics.median(latencies) * 1000:.1f}, "
+        f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f}, "
+        f"max {latencies[-1] * 1000:.1f}"
+    )
+    print(f"Статистика: {stats}\n")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Задержка обработки обновлений: polling против вебхука")
+    parser.add_argument("--mode", choices=["polling", "webhook", "both"], default="both")
+    parser.add_argument("--updates", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=100, help="обновлений в секунду")
+    parser.add_argument("--latency", type=float, default=0.05, help="задержка сети Telegram - бот, с")
+    parser.add_argument("--handler-time", type=float, default=0.0, help="время работы обработчика, с")
+    parser.add_argument("--queue-size", type=int, default=1000, help="размер очереди вебхука")
+    args = parser.parse_args()
+
+    modes = ["polling", "webhook"] if args.mode == "both" else [args.mode]
+    for mode in modes:
+        asyncio.run(run_benchmark(
+            mode, args.updates, args.rate, args.latency, args.handler_time, args.queue_size
+        ))
@@ -0,0 +1,105 @@
+"""Перенос завершенных и отмененных задач в архив.
+
+В tasks остаются только живые задачи и недавно завершенные. Задачи, дата
+которых старше ARCHIVE_AFTER_DAYS дней, переносятся вместе с исполнителями в
+tasks_archive и task_performers_archive - таблицы, разбитые на разделы по
+месяцу создания задачи (см. migrations.py). Перенос идет порциями по
+ARCHIVE_BATCH_SIZE задач, каждая порция - одна короткая транзакция.
+
+Запускается в боте раз в ARCHIVE_INTERVAL секунд и вручную:
+python maintenance.py archive-tasks
+"""
+import asyncio
+from datetime import date
+
+import database
+from config import Config
+
+ARCHIVE_BATCH_SIZE = 1000
+ARCHIVE_INTERVAL = 24 * 3600
+
+# Задачи, которые пора переносить
+ARCHIVE_CONDITION = """
+    task_status IN ('Завершено', 'Отменено')
+    AND COALESCE(assignment_date, created_at::date) < CURRENT_DATE - $1::int
+"""
+
+# Строки задач удаляются из tasks и вставляются в архив одним запросом. Исполнители
+# читаются из task_performers до каскадного удаления (у всех частей запроса общий снимок).
+ARCHIVE_BATCH_QUERY = f"""
+    WITH moved AS (
+        DELETE FROM tasks
+        WHERE id_tasks IN (
+            SELECT id_tasks FROM tasks
+            WHERE {ARCHIVE_CONDITION}
+            ORDER BY id_tasks
+            LIMIT $2
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id_tasks, created_at, assignment_date, assignment_time, task_type,
+                  description, main_address, additional_address, required_workers,
+                  worker_price, claimed_count, task_status
+    ),
+    performers AS (
+        INSERT INTO task_performers_archive (task_id, task_created_at, id_user_telegram)
+        SELECT tp.task_id, moved.created_at, tp.id_user_telegram
+        FROM task_performers tp
+        JOIN moved ON moved.id_tasks = tp.task_id
+    )
+    INSERT INTO tasks_archive (id_tasks, created_at, assignment_date, assignment_time, task_type,
+                               description, main_address, additional_address, required_workers,
+                               worker_price, claimed_count, task_status)
+    SELECT * FROM moved
+"""
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_{month:%Y_%m}"
+
+
+async def ensure_partitions(connection, months: list):
+    """Создает недостающие месячные разделы архива"""
+    for month in months:
+        next_month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+        for table in ("tasks_archive", "task_performers_archive"):
+            await connection.execute(f"""
+                CREATE TABLE IF NOT EXISTS {partition_name(table, month)}
+                PARTITION OF {table}
+                FOR VALUES FROM ('{month}') TO ('{next_month}')
+            """)
+
+
+async def archive_finished_tasks(after_days: int = None) -> int:
+    """Переносит старые завершенные задачи в архив, возвращает их количество"""
+    after_days = Config.ARCHIVE_AFTER_DAYS if after_days is None else after_days
+    async with database.pool.acquire() as connection:
+        months = await connection.fetch(f"""
+            SELECT DISTINCT date_trunc('month', created_at)::date AS month
+            FROM tasks
+            WHERE {ARCHIVE_CONDITION}
+        """, after_days)
+        if not months:
+            return 0
+        await ensure_partitions(connection, [row['month'] for row in months])
+
+        total = 0
+        while True:
+            result = await connection.execute(ARCHIVE_BATCH_QUERY, after_days, ARCHIVE_BATCH_SIZE)
+            moved = int(result.split()[-1])
+            total += moved
+            if moved < ARCHIVE_BATCH_SIZE:
+                return total
+
+
+async def run_archiver():
+    """Бесконечный цикл архивации; останавливается отменой задачи"""
+    while True:
+        try:
+            moved = await archive_finished_tasks()
+            if moved:
+                print(f"В архив перенесено задач: {moved}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Ошибка архивации задач: {e}")
+        await asyncio.sleep(ARCHIVE_INTERVAL)
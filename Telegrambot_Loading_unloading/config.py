@@ -11,7 +11,31 @@ class Config:
     DB_HOST = os.getenv("HOST")
     DB_USER = os.getenv("USER")
     DB_PASSWORD = os.getenv("PASSWORD_DB")
-    DB_PORT = os.getenv("PORT")
+    DB_PORT = int(os.getenv("PORT", 5432))
+
+    # Пул соединений с базой
+    DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", 10))  # открываются заранее при запуске
+    DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", 20))
+    DB_COMMAND_TIMEOUT = float(os.getenv("DB_COMMAND_TIMEOUT", 30))  # секунд на один запрос
+
+    # Кэш статуса и ролей исполнителей, секунд (0 - без кэша)
+    USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 60))
+
+    # Рассылка новых задач волнами: сначала лучшим исполнителям, затем шире
+    NOTIFY_FIRST_WAVE = int(os.getenv("NOTIFY_FIRST_WAVE", 10))  # исполнителей в первой волне
+    NOTIFY_WAVE_INTERVAL = float(os.getenv("NOTIFY_WAVE_INTERVAL", 120))  # секунд между волнами
+
+    # Напоминания исполнителям о смене: за сколько часов до начала
+    REMINDER_HOURS = [float(hours) for hours in os.getenv("REMINDER_HOURS", "12,1").split(",") if hours.strip()]
+
+    # Завершенные задачи переносятся в архив через столько дней после даты задачи
+    ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", 30))
+
+    # Очередь уведомлений (notification_outbox)
+    OUTBOX_RATE = float(os.getenv("OUTBOX_RATE", 25))  # сообщений в секунду, лимит Telegram - около 30
+    OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 50))
+    OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 5))
+    OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", 1))  # секунд, когда очередь пуста
 
     TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN_BOT')
     ADMINS = list(map(int, os.getenv("ADMIN").split(',')))
@@ -1,99 +1,111 @@
-from venv import logger
-
-import psycopg2
-from aiogram import Bot
-from psycopg2 import sql
-from psycopg2.extras import DictCursor
-import os
+import asyncio
+import json
+import logging
 
+import asyncpg
 
 from config import Config
+from task_board import TaskBoard
+from user_cache import MISSING, UserCache
+
+logger = logging.getLogger(__name__)
+
+# Пул соединений с базой, создается в main.py при запуске бота
+pool = None
+
+# Статус и роли исполнителей: проверяются почти на каждое действие исполнителя
+user_cache = UserCache(Config.USER_CACHE_TTL)
+
+# Свободные задачи по типу: обновляются по NOTIFY от базы
+task_board = TaskBoard()
 
-def get_connection():
-    return psycopg2.connect(
-        host="localhost",
-        database="Loading_unloading",
-        user="postgres",
-        password="0000",
-        port=Config.DB_PORT
+
+def connection_params(database=None):
+    """Параметры подключения из Config."""
+    return {
+        "host": Config.DB_HOST,
+        "port": Config.DB_PORT,
+        "user": Config.DB_USER,
+        "password": Config.DB_PASSWORD,
+        "database": database or Config.DB_NAME,
+    }
+
+
+async def create_pool():
+    """Создает пул соединений и прогревает его: все DB_POOL_MIN_SIZE соединений
+    открываются и проверяются до начала обработки обновлений."""
+    global pool
+    pool = await asyncpg.create_pool(
+        **connection_params(),
+        min_size=Config.DB_POOL_MIN_SIZE,
+        max_size=Config.DB_POOL_MAX_SIZE,
+        command_timeout=Config.DB_COMMAND_TIMEOUT,
     )
 
+    async def warm_up():
+        async with pool.acquire() as connection:
+            await connection.fetchval("SELECT 1")
+
+    await asyncio.gather(*(warm_up() for _ in range(Config.DB_POOL_MIN_SIZE)))
+    print(f"Пул соединений с базой готов: {pool.get_size()} соединений.")
+    return pool
 
-def connect_to_database(dbname="Loading_unloading"):
-    """Функция устанавливает подключение к базе данных указанной в аргументе."""
-    try:
-        connection = psycopg2.connect(
-            host="localhost",
-            database=dbname,
-            user="postgres",
-            password="0000",
-            port=5432
-        )
-        connection.autocommit = True  # Добавляем автокоммит
-        return connection
-    except (Exception, psycopg2.Error) as error:
-        print(f"Ошибка при подключении к PostgreSQL (база {dbname}): {error}")
-        return None
 
+async def close_pool():
+    """Закрывает пул соединений."""
+    global pool
+    if pool:
+        await pool.close()
+        pool = None
 
-def check_and_create_db():
+
+async def check_and_create_db():
     """Проверка наличия базы данных и её создание, если она отсутствует."""
     try:
         # Попробуем подключиться напрямую к целевой базе
-        test_conn = connect_to_database("Loading_unloading")
-        if test_conn:
-            test_conn.close()
-            print(f"База данных {Config.DB_NAME} уже существует.")
-            return True
-
-        # Если не получилось - создаем базу
-        admin_conn = connect_to_database("postgres")
-        if not admin_conn:
-            print("Не удалось подключиться к серверу PostgreSQL")
-            return False
+        connection = await asyncpg.connect(**connection_params())
+        await connection.close()
+        print(f"База данных {Config.DB_NAME} уже существует.")
+        return True
+    except asyncpg.InvalidCatalogNameError:
+        pass
+    except Exception as e:
+        print(f"Ошибка при подключении к PostgreSQL (база {Config.DB_NAME}): {e}")
+        return False
 
-        admin_conn.autocommit = True
-        with admin_conn.cursor() as cursor:
-            cursor.execute(
-                sql.SQL("CREATE DATABASE {}").format(
-                    sql.Identifier(Config.DB_NAME)
-                )
-            )
+    # Базы нет - создаем через служебную базу postgres
+    admin_conn = None
+    try:
+        admin_conn = await asyncpg.connect(**connection_params("postgres"))
+        db_name = Config.DB_NAME.replace('"', '""')
+        await admin_conn.execute(f'CREATE DATABASE "{db_name}"')
         print(f"База данных {Config.DB_NAME} успешно создана.")
         return True
-
     except Exception as e:
         print(f"Ошибка при создании базы данных: {e}")
         return False
     finally:
-        if 'admin_conn' in locals() and admin_conn:
-            admin_conn.close()
+        if admin_conn:
+            await admin_conn.close()
 
 
-def initialize_database():
+async def initialize_database():
     """Функция для инициализации базы данных, включая создание всех таблиц, если они отсутствуют."""
-    connection = None
     try:
-        connection = connect_to_database("Loading_unloading")
-        if not connection:
-            print("Не удалось подключиться к базе данных Loading_unloading")
-            return False
-
-        with connection.cursor() as cursor:
+        async with pool.acquire() as connection:
             # Проверяем существование основных таблиц
-            cursor.execute("""
-                SELECT COUNT(*) FROM information_schema.tables 
-                WHERE table_schema = 'public' 
+            existing_tables = await connection.fetchval("""
+                SELECT COUNT(*) FROM information_schema.tables
+                WHERE table_schema = 'public'
                 AND table_name IN ('users', 'tasks', 'performer_stats', 'task_performers');
             """)
-            existing_tables = cursor.fetchone()[0]
 
             if existing_tables == 4:  # Все 4 таблицы уже существуют
                 print("Все таблицы уже существуют.")
                 return True
 
             # Создаем таблицы, если их нет
-            cursor.execute("""
+            await connection.execute("""
                 CREATE TABLE IF NOT EXISTS users (
                     id_user_telegram BIGINT PRIMARY KEY,
                     first_name VARCHAR(50) NOT NULL,
@@ -103,7 +115,7 @@ def initialize_database():
                     is_driver BOOLEAN NOT NULL DEFAULT FALSE,
                     is_self_employed BOOLEAN NOT NULL DEFAULT FALSE,
                     inn VARCHAR(12) NULL,
-                    status VARCHAR(20) NOT NULL 
+                    status VARCHAR(20) NOT NULL
                         DEFAULT 'Заблокированный'
                         CHECK (status IN ('Активный', 'Заблокированный')),
                     comment TEXT NULL,
@@ -151,124 +163,127 @@ def initialize_database():
     except Exception as e:
         print(f"Ошибка при создании таблиц: {e}")
         return False
-    finally:
-        if connection:
-            connection.close()
 
 
-def add_user_to_database(user_id):
+async def add_user_to_database(user_id):
     """Добавляет пользователя в базу данных, если его еще нет"""
     try:
-        with connect_to_database() as connection:
-            if not connection:
-                print("Не удалось подключиться к базе данных")
-                return False
-
-            with connection.cursor() as cursor:
-                # Проверяем существование пользователя
-                cursor.execute("SELECT 1 FROM users WHERE id_user_telegram = %s", (user_id,))
-                exists = cursor.fetchone()
-
-                if not exists:
-                    # Добавляем нового пользователя с дефолтными значениями
-                    cursor.execute("""
-                        INSERT INTO users 
-                        (id_user_telegram, first_name, last_name, phone, is_loader, 
-                         is_driver, is_self_employed, inn, status, comment)
-                        VALUES 
-                        (%s, '', '', '', FALSE, FALSE, FALSE, NULL, 'Заблокированный', NULL)
-                    """, (user_id,))
-                    connection.commit()
-                    print(f"Пользователь {user_id} успешно добавлен в базу данных")
-                    return True
-
-                print(f"Пользователь {user_id} уже существует в базе данных")
-                return False
+        # Добавляем нового пользователя с дефолтными значениями
+        result = await pool.execute("""
+            INSERT INTO users
+            (id_user_telegram, first_name, last_name, phone, is_loader,
+             is_driver, is_self_employed, inn, status, comment)
+            VALUES
+            ($1, '', '', '', FALSE, FALSE, FALSE, NULL, 'Заблокированный', NULL)
+            ON CONFLICT (id_user_telegram) DO NOTHING
+        """, user_id)
+
+        if result == "INSERT 0 1":
+            user_cache.invalidate(user_id)
+            print(f"Пользователь {user_id} успешно добавлен в базу данных")
+            return True
+
+        print(f"Пользователь {user_id} уже существует в базе данных")
+        return False
 
     except Exception as e:
         print(f"Ошибка при добавлении пользователя {user_id}: {e}")
         return False
 
 
-def status_verification(user_id):
+async def get_user_access(user_id):
+    """Статус, роли и заполненность анкеты пользователя (из кэша, если запись свежая).
+    Возвращает None, если пользователя нет в базе."""
+    user_id = int(user_id)
+    access = user_cache.get(user_id)
+    if access is not MISSING:
+        return access
+
+    row = await pool.fetchrow("""
+        SELECT status, is_loader, is_driver, is_self_employed,
+               first_name <> '' AND last_name <> '' AND phone <> '' AS profile_filled
+        FROM users
+        WHERE id_user_telegram = $1
+    """, user_id)
+    access = dict(row) if row else None
+    user_cache.set(user_id, access)
+    return access
+
+
+async def status_verification(user_id):
     """Проверяет, имеет ли пользователь статус 'Активный'"""
     try:
-        with connect_to_database() as connection:
-            if not connection:
-                print("Не удалось подключиться к базе данных")
-                return False
-
-            with connection.cursor() as cursor:
-                cursor.execute(
-                    "SELECT status FROM users WHERE id_user_telegram = %s",
-                    (user_id,)
-                )
-                result = cursor.fetchone()
-                return result and result[0] == "Активный"
+        access = await get_user_access(user_id)
+        return access is not None and access['status'] == "Активный"
 
     except Exception as e:
         print(f"Ошибка при проверке статуса пользователя {user_id}: {e}")
         return False
 
-def checking_your_personal_account(user_id):
-    """Проверка на заполненность личного кабинета."""
-    connection = connect_to_database()
-    if not connection:
-        return False
 
-    try:
-        with connection.cursor() as cursor:
-            cursor.execute("""
-                SELECT first_name, last_name, phone 
-                FROM users 
-                WHERE id_user_telegram = %s
-            """, (user_id,))
-
-            user_data = cursor.fetchone()
-
-            if user_data:
-                first_name, last_name, phone = user_data
-                if first_name and last_name and phone:
-                    return True
-            return False
-    finally:
-        if connection:
-            connection.close()
+async def checking_your_personal_account(user_id):
+    """Проверка на заполненность личного кабинета."""
+    access = await get_user_access(user_id)
+    return bool(access and access['profile_filled'])
 
 
-def change_status_user(user_id):
+async def change_status_user(user_id):
     """Изменяет статус пользователя на 'Активный' (функция администратора)"""
     try:
-        with connect_to_database() as connection:
-            if not connection:
-                print("Не удалось подключиться к базе данных")
-                return False
-
-            with connection.cursor() as cursor:
-                # Проверяем существование пользователя
-                cursor.execute("SELECT 1 FROM users WHERE id_user_telegram = %s", (user_id,))
-                exists = cursor.fetchone()
-
-                if not exists:
-                    print(f"Пользователь {user_id} не найден в базе данных")
-                    return False
-
-                # Обновляем статус пользователя
-                cursor.execute("""
-                    UPDATE users 
-                    SET status = 'Активный'
-                    WHERE id_user_telegram = %s
-                """, (user_id,))
-
-                connection.commit()
-                print(f"Статус пользователя {user_id} успешно изменен на 'Активный'")
-                return True
+        # Обновляем статус пользователя
+        result = await pool.execute("""
+            UPDATE users
+            SET status = 'Активный'
+            WHERE id_user_telegram = $1
+        """, user_id)
+
+        user_cache.invalidate(int(user_id))
+        if result == "UPDATE 0":
+            print(f"Пользователь {user_id} не найден в базе данных")
+            return False
+
+        print(f"Статус пользователя {user_id} успешно изменен на 'Активный'")
+        return True
 
     except Exception as e:
         print(f"Ошибка при изменении статуса пользователя {user_id}: {e}")
         return False
 
-def create_task(task_data: dict) -> int:
+
+async def save_user_registration(user_id, first_name, last_name, phone,
+                                 is_loader, is_driver, is_self_employed, inn):
+    """Сохраняет анкету исполнителя: создает пользователя или обновляет существующего"""
+    await pool.execute("""
+        INSERT INTO users (
+            id_user_telegram,
+            first_name,
+            last_name,
+            phone,
+            is_loader,
+            is_driver,
+            is_self_employed,
+            inn
+        ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+        ON CONFLICT (id_user_telegram) DO UPDATE
+        SET first_name = EXCLUDED.first_name,
+            last_name = EXCLUDED.last_name,
+            phone = EXCLUDED.phone,
+            is_loader = EXCLUDED.is_loader,
+            is_driver = EXCLUDED.is_driver,
+            is_self_employed = EXCLUDED.is_self_employed,
+            inn = EXCLUDED.inn
+    """, user_id, first_name, last_name, phone, is_loader, is_driver, is_self_employed, inn)
+    user_cache.invalidate(int(user_id))
+
+
+async def get_active_users():
+    """Список активных исполнителей: [(id_user_telegram, first_name, last_name), ...]"""
+    return await pool.fetch(
+        "SELECT id_user_telegram, first_name, last_name FROM users WHERE status = 'Активный'"
+    )
+
+
+async def create_task(task_data: dict) -> int:
     """
     Создает новую задачу в базе данных и возвращает её ID
     :param task_data: Словарь с данными задачи {
@@ -285,75 +300,157 @@ def create_task(task_data: dict) -> int:
     :raises: Exception в случае ошибки
     """
     try:
-        with get_connection() as connection:
-            with connection.cursor() as cursor:
-                query = """
-                    INSERT INTO tasks (
-                        assignment_date, 
-                        assignment_time, 
-                        task_type, 
-                        description, 
-                        main_address, 
-                        additional_address, 
-                        required_workers,
-                        worker_price,
-                        task_status
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    RETURNING id_tasks
-                """
-
-                cursor.execute(query, (
-                    task_data['date_of_destination'],
-                    task_data['appointment_time'],
-                    task_data['type_of_task'],
-                    task_data['description'],
-                    task_data['main_address'],
-                    task_data.get('additional_address'),  # Используем get() для опционального поля
-                    task_data['required_workers'],
-                    task_data['worker_price'],
-                    'Назначена'
-                ))
-
-                task_id = cursor.fetchone()[0]
-                connection.commit()
-                return task_id
+        return await pool.fetchval("""
+            INSERT INTO tasks (
+                assignment_date,
+                assignment_time,
+                task_type,
+                description,
+                main_address,
+                additional_address,
+                required_workers,
+                worker_price,
+                task_status
+            ) VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
+            RETURNING id_tasks
+        """,
+            task_data['date_of_destination'],
+            task_data['appointment_time'],
+            task_data['type_of_task'],
+            task_data['description'],
+            task_data['main_address'],
+            task_data.get('additional_address'),  # Используем get() для опционального поля
+            task_data['required_workers'],
+            task_data['worker_price'],
+            'Назначена'
+        )
 
     except Exception as e:
         print(f"Ошибка при создании задачи: {str(e)}")
         raise  # Пробрасываем исключение дальше для обработки на уровне выше
 
 
-def get_all_users_type(task_type: str = None) -> list:
+# Активные пользователи; условие по типу задачи подставляется из USER_TYPE_FILTERS
+ACTIVE_USERS_QUERY = """
+    SELECT id_user_telegram
+    FROM users
+    WHERE status = 'Активный'{type_filter}
+"""
+USER_TYPE_FILTERS = {
+    'Погрузка': " AND is_loader = TRUE",
+    'Доставка': " AND is_driver = TRUE",
+}
+
+
+async def get_all_users_type(task_type: str = None) -> list:
     """
     Получает список активных пользователей по указанному типу задачи
     :param task_type: Тип задачи ('Погрузка' или 'Доставка')
     :return: Список ID пользователей (telegram ID)
     """
     try:
-        with get_connection() as connection:
-            with connection.cursor() as cursor:
-                base_query = """
-                    SELECT id_user_telegram 
-                    FROM users 
-                    WHERE status = 'Активный'
-                """
-
-                # Добавляем условие в зависимости от типа задачи
-                if task_type == 'Погрузка':
-                    base_query += " AND is_loader = TRUE"
-                elif task_type == 'Доставка':
-                    base_query += " AND is_driver = TRUE"
-                # Для None или неизвестного типа - возвращаем всех активных пользователей
-
-                cursor.execute(base_query)
-                return [row[0] for row in cursor.fetchall()]
+        # Для None или неизвестного типа - возвращаем всех активных пользователей
+        query = ACTIVE_USERS_QUERY.format(type_filter=USER_TYPE_FILTERS.get(task_type, ""))
+        return [row[0] for row in await pool.fetch(query)]
 
     except Exception as e:
         print(f"Ошибка при получении пользователей для типа '{task_type}': {e}")
         return []
 
 
-def get_pending_tasks(user_type: str = None) -> list[dict]:
+async def get_ranked_users_type(task_type: str) -> list:
+    """
+    Активные исполнители для типа задачи, лучшие первыми.
+    Рейтинг - доля выполненных задач со сглаживанием (completed + 1) / (total_assigned + 2):
+    у новичка без истории 0.5, поэтому он не оказывается навсегда в конце очереди.
+    :param task_type: Тип задачи ('Погрузка' или 'Доставка')
+    :return: Список ID пользователей (telegram ID)
+    """
+    try:
+        rows = await pool.fetch("""
+            SELECT u.id_user_telegram
+            FROM users u
+            LEFT JOIN performer_stats ps ON ps.id_user_telegram = u.id_user_telegram
+            WHERE u.status = 'Активный'
+              AND CASE $1::varchar
+                      WHEN 'Погрузка' THEN u.is_loader
+                      WHEN 'Доставка' THEN u.is_driver
+                      ELSE TRUE
+                  END
+            ORDER BY
+                (COALESCE(ps.completed, 0) + 1.0) / (COALESCE(ps.total_assigned, 0) + 2) DESC,
+                COALESCE(ps.completed, 0) DESC,
+                u.id_user_telegram
+        """, task_type)
+        return [row['id_user_telegram'] for row in rows]
+
+    except Exception as e:
+        print(f"Ошибка при получении рейтинга исполнителей для типа '{task_type}': {e}")
+        return []
+
+
+async def get_task_status(id_tasks: int):
+    """Текущий статус задачи или None, если задачи нет"""
+    return await pool.fetchval("SELECT task_status FROM tasks WHERE id_tasks = $1", id_tasks)
+
+
+async def enqueue_notifications(chat_ids, text: str, reply_markup=None, delete_after: int = None, conn=None) -> int:
+    """
+    Ставит сообщения в очередь отправки (notification_outbox).
+    Внутри транзакции передайте ее соединение conn: сообщения уйдут, только если транзакция зафиксирована.
+    :param reply_markup: клавиатура aiogram
+    :param delete_after: через сколько секунд удалить отправленное сообщение
+    :return: количество сообщений в очереди
+    """
+    chat_ids = list(chat_ids)
+    markup = reply_markup.model_dump_json(exclude_none=True) if reply_markup else None
+    await (conn or pool).executemany("""
+        INSERT INTO notification_outbox (chat_id, text, reply_markup, delete_after)
+        VALUES ($1, $2, $3::jsonb, $4)
+    """, [(chat_id, text, markup, delete_after) for chat_id in chat_ids])
+    return len(chat_ids)
+
+
+async def enqueue_for_users_type(conn, task_type: str, text: str) -> int:
+    """Ставит в очередь сообщение всем активным исполнителям типа задачи одним запросом"""
+    result = await conn.execute("""
+        INSERT INTO notification_outbox (chat_id, text)
+        SELECT id_user_telegram, $2
+        FROM users
+        WHERE status = 'Активный'
+          AND CASE $1::varchar
+                  WHEN 'Погрузка' THEN is_loader
+                  WHEN 'Доставка' THEN is_driver
+                  ELSE TRUE
+              END
+    """, task_type, text)
+    return int(result.split()[-1])
+
+
+# Свободные задачи для администратора; условие по типу - из PENDING_TYPE_FILTERS
+PENDING_TASKS_QUERY = """
+    SELECT
+        id_tasks,
+        assignment_date as date,
+        assignment_time as time,
+        task_type,
+        description,
+        main_address,
+        additional_address,
+        required_workers,
+        worker_price,
+        claimed_count
+    FROM tasks
+    WHERE task_status = 'Назначена'{type_filter}
+    ORDER BY assignment_date, assignment_time
+"""
+PENDING_TYPE_FILTERS = {
+    "loader": " AND task_type = 'Погрузка'",
+    "driver": " AND task_type = 'Доставка'",
+}
+
+
+async def get_pending_tasks(user_type: str = None) -> list[dict]:
     """
     Получает все задачи со статусом 'Назначена' из базы данных
     с фильтрацией по типу задачи, если указан тип пользователя
@@ -365,145 +462,238 @@ def get_pending_tasks(user_type: str = None) -> list[dict]:
         list[dict]: список словарей с информацией о задачах
     """
     try:
-        with get_connection() as connection:
-            with connection.cursor(cursor_factory=psycopg2.extras.DictCursor) as cursor:
-                base_query = """
-                    SELECT 
-                        id_tasks,
-                        assignment_date as date,
-                        assignment_time as time,
-                        task_type,
-                        description,
-                        main_address,
-                        additional_address,
-                        required_workers,
-                        worker_price,
-                        assigned_performers
-                    FROM tasks
-                    WHERE task_status = 'Назначена'
-                """
-
-                if user_type == "loader":
-                    base_query += " AND task_type = 'Погрузка'"
-                elif user_type == "driver":
-                    base_query += " AND task_type = 'Доставка'"
-
-                base_query += " ORDER BY assignment_date, assignment_time"
-
-                cursor.execute(base_query)
-
-                return [
-                    {
-                        'id_tasks': row['id_tasks'],
-                        'date': row['date'],
-                        'time': row['time'],
-                        'task_type': row['task_type'],
-                        'description': row['description'],
-                        'main_address': row['main_address'],
-                        'additional_address': row['additional_address'],
-                        'required_workers': row['required_workers'],
-                        'worker_price': float(row['worker_price']),
-                        'assigned_performers': row['assigned_performers'] or [],
-                    }
-                    for row in cursor.fetchall()
-                ]
+        query = PENDING_TASKS_QUERY.format(type_filter=PENDING_TYPE_FILTERS.get(user_type, ""))
+
+        return [
+            {
+                'id_tasks': row['id_tasks'],
+                'date': row['date'],
+                'time': row['time'],
+                'task_type': row['task_type'],
+                'description': row['description'],
+                'main_address': row['main_address'],
+                'additional_address': row['additional_address'],
+                'required_workers': row['required_workers'],
+                'worker_price': float(row['worker_price']),
+                'claimed_count': row['claimed_count'],
+            }
+            for row in await pool.fetch(query)
+        ]
 
     except Exception as e:
         print(f"Ошибка при получении задач для типа '{user_type}': {e}")
         return []
 
 
-def add_to_assigned_performers(user_id, id_tasks):
-    """Добавляет id_user_telegram работника в список assigned_performers определённой задачи
-    и обновляет статистику исполнителя"""
+async def get_executor_pending_tasks(user_id):
+    """Задачи со статусом 'Назначена', подходящие исполнителю по роли.
+    Возвращает None, если пользователь не найден."""
+    # Роли пользователя (из кэша)
+    user_data = await get_user_access(user_id)
+
+    if not user_data:
+        return None
+
+    return await get_pending_for_types(executor_task_types(user_data['is_loader'], user_data['is_driver']))
+
+
+def executor_task_types(is_loader: bool, is_driver: bool) -> list:
+    """Типы задач, которые видит исполнитель"""
+    if is_loader and not is_driver:
+        return ["Погрузка"]
+    if is_driver and not is_loader:
+        return ["Доставка"]
+    return ["Погрузка", "Доставка"]
+
+
+async def get_pending_for_types(task_types: list) -> list:
+    """Свободные задачи нескольких типов, новые первыми"""
+    tasks = []
+    for task_type in task_types:
+        tasks += await get_board_tasks(task_type)
+    return sorted(tasks, key=lambda task: task['created_at'], reverse=True) if len(task_types) > 1 else tasks
+
+
+BOARD_TASKS_QUERY = """
+    SELECT * FROM tasks
+    WHERE task_status = 'Назначена' AND task_type = $1
+    ORDER BY created_at DESC
+"""
+
+
+async def get_board_tasks(task_type: str) -> list:
+    """Свободные задачи одного типа: из доски в памяти или из базы"""
+    tasks = task_board.get(task_type)
+    if tasks is not MISSING:
+        return tasks
+
+    version = task_board.version(task_type)
+    tasks = await pool.fetch(BOARD_TASKS_QUERY, task_type)
+    task_board.set(task_type, tasks, version)
+    return tasks
+
+
+async def listen_task_changes():
+    """Подписка доски задач на изменения (отдельное соединение вне пула)"""
+    await task_board.listen(lambda: asyncpg.connect(**connection_params()))
+
+
+# Взятие задачи одним запросом. Строка задачи блокируется (FOR UPDATE), поэтому
+# конкурирующие исполнители ждут друг друга и видят уже обновленный счетчик мест.
+# Исполнители хранятся только в task_performers, занятые места - в tasks.claimed_count.
+# Повторное взятие отсекает первичный ключ task_performers: место и статистика
+# считаются только по действительно вставленной строке (EXISTS в снимке запроса
+# не видит строку, вставленную параллельным нажатием того же исполнителя).
+CLAIM_TASK_QUERY = """
+    WITH task AS (
+        SELECT task_status, required_workers,
+               assignment_date, assignment_time, main_address,
+               claimed_count AS taken_slots
+        FROM tasks
+        WHERE id_tasks = $1
+        FOR UPDATE
+    ),
+    performer AS (
+        INSERT INTO task_performers (task_id, id_user_telegram)
+        SELECT $1, $2 FROM task
+        WHERE task.task_status = 'Назначена'
+          AND task.taken_slots < task.required_workers
+        ON CONFLICT DO NOTHING
+        RETURNING task_id
+    ),
+    claimed AS (
+        UPDATE tasks t
+        SET claimed_count = t.claimed_count + 1,
+            task_status = CASE
+                WHEN task.taken_slots + 1 >= t.required_workers THEN 'Работники найдены'
+                ELSE t.task_status
+            END
+        FROM task, performer
+        WHERE t.id_tasks = performer.task_id
+        RETURNING t.id_tasks
+    ),
+    stats AS (
+        INSERT INTO performer_stats (id_user_telegram, total_assigned)
+        SELECT $2, 1 FROM performer
+        ON CONFLICT (id_user_telegram)
+        DO UPDATE SET
+            total_assigned = performer_stats.total_assigned + 1,
+            last_updated = CURRENT_TIMESTAMP
+    )
+    SELECT task.*,
+           EXISTS (SELECT 1 FROM performer) AS claimed,
+           EXISTS (
+               SELECT 1 FROM task_performers
+               WHERE task_id = $1 AND id_user_telegram = $2
+           ) AS already_taken
+    FROM task
+"""
+
+
+async def add_to_assigned_performers(user_id, id_tasks):
+    """Назначает работника на задачу (task_performers) и обновляет статистику исполнителя.
+
+    Проверки, занятие места, запись в task_performers и статистика выполняются
+    одним запросом (CLAIM_TASK_QUERY) - один обмен с базой и одна транзакция."""
     if not isinstance(id_tasks, int):
         return "Некорректный номер задачи"
     try:
-        with get_connection() as conn:  # Автоматическое управление соединением
-            with conn.cursor() as cursor:
-                # Проверяем существование задачи
-                cursor.execute("SELECT id_tasks FROM tasks WHERE id_tasks = %s", (id_tasks,))
-                if not cursor.fetchone():
-                    return "Задача не найдена"
+        task_data = await pool.fetchrow(CLAIM_TASK_QUERY, id_tasks, user_id)
+    except Exception as e:
+        # При ошибке транзакция откатывается автоматически
+        return f"Произошла ошибка: {str(e)}"
 
-                # Проверяем, не добавлен ли уже пользователь в эту задачу
-                cursor.execute("""
-                    SELECT 1 FROM task_performers 
-                    WHERE task_id = %s AND id_user_telegram = %s
-                """, (id_tasks, user_id))
-                if cursor.fetchone():
-                    return f"Вы уже взяли задачу {id_tasks}"
-
-                # Получаем данные задачи
-                cursor.execute("""
-                    SELECT task_status, required_workers, assigned_performers, 
-                           assignment_date, assignment_time, main_address 
-                    FROM tasks 
-                    WHERE id_tasks = %s
-                """, (id_tasks,))
-                task_data = cursor.fetchone()
-
-                task_status = task_data[0]
+    if not task_data:
+        return "Задача не найдена"
+
+    if task_data['claimed']:
+        return (f"Вы взяли задачу {id_tasks}. Просьба прибыть без опозданий "
+                f"{task_data['assignment_date']} к {task_data['assignment_time']} "
+                f"по адресу {task_data['main_address']}")
+
+    # Место было, но строку не вставили - значит, исполнитель уже в задаче
+    # (в том числе если ее только что взяло параллельное нажатие)
+    if task_data['already_taken'] or (
+        task_data['task_status'] == 'Назначена' and task_data['taken_slots'] < task_data['required_workers']
+    ):
+        return f"Вы уже взяли задачу {id_tasks}"
+
+    # Проверяем статус задачи
+    task_status = task_data['task_status']
+    if task_status == 'Завершено':
+        return "Задача уже завершена"
+    elif task_status == 'Отменено':
+        return "Задача отменена"
+    elif task_status == 'Работники найдены':
+        return "Исполнители для задачи уже найдены"
+    elif task_status != 'Назначена':
+        return "Невозможно взять задачу: неожиданный статус"
+
+    return f"Исполнители на задачу {id_tasks} уже найдены"
+
+
+ACTIVE_TASKS_OF_USERS_QUERY = """
+    SELECT tp.id_user_telegram AS performer_id, t.*
+    FROM task_performers tp
+    JOIN tasks t ON t.id_tasks = tp.task_id
+    WHERE tp.id_user_telegram = ANY($1::bigint[])
+      AND t.task_status IN ('Назначена', 'Работники найдены')
+    ORDER BY t.assignment_date, t.assignment_time
+"""
+
+
+async def get_active_tasks_of_users(user_ids: list) -> dict:
+    """Активные задачи нескольких исполнителей одним запросом: {id исполнителя: [задачи]}"""
+    rows = await pool.fetch(ACTIVE_TASKS_OF_USERS_QUERY, user_ids)
+    result = {user_id: [] for user_id in user_ids}
+    for row in rows:
+        result[row['performer_id']].append(row)
+    return result
+
+
+def format_task_line(task) -> str:
+    """Задача одной строкой: для списков и сводок"""
+    when = " ".join(
+        value.strftime(pattern)
+        for value, pattern in ((task['assignment_date'], '%d.%m.%Y'), (task['assignment_time'], '%H:%M'))
+        if value
+    ) or "без даты"
+    return (
+        f"• № {task['id_tasks']} {task['task_type']}, {when}, "
+        f"{task['main_address']}, {task['required_workers']} чел., {float(task['worker_price'])} руб./чел."
+    )
 
-                # Проверяем статус задачи
-                if task_status == 'Завершено':
-                    return "Задача уже завершена"
-                elif task_status == 'Отменено':
-                    return "Задача отменена"
-                elif task_status == 'Работники найдены':
-                    return "Исполнители для задачи уже найдены"
-                elif task_status != 'Назначена':
-                    return "Невозможно взять задачу: неожиданный статус"
-
-                # Обрабатываем случай, когда статус 'Назначена'
-                required_workers = task_data[1]
-                assigned_performers = task_data[2] if task_data[2] else []
-                remaining_slots = required_workers - len(assigned_performers)
-
-                if remaining_slots <= 0:
-                    return f"Исполнители на задачу {id_tasks} уже найдены"
-
-                # Добавляем пользователя в список исполнителей
-                assigned_performers.append(user_id)
-                cursor.execute("""
-                    UPDATE tasks 
-                    SET assigned_performers = %s 
-                    WHERE id_tasks = %s
-                """, (assigned_performers, id_tasks))
-
-                # Добавляем запись в таблицу связей
-                cursor.execute("""
-                    INSERT INTO task_performers (task_id, id_user_telegram)
-                    VALUES (%s, %s)
-                """, (id_tasks, user_id))
-
-                # Обновляем статистику исполнителя (увеличиваем счетчик назначенных задач)
-                cursor.execute("""
-                    INSERT INTO performer_stats (id_user_telegram, total_assigned)
-                    VALUES (%s, 1)
-                    ON CONFLICT (id_user_telegram) 
-                    DO UPDATE SET 
-                        total_assigned = performer_stats.total_assigned + 1,
-                        last_updated = CURRENT_TIMESTAMP
-                """, (user_id,))
 
-                # Проверяем, заполнены ли все места
-                if remaining_slots == 1:
-                    cursor.execute("""
-                        UPDATE tasks 
-                        SET task_status = 'Работники найдены' 
-                        WHERE id_tasks = %s
-                    """, (id_tasks,))
+def format_task_details(task) -> str:
+    """Задача со всеми полями, которые нужны исполнителю: описание, доп. адрес"""
+    task_info = (
+        f"🆔 Номер задачи: {task['id_tasks']}\n"
+        f"🔹 Тип: {task['task_type']}\n"
+        f"📅 Дата: {task['assignment_date']}\n"
+        f"⏰ Время: {task['assignment_time']}\n"
+        f"📍 Адрес: {task['main_address']}"
+    )
+    if task['additional_address']:
+        task_info += f" ({task['additional_address']})"
+    return task_info + (
+        f"\n📝 Описание: {task['description']}\n"
+        f"👷 Требуется работников: {task['required_workers']}\n"
+        f"💰 Цена за работу: {task['worker_price']} руб.\n"
+        f"────────────────────"
+    )
 
-                return (f"Вы взяли задачу {id_tasks}. Просьба прибыть без опозданий "
-                        f"{task_data[3]} к {task_data[4]} по адресу {task_data[5]}")
 
-    except Exception as e:
-        # В случае ошибки with автоматически откатывает изменения
-        return f"Произошла ошибка: {str(e)}"
+USER_TASKS_QUERY = """
+    SELECT t.*
+    FROM tasks t
+    JOIN task_performers tp ON t.id_tasks = tp.task_id
+    WHERE tp.id_user_telegram = $1
+    AND t.task_status IN ('Назначена', 'Работники найдены')
+    ORDER BY t.assignment_date, t.assignment_time
+"""
 
 
-def get_user_tasks(user_id):
+async def get_user_tasks(user_id):
     """
     Возвращает список задач, в которых участвует пользователь со статусом 'Назначена' или 'Работники найдены'
 
@@ -511,93 +701,56 @@ def get_user_tasks(user_id):
     :return: строка с информацией о задачах или сообщение об их отсутствии
     """
     try:
-        with get_connection() as conn:  # Автоматическое управление соединением
-            with conn.cursor(cursor_factory=DictCursor) as cursor:  # Используем DictCursor для получения словарей
-                # Получаем все активные задачи, где пользователь является исполнителем
-                cursor.execute("""
-                    SELECT t.* 
-                    FROM tasks t
-                    JOIN task_performers tp ON t.id_tasks = tp.task_id
-                    WHERE tp.id_user_telegram = %s
-                    AND t.task_status IN ('Назначена', 'Работники найдены')
-                    ORDER BY t.assignment_date, t.assignment_time
-                """, (user_id,))
-
-                tasks = cursor.fetchall()
-
-                if not tasks:
-                    return "Открытых заявок с вашим участием нет"
-
-                result = []
-                for task in tasks:
-                    task_info = (
-                        f"🆔 Номер задачи: {task['id_tasks']}\n"
-                        f"🔹 Тип: {task['task_type']}\n"
-                        f"📅 Дата: {task['assignment_date']}\n"
-                        f"⏰ Время: {task['assignment_time']}\n"
-                        f"📍 Адрес: {task['main_address']}"
-                    )
-
-                    if task['additional_address']:
-                        task_info += f" ({task['additional_address']})"
-
-                    task_info += (
-                        f"\n📝 Описание: {task['description']}\n"
-                        f"👷 Требуется работников: {task['required_workers']}\n"
-                        f"💰 Цена за работу: {task['worker_price']} руб.\n"
-                        f"────────────────────"
-                    )
+        # Получаем все активные задачи, где пользователь является исполнителем
+        tasks = await pool.fetch(USER_TASKS_QUERY, user_id)
 
-                    result.append(task_info)
+        if not tasks:
+            return "Открытых заявок с вашим участием нет"
 
-                return "\n\n".join(result)
+        return "\n\n".join(format_task_details(task) for task in tasks)
 
     except Exception as e:
         print(f"Ошибка при получении задач пользователя: {e}")
         return "Произошла ошибка при получении данных о задачах"
 
 
-def my_data(user_id):
+async def my_data(user_id):
     """Анкета пользователя по его ID в Telegram
     для исполнителей."""
     try:
-        with get_connection() as conn:
-            with conn.cursor(cursor_factory=DictCursor) as cursor:
-                cursor.execute("""
-                    SELECT 
-                        first_name, 
-                        last_name, 
-                        phone, 
-                        is_loader, 
-                        is_driver, 
-                        is_self_employed
-                    FROM users
-                    WHERE id_user_telegram = %s
-                """, (user_id,))
-
-                user_data = cursor.fetchone()
-
-                if user_data:
-                    # Формируем строку с эмодзи
-                    result = (
-                        f"👤 Профиль пользователя:\n\n"
-                        f"👨‍💼 Имя: {user_data['first_name']} {user_data['last_name']}\n"
-                        f"📱 Телефон: {user_data['phone']}\n"
-                        f"🔧 Роли:\n"
-                        f"{'✅' if user_data['is_loader'] else '❌'} Грузчик\n"
-                        f"{'✅' if user_data['is_driver'] else '❌'} Водитель\n"
-                        f"{'✅' if user_data['is_self_employed'] else '❌'} Самозанятый"
-                    )
-                    return result
-                else:
-                    return "❌ Пользователь не найден"
+        user_data = await pool.fetchrow("""
+            SELECT
+                first_name,
+                last_name,
+                phone,
+                is_loader,
+                is_driver,
+                is_self_employed
+            FROM users
+            WHERE id_user_telegram = $1
+        """, user_id)
+
+        if user_data:
+            # Формируем строку с эмодзи
+            result = (
+                f"👤 Профиль пользователя:\n\n"
+                f"👨‍💼 Имя: {user_data['first_name']} {user_data['last_name']}\n"
+                f"📱 Телефон: {user_data['phone']}\n"
+                f"🔧 Роли:\n"
+                f"{'✅' if user_data['is_loader'] else '❌'} Грузчик\n"
+                f"{'✅' if user_data['is_driver'] else '❌'} Водитель\n"
+                f"{'✅' if user_data['is_self_employed'] else '❌'} Самозанятый"
+            )
+            return result
+        else:
+            return "❌ Пользователь не найден"
 
     except Exception as e:
         print(f"Ошибка при получении данных пользователя: {e}")
         return "⚠️ Произошла ошибка при получении данных"
 
 
-def contractor_statistics_database(user_id: int) -> str:
+async def contractor_statistics_database(user_id: int) -> str:
     """Возвращает статистику исполнителя в формате:
     📊 Статистика заказов:
     • Взял X
@@ -605,38 +758,34 @@ def contractor_statistics_database(user_id: int) -> str:
     • Отказался W (V%)
     """
     try:
-        with get_connection() as conn:
-            with conn.cursor() as cursor:
-                # Получаем статистику исполнителя
-                cursor.execute("""
-                    SELECT total_assigned, completed, canceled
-                    FROM performer_stats
-                    WHERE id_user_telegram = %s
-                """, (user_id,))
-
-                stats = cursor.fetchone()
-
-                if not stats:
-                    # Если записи нет, значит исполнитель ещё не брал задач
-                    return """📊 Статистика заказов:
-                        • Взял 0
-                        • Выполнил 0 (0%)
-                        • Отказался 0 (0%)"""
-
-                total_assigned, completed, canceled = stats
-
-                # Рассчитываем проценты (избегаем деления на ноль)
-                completed_percent = 0
-                canceled_percent = 0
-
-                if total_assigned > 0:
-                    completed_percent = round((completed / total_assigned) * 100)
-                    canceled_percent = round((canceled / total_assigned) * 100)
-
-                return f"""📊 Статистика заказов:
-                    • Взял {total_assigned}
-                    • Выполнил {completed} ({completed_percent}%)
-                    • Отказался {canceled} ({canceled_percent}%)"""
+        # Получаем статистику исполнителя
+        stats = await pool.fetchrow("""
+            SELECT total_assigned, completed, canceled
+            FROM performer_stats
+            WHERE id_user_telegram = $1
+        """, int(user_id))
+
+        if not stats:
+            # Если записи нет, значит исполнитель ещё не брал задач
+            return """📊 Статистика заказов:
+                • Взял 0
+                • Выполнил 0 (0%)
+                • Отказался 0 (0%)"""
+
+        total_assigned, completed, canceled = stats
+
+        # Рассчитываем проценты (избегаем деления на ноль)
+        completed_percent = 0
+        canceled_percent = 0
+
+        if total_assigned > 0:
+            completed_percent = round((completed / total_assigned) * 100)
+            canceled_percent = round((canceled / total_assigned) * 100)
+
+        return f"""📊 Статистика заказов:
+            • Взял {total_assigned}
+            • Выполнил {completed} ({completed_percent}%)
+            • Отказался {canceled} ({canceled_percent}%)"""
 
     except Exception as e:
         logger.error(f"Ошибка при получении статистики для пользователя {user_id}: {e}")
@@ -646,68 +795,170 @@ def contractor_statistics_database(user_id: int) -> str:
             • Отказался 0 (0%)"""
 
 
-def dell_to_assigned_performers(user_id: int, id_tasks: int) -> str:
+async def get_upcoming_tasks() -> list:
+    """Активные задачи с известным временем начала, которое еще не наступило"""
+    return await pool.fetch("""
+        SELECT id_tasks, assignment_date + assignment_time AS starts_at
+        FROM tasks
+        WHERE task_status IN ('Назначена', 'Работники найдены')
+          AND assignment_date IS NOT NULL
+          AND assignment_time IS NOT NULL
+          AND assignment_date + assignment_time > LOCALTIMESTAMP
+    """)
+
+
+async def send_task_reminders(due: list) -> int:
+    """
+    Ставит в очередь напоминания исполнителям задач одним запросом.
+    Каждый исполнитель получает напоминание с данным offset один раз: отправленные
+    записываются в task_reminders в той же транзакции, что и очередь уведомлений.
+    :param due: [(номер задачи, за сколько минут до начала), ...]
+    :return: количество поставленных в очередь напоминаний
+    """
+    task_ids = [task_id for task_id, _ in due]
+    offsets = [offset for _, offset in due]
+    result = await pool.execute("""
+        WITH due AS (
+            SELECT * FROM unnest($1::bigint[], $2::int[]) AS d(task_id, offset_minutes)
+        ),
+        recipients AS (
+            INSERT INTO task_reminders (task_id, id_user_telegram, offset_minutes)
+            SELECT tp.task_id, tp.id_user_telegram, due.offset_minutes
+            FROM due
+            JOIN tasks t ON t.id_tasks = due.task_id
+            JOIN task_performers tp ON tp.task_id = due.task_id
+            WHERE t.task_status IN ('Назначена', 'Работники найдены')
+            ON CONFLICT DO NOTHING
+            RETURNING task_id, id_user_telegram, offset_minutes
+        )
+        INSERT INTO notification_outbox (chat_id, text)
+        SELECT r.id_user_telegram,
+               format(
+                   E'⏰ Напоминание: смена по задаче № %s через %s\n' ||
+                   E'📅 Дата: %s\n🕒 Время: %s\n🏠 Адрес: %s',
+                   t.id_tasks,
+                   -- Сколько осталось на самом деле: напоминание могло уйти позже
+                   -- (после перезапуска бота или когда исполнитель взял задачу поздно)
+                   CASE
+                       WHEN t.assignment_date + t.assignment_time - LOCALTIMESTAMP >= interval '1 hour'
+                       THEN round(extract(epoch FROM t.assignment_date + t.assignment_time - LOCALTIMESTAMP) / 3600) || ' ч.'
+                       ELSE ceil(extract(epoch FROM t.assignment_date + t.assignment_time - LOCALTIMESTAMP) / 60) || ' мин.'
+                   END,
+                   to_char(t.assignment_date, 'DD.MM.YYYY'),
+                   to_char(t.assignment_time, 'HH24:MI'),
+                   t.main_address
+               )
+        FROM recipients r
+        JOIN tasks t ON t.id_tasks = r.task_id
+    """, task_ids, offsets)
+    return int(result.split()[-1])
+
+
+async def recompute_performer_stats() -> int:
+    """
+    Пересчитывает performer_stats по task_performers и статусам задач за один проход,
+    включая архив (tasks_archive, task_performers_archive).
+    completed - завершенные задачи исполнителя, total_assigned - текущие назначения
+    плюс отказы: при отказе запись из task_performers удаляется, а в total_assigned
+    взятие задачи остается. Отказы нигде больше не записаны, поэтому canceled не меняется.
+    :return: количество исправленных строк
+    """
+    return await pool.fetchval("""
+        WITH performers AS (
+            SELECT tp.id_user_telegram, t.task_status
+            FROM task_performers tp
+            JOIN tasks t ON t.id_tasks = tp.task_id
+            UNION ALL
+            SELECT tpa.id_user_telegram, ta.task_status
+            FROM task_performers_archive tpa
+            JOIN tasks_archive ta
+              ON ta.id_tasks = tpa.task_id AND ta.created_at = tpa.task_created_at
+        ),
+        actual AS (
+            SELECT id_user_telegram,
+                   COUNT(*) AS assigned,
+                   COUNT(*) FILTER (WHERE task_status = 'Завершено') AS completed
+            FROM performers
+            GROUP BY id_user_telegram
+        ),
+        repaired AS (
+            INSERT INTO performer_stats (id_user_telegram, total_assigned, completed)
+            SELECT COALESCE(a.id_user_telegram, ps.id_user_telegram),
+                   COALESCE(a.assigned, 0),
+                   COALESCE(a.completed, 0)
+            FROM actual a
+            FULL JOIN performer_stats ps ON ps.id_user_telegram = a.id_user_telegram
+            ON CONFLICT (id_user_telegram)
+            DO UPDATE SET
+                total_assigned = EXCLUDED.total_assigned + performer_stats.canceled,
+                completed = EXCLUDED.completed,
+                last_updated = CURRENT_TIMESTAMP
+            WHERE (performer_stats.total_assigned, performer_stats.completed)
+                IS DISTINCT FROM (EXCLUDED.total_assigned + performer_stats.canceled, EXCLUDED.completed)
+            RETURNING 1
+        )
+        SELECT COUNT(*) FROM repaired
+    """)
+
+
+async def dell_to_assigned_performers(user_id: int, id_tasks: int) -> str:
     """Удаляет пользователя из списка исполнителей задачи
     и обновляет статистику отказов"""
     if not isinstance(id_tasks, int):
         return "Некорректный номер задачи"
 
     try:
-        with get_connection() as conn:
-            with conn.cursor() as cursor:
-                # Проверяем существование задачи
-                cursor.execute("SELECT id_tasks FROM tasks WHERE id_tasks = %s", (id_tasks,))
-                if not cursor.fetchone():
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                # Получаем данные задачи; строка блокируется до конца транзакции
+                task_status = await conn.fetchval("""
+                    SELECT task_status FROM tasks WHERE id_tasks = $1 FOR UPDATE
+                """, id_tasks)
+                if not task_status:
                     return "Задача не найдена"
 
-                # Получаем данные задачи
-                cursor.execute("""
-                    SELECT task_status, required_workers, assigned_performers
-                    FROM tasks 
-                    WHERE id_tasks = %s
-                """, (id_tasks,))
-                task_data = cursor.fetchone()
-
-                task_status = task_data[0]
-                assigned_performers = task_data[2] if task_data[2] else []
-
-                # Проверяем, что пользователь есть в списке исполнителей
-                if user_id not in assigned_performers:
-                    return "Вы не были назначены на эту задачу"
-
                 # Проверяем статус задачи
-                if task_status == 'Завершено':
-                    return "Нельзя отказаться от завершенной задачи"
-                elif task_status == 'Отменено':
+                if task_status in ('Завершено', 'Отменено'):
+                    if not await conn.fetchval("""
+                        SELECT EXISTS (
+                            SELECT 1 FROM task_performers
+                            WHERE task_id = $1 AND id_user_telegram = $2
+                        )
+                    """, id_tasks, user_id):
+                        return "Вы не были назначены на эту задачу"
+                    if task_status == 'Завершено':
+                        return "Нельзя отказаться от завершенной задачи"
                     return "Задача уже отменена"
 
-                # Удаляем пользователя из списка исполнителей
-                new_performers = [pid for pid in assigned_performers if pid != user_id]
-                cursor.execute("""
-                    UPDATE tasks 
-                    SET assigned_performers = %s,
-                        task_status = CASE 
-                            WHEN %s = 'Работники найдены' THEN 'Назначена'
+                # Удаляем запись из таблицы связей. Место и статистика меняются, только
+                # если строка действительно удалена: параллельный отказ ее уже не найдет
+                if not await conn.fetchval("""
+                    DELETE FROM task_performers
+                    WHERE task_id = $1 AND id_user_telegram = $2
+                    RETURNING id_user_telegram
+                """, id_tasks, user_id):
+                    return "Вы не были назначены на эту задачу"
+
+                # Освобождаем место в задаче
+                await conn.execute("""
+                    UPDATE tasks
+                    SET claimed_count = claimed_count - 1,
+                        task_status = CASE
+                            WHEN task_status = 'Работники найдены' THEN 'Назначена'
                             ELSE task_status
                         END
-                    WHERE id_tasks = %s
-                """, (new_performers if new_performers else None, task_status, id_tasks))
-
-                # Удаляем запись из таблицы связей
-                cursor.execute("""
-                    DELETE FROM task_performers 
-                    WHERE task_id = %s AND id_user_telegram = %s
-                """, (id_tasks, user_id))
+                    WHERE id_tasks = $1
+                """, id_tasks)
 
                 # Обновляем статистику исполнителя (увеличиваем счетчик отмененных задач)
-                cursor.execute("""
+                await conn.execute("""
                     INSERT INTO performer_stats (id_user_telegram, canceled)
-                    VALUES (%s, 1)
-                    ON CONFLICT (id_user_telegram) 
-                    DO UPDATE SET 
+                    VALUES ($1, 1)
+                    ON CONFLICT (id_user_telegram)
+                    DO UPDATE SET
                         canceled = performer_stats.canceled + 1,
                         last_updated = CURRENT_TIMESTAMP
-                """, (user_id,))
+                """, user_id)
 
                 return (f"Вы отказались от задачи {id_tasks}. "
                         f"Ваш рейтинг понижен.")
@@ -716,7 +967,7 @@ def dell_to_assigned_performers(user_id: int, id_tasks: int) -> str:
         return f"Произошла ошибка: {str(e)}"
 
 
-def complete_the_task_database(task_text: str) -> str:
+async def complete_the_task_database(task_text: str) -> str:
     """Завершает задачу и обновляет статистику исполнителей"""
     try:
         # Проверяем, что передан номер задачи (число)
@@ -725,40 +976,28 @@ def complete_the_task_database(task_text: str) -> str:
 
         id_tasks = int(task_text)
 
-        with get_connection() as conn:
-            with conn.cursor() as cursor:
-                # 1. Проверяем существование задачи
-                cursor.execute("""
-                    SELECT id_tasks, assigned_performers 
-                    FROM tasks 
-                    WHERE id_tasks = %s
-                """, (id_tasks,))
-
-                task_data = cursor.fetchone()
-                if not task_data:
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                # 1. Обновляем статус задачи (заодно проверяем, что она существует)
+                if not await conn.fetchval("""
+                    UPDATE tasks
+                    SET task_status = 'Завершено'
+                    WHERE id_tasks = $1
+                    RETURNING id_tasks
+                """, id_tasks):
                     return "Задача не найдена"
 
-                # 2. Обновляем статус задачи
-                cursor.execute("""
-                    UPDATE tasks 
-                    SET task_status = 'Завершено' 
-                    WHERE id_tasks = %s
-                """, (id_tasks,))
-
-                # 3. Получаем список исполнителей
-                assigned_performers = task_data[1] if task_data[1] else []
-
-                if assigned_performers:
-                    # 4. Обновляем статистику для каждого исполнителя
-                    for performer_id in assigned_performers:
-                        cursor.execute("""
-                            INSERT INTO performer_stats (id_user_telegram, completed)
-                            VALUES (%s, 1)
-                            ON CONFLICT (id_user_telegram) 
-                            DO UPDATE SET 
-                                completed = performer_stats.completed + 1,
-                                last_updated = CURRENT_TIMESTAMP
-                        """, (performer_id,))
+                # 2. Обновляем статистику всех исполнителей задачи одним запросом
+                await conn.execute("""
+                    INSERT INTO performer_stats (id_user_telegram, completed)
+                    SELECT id_user_telegram, 1
+                    FROM task_performers
+                    WHERE task_id = $1
+                    ON CONFLICT (id_user_telegram)
+                    DO UPDATE SET
+                        completed = performer_stats.completed + 1,
+                        last_updated = CURRENT_TIMESTAMP
+                """, id_tasks)
 
                 return f"Задача {id_tasks} успешно завершена. Исполнителям добавлено + 1 в карму."
 
@@ -766,8 +1005,8 @@ def complete_the_task_database(task_text: str) -> str:
         return f"Ошибка при завершении задачи: {str(e)}"
 
 
-async def delete_the_task_database(task_text: str, bot: Bot = None) -> str:
-    """Удаляет задачу, корректирует статистику и уведомляет исполнителей"""
+async def delete_the_task_database(task_text: str) -> str:
+    """Удаляет задачу, корректирует статистику и ставит уведомления исполнителям в очередь"""
     try:
         # Проверяем, что передан номер задачи (число)
         if not task_text.isdigit():
@@ -775,181 +1014,230 @@ async def delete_the_task_database(task_text: str, bot: Bot = None) -> str:
 
         id_tasks = int(task_text)
 
-        with get_connection() as conn:
-            with conn.cursor() as cursor:
+        async with pool.acquire() as conn:
+            async with conn.transaction():
                 # 1. Получаем данные задачи перед удалением
-                cursor.execute("""
-                    SELECT assigned_performers, task_type 
-                    FROM tasks 
-                    WHERE id_tasks = %s
-                """, (id_tasks,))
-
-                task_data = cursor.fetchone()
-                if not task_data:
-                    return f"❌ Задача {id_tasks} не найдена"
+                task_type = await conn.fetchval("""
+                    SELECT task_type
+                    FROM tasks
+                    WHERE id_tasks = $1
+                    FOR UPDATE
+                """, id_tasks)  # 'Погрузка' или 'Доставка'
 
-                assigned_performers = task_data[0] if task_data[0] else []
-                task_type = task_data[1]  # 'Погрузка' или 'Доставка'
+                if not task_type:
+                    return f"❌ Задача {id_tasks} не найдена"
 
-                # 2. Уменьшаем счетчики у исполнителей (если они есть)
-                if assigned_performers:
-                    for performer_id in assigned_performers:
-                        cursor.execute("""
-                            UPDATE performer_stats 
-                            SET total_assigned = GREATEST(0, total_assigned - 1),
-                                last_updated = CURRENT_TIMESTAMP
-                            WHERE id_user_telegram = %s
-                        """, (performer_id,))
+                # 2. Уменьшаем счетчики у исполнителей (пока task_performers не удалены каскадом)
+                await conn.execute("""
+                    UPDATE performer_stats
+                    SET total_assigned = GREATEST(0, total_assigned - 1),
+                        last_updated = CURRENT_TIMESTAMP
+                    WHERE id_user_telegram IN (
+                        SELECT id_user_telegram FROM task_performers WHERE task_id = $1
+                    )
+                """, id_tasks)
 
                 # 3. Удаляем задачу
-                cursor.execute("""
-                    DELETE FROM tasks 
-                    WHERE id_tasks = %s
+                if not await conn.fetchval("""
+                    DELETE FROM tasks
+                    WHERE id_tasks = $1
                     RETURNING id_tasks
-                """, (id_tasks,))
-
-                if not cursor.fetchone():
+                """, id_tasks):
                     return f"❌ Не удалось удалить задачу {id_tasks}"
 
-                # 4. Уведомляем всех исполнителей соответствующего типа
-                if bot:
-                    user_type = 'грузчиков' if task_type == 'Погрузка' else 'водителей'
-                    notification = f"🔔 Задача {id_tasks} ({task_type}) была удалена администратором"
-
-                    # Получаем всех активных исполнителей этого типа
-                    performer_ids = get_all_users_type(task_type)
-
-                    for user_id in performer_ids:
-                        try:
-                            await bot.send_message(user_id, notification)
-                        except Exception as e:
-                            print(f"Не удалось уведомить пользователя {user_id}: {e}")
+                # 4. Уведомления всем исполнителям этого типа - в той же транзакции,
+                # отправит их фоновый обработчик очереди
+                await enqueue_for_users_type(
+                    conn, task_type, f"🔔 Задача {id_tasks} ({task_type}) была удалена администратором"
+                )
 
-                return f"✅ Задача {id_tasks} удалена. Уведомлены все {user_type}."
+        user_type = 'грузчиков' if task_type == 'Погрузка' else 'водителей'
+        return f"✅ Задача {id_tasks} удалена. Уведомлены все {user_type}."
 
     except Exception as e:
         logger.error(f"Ошибка при удалении задачи {task_text}: {str(e)}")
         return f"❌ Ошибка при удалении задачи: {str(e)}"
 
 
-def all_order_admin_database() -> str:
-    """Возвращает форматированную информацию о всех активных задачах"""
-    try:
-        with get_connection() as conn:
-            with conn.cursor() as cursor:
-                # Получаем все активные задачи
-                cursor.execute("""
-                    SELECT 
-                        id_tasks, 
-                        created_at,
-                        assignment_date,
-                        assignment_time,
-                        task_type,
-                        description,
-                        main_address,
-                        additional_address,
-                        required_workers,
-                        worker_price,
-                        assigned_performers,
-                        task_status
-                    FROM tasks
-                    WHERE task_status IN ('Назначена', 'Работники найдены')
-                    ORDER BY assignment_date, assignment_time
-                """)
-
-                tasks = cursor.fetchall()
-
-                if not tasks:
-                    return "ℹ️ Активных задач не найдено"
-
-                result = []
-                for task in tasks:
-                    # Получаем информацию о назначенных исполнителях
-                    assigned_performers = []
-                    if task[10]:  # Если есть assigned_performers
-                        cursor.execute("""
-                            SELECT id_user_telegram, first_name, last_name, phone
-                            FROM users
-                            WHERE id_user_telegram = ANY(%s)
-                        """, (task[10],))
-                        assigned_performers = cursor.fetchall()
-
-                    # Форматируем информацию о задаче
-                    task_info = (
-                        f"🔹 Номер задачи: {task[0]}\n"
-                        f"📅 Дата создания: {task[1].strftime('%d.%m.%Y %H:%M')}\n"
-                        f"📆 Дата выполнения: {task[2] if task[2] else 'Не указана'}\n"
-                        f"⏰ Время: {task[3] if task[3] else 'Не указано'}\n"
-                        f"🏷 Тип: {task[4]}\n"
-                        f"📝 Описание: {task[5]}\n"
-                        f"🏠 Адрес: {task[6]}\n"
-                        f"🏡 Доп. адрес: {task[7] if task[7] else 'Нет'}\n"
-                        f"👷 Требуется работников: {task[8]}\n"
-                        f"💰 Цена за работу: {task[9]} руб.\n"
-                        f"📊 Статус: {task[11]}\n"
-                    )
+# Telegram не принимает сообщения длиннее 4096 символов
+MESSAGE_LIMIT = 4096
+# Сколько задач читаем из базы на одну страницу
+TASKS_PAGE_SIZE = 20
+
+# Активные задачи вместе с исполнителями одним запросом. Ключ сортировки
+# (дата, время, номер) без NULL: задачи без даты и времени идут в конце списка.
+# Курсор передается текстом "дата_время_номер" и попадает в callback_data кнопок.
+# Сначала по индексу берется страница задач, затем к ней присоединяются исполнители.
+ACTIVE_TASKS_QUERY = """
+    WITH page AS (
+        SELECT
+            id_tasks,
+            created_at,
+            assignment_date,
+            assignment_time,
+            task_type,
+            description,
+            main_address,
+            additional_address,
+            required_workers,
+            worker_price,
+            task_status,
+            COALESCE(assignment_date, 'infinity'::date) AS sort_date,
+            COALESCE(assignment_time, '24:00'::time) AS sort_time
+        FROM tasks
+        WHERE task_status IN ('Назначена', 'Работники найдены')
+          AND ($1::text IS NULL OR (
+              COALESCE(assignment_date, 'infinity'::date),
+              COALESCE(assignment_time, '24:00'::time),
+              id_tasks
+          ) {op} ($1::text::date, $2::text::time, $3::bigint))
+        ORDER BY
+            COALESCE(assignment_date, 'infinity'::date) {order},
+            COALESCE(assignment_time, '24:00'::time) {order},
+            id_tasks {order}
+        LIMIT $4
+    )
+    SELECT
+        page.*,
+        COALESCE(
+            json_agg(json_build_object(
+                'id', u.id_user_telegram,
+                'first_name', u.first_name,
+                'last_name', u.last_name,
+                'phone', u.phone
+            ) ORDER BY u.last_name, u.first_name) FILTER (WHERE u.id_user_telegram IS NOT NULL),
+            '[]'
+        ) AS performers,
+        concat_ws('_', page.sort_date, page.sort_time, page.id_tasks) AS cursor
+    FROM page
+    LEFT JOIN task_performers tp ON tp.task_id = page.id_tasks
+    LEFT JOIN users u ON u.id_user_telegram = tp.id_user_telegram
+    GROUP BY page.id_tasks, page.created_at, page.assignment_date, page.assignment_time,
+             page.task_type, page.description, page.main_address, page.additional_address,
+             page.required_workers, page.worker_price, page.task_status,
+             page.sort_date, page.sort_time
+    ORDER BY page.sort_date {order}, page.sort_time {order}, page.id_tasks {order}
+"""
+ACTIVE_TASKS_AFTER = ACTIVE_TASKS_QUERY.format(op=">", order="ASC")
+ACTIVE_TASKS_BEFORE = ACTIVE_TASKS_QUERY.format(op="<", order="DESC")
+
+
+def format_admin_task(task) -> str:
+    """Карточка задачи для списка активных задач администратора"""
+    task_info = (
+        f"🔹 Номер задачи: {task['id_tasks']}\n"
+        f"📅 Дата создания: {task['created_at'].strftime('%d.%m.%Y %H:%M')}\n"
+        f"📆 Дата выполнения: {task['assignment_date'] if task['assignment_date'] else 'Не указана'}\n"
+        f"⏰ Время: {task['assignment_time'] if task['assignment_time'] else 'Не указано'}\n"
+        f"🏷 Тип: {task['task_type']}\n"
+        f"📝 Описание: {task['description']}\n"
+        f"🏠 Адрес: {task['main_address']}\n"
+        f"🏡 Доп. адрес: {task['additional_address'] if task['additional_address'] else 'Нет'}\n"
+        f"👷 Требуется работников: {task['required_workers']}\n"
+        f"💰 Цена за работу: {task['worker_price']} руб.\n"
+        f"📊 Статус: {task['task_status']}\n"
+    )
+
+    performers = json.loads(task['performers'])
+    if performers:
+        task_info += "\n👥 Назначенные исполнители:\n"
+        for performer in performers:
+            task_info += (
+                f"  👤 {performer['first_name']} {performer['last_name']} "
+                f"(ID: {performer['id']}, 📞 {performer['phone']})\n"
+            )
+    else:
+        task_info += "\n⚠️ Исполнители еще не назначены\n"
 
-                    # Форматируем информацию о назначенных исполнителях
-                    if assigned_performers:
-                        performers_info = "\n👥 Назначенные исполнители:\n"
-                        for performer in assigned_performers:
-                            performers_info += (
-                                f"  👤 {performer[1]} {performer[2]} "
-                                f"(ID: {performer[0]}, 📞 {performer[3]})\n"
-                            )
-                        task_info += performers_info
-                    else:
-                        task_info += "\n⚠️ Исполнители еще не назначены\n"
+    # Одна задача с очень длинным описанием не должна ломать отправку страницы
+    return task_info[:MESSAGE_LIMIT]
 
-                    result.append(task_info)
 
-                return "\n\n".join(result)
+async def all_order_admin_database(cursor: str = None, backward: bool = False):
+    """Страница активных задач для администратора.
+
+    Возвращает (текст, курсор предыдущей страницы, курсор следующей страницы).
+    Страница заполняется задачами, пока текст помещается в одно сообщение.
+    Курсор None - соседней страницы нет.
+    """
+    try:
+        if cursor:
+            date, time_, id_tasks = cursor.split("_")
+            params = (date, time_, int(id_tasks))
+        else:
+            params = (None, None, None)
+
+        query = ACTIVE_TASKS_BEFORE if backward else ACTIVE_TASKS_AFTER
+        tasks = await pool.fetch(query, *params, TASKS_PAGE_SIZE + 1)
+
+        page = []
+        length = 0
+        for task in tasks[:TASKS_PAGE_SIZE]:
+            text = format_admin_task(task)
+            added = len(text) + (2 if page else 0)
+            if page and length + added > MESSAGE_LIMIT:
+                break
+            page.append((task['cursor'], text))
+            length += added
+
+        if not page:
+            if cursor:
+                # Задачи с соседней страницы успели завершить - показываем начало списка
+                return await all_order_admin_database()
+            return "ℹ️ Активных задач не найдено", None, None
+
+        has_more = len(page) < len(tasks)
+        if backward:
+            page.reverse()
+            prev_cursor = page[0][0] if has_more else None
+            next_cursor = page[-1][0]
+        else:
+            prev_cursor = page[0][0] if cursor else None
+            next_cursor = page[-1][0] if has_more else None
+
+        return "\n\n".join(text for _, text in page), prev_cursor, next_cursor
 
     except Exception as e:
         logger.error(f"Ошибка при получении списка задач: {str(e)}")
-        return "❌ Произошла ошибка при получении списка задач"
+        return "❌ Произошла ошибка при получении списка задач", None, None
 
 
-def contractor_delite_database(user_id: int) -> str:
+async def contractor_delite_database(user_id: int) -> str:
     try:
-        with connect_to_database() as connection:
-            print("DEBUG: Подключение к БД установлено")  # Логирование
-
-            with connection.cursor() as cursor:
-                # Проверка существования пользователя
-                cursor.execute("SELECT status FROM users WHERE id_user_telegram = %s", (user_id,))
-                user_data = cursor.fetchone()
-                print(f"DEBUG: Данные пользователя: {user_data}")  # Логирование
-
-                if not user_data:
-                    return f"Пользователь с ID {user_id} не найден."
-
-                current_status = user_data[0]
-                if current_status == 'Заблокированный':
-                    return f"Пользователь {user_id} уже заблокирован."
-
-                # Блокировка
-                cursor.execute(
-                    "UPDATE users SET status = 'Заблокированный' WHERE id_user_telegram = %s",
-                    (user_id,)
-                )
-                connection.commit()  # Явный коммит
-                print(f"DEBUG: Затронуто строк: {cursor.rowcount}")  # Логирование
+        async with pool.acquire() as connection:
+            # Проверка существования пользователя
+            current_status = await connection.fetchval(
+                "SELECT status FROM users WHERE id_user_telegram = $1", user_id
+            )
+            print(f"DEBUG: Статус пользователя: {current_status}")  # Логирование
+
+            if current_status is None:
+                return f"Пользователь с ID {user_id} не найден."
+
+            if current_status == 'Заблокированный':
+                return f"Пользователь {user_id} уже заблокирован."
+
+            # Блокировка
+            result = await connection.execute(
+                "UPDATE users SET status = 'Заблокированный' WHERE id_user_telegram = $1",
+                user_id
+            )
+            print(f"DEBUG: Результат обновления: {result}")  # Логирование
+            user_cache.invalidate(int(user_id))
 
-                if cursor.rowcount == 0:
-                    return f"Не удалось обновить статус пользователя {user_id}."
+            if result == "UPDATE 0":
+                return f"Не удалось обновить статус пользователя {user_id}."
 
-                return f"Пользователь {user_id} успешно заблокирован."
+            return f"Пользователь {user_id} успешно заблокирован."
 
     except Exception as error:
         print(f"ERROR: Исключение в contractor_delite_database: {error}")
         raise  # Пробрасываем исключение выше
 
 
-def contractor_commentary_database(user_id: str, commentary: str) -> bool:
+async def contractor_commentary_database(user_id: str, commentary: str) -> bool:
     """
     Обновляет комментарий для указанного исполнителя в базе данных.
-    Использует соединение с автокоммитом.
 
     :param user_id: ID пользователя в Telegram
     :param commentary: Текст комментария
@@ -957,56 +1245,68 @@ def contractor_commentary_database(user_id: str, commentary: str) -> bool:
     """
     try:
         user_id_int = int(user_id)
-        conn = connect_to_database()
-
-        if conn is None:
-            return False
-
-        with conn.cursor() as cursor:
-            cursor.execute(
-                """
-                UPDATE users 
-                SET comment = %s 
-                WHERE id_user_telegram = %s
-                """,
-                (commentary, user_id_int)
-            )
+        await pool.execute(
+            """
+            UPDATE users
+            SET comment = $1
+            WHERE id_user_telegram = $2
+            """,
+            commentary, user_id_int
+        )
         return True
-    except (ValueError, psycopg2.Error) as e:
+    except (ValueError, asyncpg.PostgresError) as e:
         print(f"Ошибка при обновлении комментария: {e}")
         return False
-    finally:
-        if 'conn' in locals() and conn is not None:
-            conn.close()
 
 
-def my_data_admin(user_id: str) -> str:
+# Сколько последних задач показывать в анкете исполнителя
+USER_HISTORY_LIMIT = 10
+
+
+async def my_data_admin(user_id: str) -> str:
     """Анкета пользователей
     для администраторов."""
-    with connect_to_database() as conn:
-        with conn.cursor() as cursor:
-            # Получаем все данные пользователя
-            cursor.execute("""
-                SELECT 
-                    id_user_telegram, 
-                    first_name, 
-                    last_name, 
-                    phone, 
-                    is_loader, 
-                    is_driver, 
-                    is_self_employed, 
-                    inn, 
-                    status, 
-                    comment, 
-                    created_at
-                FROM users 
-                WHERE id_user_telegram = %s
-            """, (user_id,))
-            user_data = cursor.fetchone()
+    # Получаем все данные пользователя
+    user_data = await pool.fetchrow("""
+        SELECT
+            id_user_telegram,
+            first_name,
+            last_name,
+            phone,
+            is_loader,
+            is_driver,
+            is_self_employed,
+            inn,
+            status,
+            comment,
+            created_at
+        FROM users
+        WHERE id_user_telegram = $1
+    """, int(user_id))
 
     if not user_data:
         return "Пользователь с таким ID не найден."
 
+    # Последние задачи исполнителя, включая перенесенные в архив
+    history = await pool.fetch("""
+        (
+            SELECT t.id_tasks, t.assignment_date, t.task_status
+            FROM task_performers tp
+            JOIN tasks t ON t.id_tasks = tp.task_id
+            WHERE tp.id_user_telegram = $1
+        )
+        UNION ALL
+        (
+            SELECT ta.id_tasks, ta.assignment_date, ta.task_status
+            FROM task_performers_archive tpa
+            JOIN tasks_archive ta
+              ON ta.id_tasks = tpa.task_id AND ta.created_at = tpa.task_created_at
+            WHERE tpa.id_user_telegram = $1
+        )
+        ORDER BY id_tasks DESC
+        LIMIT $2
+    """, int(user_id), USER_HISTORY_LIMIT)
+
     # Формируем читабельное сообщение
     response = (
         f"📋 Анкета пользователя:\n\n"
@@ -1022,4 +1322,12 @@ def my_data_admin(user_id: str) -> str:
         f"📅 Дата регистрации: {user_data[10].strftime('%Y-%m-%d %H:%M:%S')}"
     )
 
-    return response
\ No newline at end of file
+    if history:
+        response += "\n\n🗂 Последние задачи:\n" + "\n".join(
+            f"• № {task['id_tasks']} "
+            f"({task['assignment_date'].strftime('%d.%m.%Y') if task['assignment_date'] else 'без даты'}) - "
+            f"{task['task_status']}"
+            for task in history
+        )
+
+    return response
@@ -0,0 +1,259 @@
+"""Бенчмарк слоя данных: задержка обработчиков при одновременной работе исполнителей.
+
+Сравнивает пул asyncpg с прежней схемой (новое соединение psycopg2 на каждый запрос
+прямо в обработчике). Работает с базой из .env, тестовые данные удаляются после запуска.
+
+Запуск: python db_benchmark.py --executors 200
+Проверка гонки за места в задаче (и повторных нажатий одного исполнителя):
+python db_benchmark.py --race --executors 500 --slots 3
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+os.environ.setdefault("ADMIN", "0")
+
+import database
+from config import Config
+
+# Тестовые исполнители получают ID из этого диапазона, чтобы не задеть настоящих
+BENCHMARK_ID_BASE = 9_000_000_000
+
+
+async def seed(executors, tasks):
+    """Активные исполнители и задачи для бенчмарка"""
+    user_ids = [BENCHMARK_ID_BASE + i for i in range(executors)]
+    async with database.pool.acquire() as conn:
+        await conn.executemany("""
+            INSERT INTO users (id_user_telegram, first_name, last_name, phone, is_loader, is_driver, status)
+            VALUES ($1, 'Тест', 'Исполнитель', '79160000000', TRUE, $2, 'Активный')
+            ON CONFLICT (id_user_telegram) DO NOTHING
+        """, [(user_id, user_id % 2 == 0) for user_id in user_ids])
+        task_ids = [
+            await conn.fetchval("""
+                INSERT INTO tasks (assignment_date, assignment_time, task_type, description,
+                                   main_address, required_workers, worker_price)
+                VALUES (CURRENT_DATE, '10:00', 'Погрузка', 'Бенчмарк слоя данных', 'Тестовый адрес', 1000, 1000)
+                RETURNING id_tasks
+            """)
+            for _ in range(tasks)
+        ]
+    return user_ids, task_ids
+
+
+async def cleanup(user_ids, task_ids):
+    async with database.pool.acquire() as conn:
+        await conn.execute("DELETE FROM tasks WHERE id_tasks = ANY($1)", task_ids)
+        await conn.execute("DELETE FROM users WHERE id_user_telegram = ANY($1)", user_ids)
+
+
+async def pooled_handler(user_id):
+    """То, что делают обработчики 'Взять заказ' и 'Список активных заказов'"""
+    await database.status_verification(user_id)
+    await database.get_executor_pending_tasks(user_id)
+    await database.get_user_tasks(user_id)
+    await database.contractor_statistics_database(user_id)
+
+
+def connect_psycopg2():
+    import psycopg2
+    return psycopg2.connect(
+        host=Config.DB_HOST,
+        database=Config.DB_NAME,
+        user=Config.DB_USER,
+        password=Config.DB_PASSWORD,
+        port=Config.DB_PORT
+    )
+
+
+async def baseline_handler(user_id):
+    """Прежняя схема: новое соединение на каждый запрос, синхронно в цикле событий"""
+    queries = [
+        ("SELECT status FROM users WHERE id_user_telegram = %s", (user_id,)),
+        ("SELECT is_loader, is_driver FROM users WHERE id_user_telegram = %s", (user_id,)),
+        ("SELECT * FROM tasks WHERE task_status = 'Назначена' AND (task_type = %s OR %s IS NULL) "
+         "ORDER BY created_at DESC", ("Погрузка", "Погрузка")),
+        ("SELECT t.* FROM tasks t JOIN task_performers tp ON t.id_tasks = tp.task_id "
+         "WHERE tp.id_user_telegram = %s AND t.task_status IN ('Назначена', 'Работники найдены')", (user_id,)),
+        ("SELECT total_assigned, completed, canceled FROM performer_stats WHERE id_user_telegram = %s",
+         (user_id,)),
+    ]
+    for query, params in queries:
+        with connect_psycopg2() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(query, params)
+                cursor.fetchall()
+        conn.close()
+        # Даем циклу событий переключиться, как при await message.answer()
+        await asyncio.sleep(0)
+
+
+async def measure(handler, user_ids, rounds):
+    latencies = []
+
+    async def executor(user_id):
+        for _ in range(rounds):
+            started = time.perf_counter()
+            await handler(user_id)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(executor(user_id) for user_id in user_ids))
+    return latencies, time.perf_counter() - started
+
+
+def report(title, latencies, elapsed):
+    latencies.sort()
+    print(f"{title}:")
+    print(f"  обработчиков: {len(latencies)}, время: {elapsed:.2f} с, {len(latencies) / elapsed:.0f} обработчиков/с")
+    print(
+        f"  задержка, мс: p50 {statistics.median(latencies) * 1000:.1f}, "
+        f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f}, "
+        f"max {latencies[-1] * 1000:.1f}"
+    )
+
+
+async def race(user_ids, slots):
+    """Все исполнители одновременно берут одну задачу с ограниченным числом мест"""
+    async with database.pool.acquire() as conn:
+        task_id = await conn.fetchval("""
+            INSERT INTO tasks (assignment_date, assignment_time, task_type, description,
+                               main_address, required_workers, worker_price)
+            VALUES (CURRENT_DATE, '10:00', 'Погрузка', 'Гонка за места', 'Тестовый адрес', $1, 1000)
+            RETURNING id_tasks
+        """, slots)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(
+        database.add_to_assigned_performers(user_id, task_id) for user_id in user_ids
+    ))
+    elapsed = time.perf_counter() - started
+
+    async with database.pool.acquire() as conn:
+        task = await conn.fetchrow(
+            "SELECT task_status, claimed_count FROM tasks WHERE id_tasks = $1", task_id
+        )
+        performers = await conn.fetchval(
+            "SELECT COUNT(*) FROM task_performers WHERE task_id = $1", task_id
+        )
+        assigned = await conn.fetchval(
+            "SELECT COALESCE(SUM(total_assigned), 0) FROM performer_stats WHERE id_user_telegram = ANY($1)",
+            user_ids
+        )
+
+    winners = sum(1 for result in results if result.startswith("Вы взяли задачу"))
+    print(f"Исполнителей: {len(user_ids)}, мест: {slots}, время: {elapsed:.2f} с")
+    print(f"Взяли задачу: {winners}, в task_performers: {performers}, "
+          f"claimed_count: {task['claimed_count']}, в статистике: {assigned}")
+    print(f"Статус задачи: {task['task_status']}")
+
+    ok = winners == performers == task['claimed_count'] == assigned == slots
+    print("✅ Лишних исполнителей нет" if ok else "❌ Мест занято больше, чем есть в задаче")
+    return task_id, ok
+
+
+async def race_same_user(user_id, presses, slots):
+    """Один исполнитель одновременно много раз берет задачу, затем столько же раз отказывается"""
+    async with database.pool.acquire() as conn:
+        task_id = await conn.fetchval("""
+            INSERT INTO tasks (assignment_date, assignment_time, task_type, description,
+                               main_address, required_workers, worker_price)
+            VALUES (CURRENT_DATE, '10:00', 'Погрузка', 'Двойное нажатие', 'Тестовый адрес', $1, 1000)
+            RETURNING id_tasks
+        """, slots)
+        # Статистика исполнителя могла измениться в предыдущей гонке - сравниваем прирост
+        assigned_before = await conn.fetchval(
+            "SELECT COALESCE(SUM(total_assigned), 0) FROM performer_stats WHERE id_user_telegram = $1", user_id
+        )
+
+    async def check(stage, expected_performers, expected_status):
+        async with database.pool.acquire() as conn:
+            task = await conn.fetchrow(
+                "SELECT task_status, claimed_count FROM tasks WHERE id_tasks = $1", task_id
+            )
+            performers = await conn.fetchval(
+                "SELECT COUNT(*) FROM task_performers WHERE task_id = $1", task_id
+            )
+            assigned = await conn.fetchval(
+                "SELECT total_assigned FROM performer_stats WHERE id_user_telegram = $1", user_id
+            ) - assigned_before
+        print(f"{stage}: в task_performers: {performers}, claimed_count: {task['claimed_count']}, "
+              f"прибавилось в статистике: {assigned}, статус: {task['task_status']}")
+        return (performers == task['claimed_count'] == expected_performers
+                and assigned == 1 and task['task_status'] == expected_status)
+
+    results = await asyncio.gather(*(
+        database.add_to_assigned_performers(user_id, task_id) for _ in range(presses)
+    ))
+    winners = sum(1 for result in results if result.startswith("Вы взяли задачу"))
+    print(f"Нажатий одного исполнителя: {presses}, мест: {slots}, взяли задачу: {winners}")
+    ok = winners == 1 and await check("После взятия", 1, 'Назначена' if slots > 1 else 'Работники найдены')
+
+    results = await asyncio.gather(*(
+        database.dell_to_assigned_performers(user_id, task_id) for _ in range(presses)
+    ))
+    refused = sum(1 for result in results if result.startswith("Вы отказались от задачи"))
+    print(f"Одновременных отказов: {presses}, прошло: {refused}")
+    ok = ok and refused == 1 and await check("После отказа", 0, 'Назначена')
+
+    print("✅ Повторные нажатия не занимают лишних мест" if ok else "❌ Повторное нажатие посчитано дважды")
+    return task_id, ok
+
+
+async def main(executors, rounds, tasks, baseline, race_slots=None):
+    await database.check_and_create_db()
+    await database.create_pool()
+    await database.initialize_database()
+
+    if race_slots:
+        user_ids, task_ids = await seed(executors, 0)
+        try:
+            task_id, ok = await race(user_ids, race_slots)
+            task_ids.append(task_id)
+            task_id, same_ok = await race_same_user(user_ids[0], executors, race_slots)
+            task_ids.append(task_id)
+            ok = ok and same_ok
+        finally:
+            await cleanup(user_ids, task_ids)
+            await database.close_pool()
+        return ok
+
+    user_ids, task_ids = await seed(executors, tasks)
+    # Доска задач работает, как в боте: с подпиской на изменения
+    listener = asyncio.create_task(database.listen_task_changes())
+    while not database.task_board.listening and not listener.done():
+        await asyncio.sleep(0.05)
+    try:
+        latencies, elapsed = await measure(pooled_handler, user_ids, rounds)
+        report(f"Пул asyncpg ({Config.DB_POOL_MIN_SIZE}-{Config.DB_POOL_MAX_SIZE} соединений)", latencies, elapsed)
+        print(f"  кэш статусов и ролей: {database.user_cache.stats()}")
+        print(f"  доска задач: {database.task_board.stats()}")
+
+        if baseline:
+            latencies, elapsed = await measure(baseline_handler, user_ids, rounds)
+            report("psycopg2, соединение на каждый запрос", latencies, elapsed)
+    finally:
+        listener.cancel()
+        await asyncio.gather(listener, return_exceptions=True)
+        await cleanup(user_ids, task_ids)
+        await database.close_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Задержка обработчиков при одновременной работе исполнителей")
+    parser.add_argument("--executors", type=int, default=200, help="одновременных исполнителей")
+    parser.add_argument("--rounds", type=int, default=5, help="обработчиков на исполнителя")
+    parser.add_argument("--tasks", type=int, default=20, help="активных задач в базе")
+    parser.add_argument("--no-baseline", dest="baseline", action="store_false",
+                        help="не запускать сравнение с psycopg2")
+    parser.add_argument("--race", action="store_true", help="гонка исполнителей за одну задачу")
+    parser.add_argument("--slots", type=int, default=3, help="мест в задаче для --race")
+    args = parser.parse_args()
+
+    result = asyncio.run(main(
+        args.executors, args.rounds, args.tasks, args.baseline, args.slots if args.race else None
+    ))
+    if args.race and not result:
+        raise SystemExit(1)
@@ -0,0 +1,191 @@
+"""Закрепленная доска задач исполнителя.
+
+У каждого исполнителя одно закрепленное сообщение: свободные задачи его типа и
+его собственные задачи. Вместо нового списка на каждое нажатие сообщение
+редактируется на месте. При автоматическом обновлении по хэшу содержимого
+(executor_boards.content_hash) пропускаются правки, которые ничего не меняют;
+нажатие исполнителя всегда проверяет, что доска еще есть и закреплена.
+
+Когда меняются свободные задачи или задачи с набранными исполнителями (NOTIFY,
+см. task_board.py), доски исполнителей этого типа обновляются сами. Изменения за BOARD_DEBOUNCE секунд собираются в
+одно обновление, правки идут не быстрее OUTBOX_RATE в секунду.
+"""
+import asyncio
+import hashlib
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+
+import database
+from config import Config
+
+BOARD_DEBOUNCE = 5
+
+# Типы задач, доски которых ждут обновления; None - все
+_changed_types = set()
+_changed = asyncio.Event()
+
+
+def _on_task_change(task_type):
+    _changed_types.add(task_type)
+    _changed.set()
+
+
+def _section(title: str, tasks: list, empty: str, budget: int) -> str:
+    """
+    Заголовок и задачи, не длиннее budget символов. Задачи показываются целиком
+    (с описанием и доп. адресом), пока занимают не больше трех четвертей budget;
+    остальные - одной строкой, чтобы номера были видны.
+    """
+    if not tasks:
+        return f"{title}\n{empty}"
+    parts = [f"{title} ({len(tasks)})"]
+    used = len(parts[0])
+    detailed = True
+    for shown, task in enumerate(tasks):
+        # Запас под строку "... и еще N"
+        if detailed:
+            entry = database.format_task_details(task)
+            if used + len(entry) + 2 > budget * 3 // 4:
+                detailed = False
+        if not detailed:
+            entry = database.format_task_line(task)
+            if used + len(entry) + 2 > budget - 30:
+                parts.append(f"... и еще {len(tasks) - shown}")
+                break
+        parts.append(entry)
+        used += len(entry) + 2
+    return "\n\n".join(parts)
+
+
+def render(pending: list, mine: list) -> str:
+    footer = "\n\nВзять задачу - «Взять заказ ➡️», отказаться - «Отказаться от заказа ❌»"
+    budget = database.MESSAGE_LIMIT - len(footer) - 2
+    # Своим задачам - не больше половины сообщения, свободным - все остальное
+    mine_section = _section("📖 Мои задачи", mine, "Открытых заявок с вашим участием нет", budget // 2)
+    pending_section = _section(
+        "📋 Свободные задачи", pending, "Нет активных заказов для вас", budget - len(mine_section)
+    )
+    return mine_section + "\n\n" + pending_section + footer
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+async def publish(bot: Bot, user_id: int, text: str, board=None, pressed: bool = False) -> bool:
+    """
+    Показывает доску исполнителю: правит закрепленное сообщение или, если его нет,
+    отправляет и закрепляет новое. Возвращает False, если содержимое не изменилось.
+    :param board: строка executor_boards (message_id, content_hash), если уже прочитана
+    :param pressed: доску открыл сам исполнитель - проверяем, что сообщение еще есть
+        и закреплено, даже если содержимое не изменилось
+    """
+    text_hash = content_hash(text)
+    if board and not pressed and board['content_hash'] == text_hash:
+        return False
+
+    message_id = None
+    if board:
+        try:
+            await bot.edit_message_text(text=text, chat_id=user_id, message_id=board['message_id'])
+            message_id = board['message_id']
+        except TelegramBadRequest as e:
+            if "message is not modified" in str(e):
+                message_id = board['message_id']
+            # Иначе сообщение удалено или слишком старое - отправим новое
+    if message_id is None or pressed:
+        if message_id is None:
+            sent = await bot.send_message(chat_id=user_id, text=text)
+            message_id = sent.message_id
+        # Исполнитель мог открепить доску - закрепляем снова
+        try:
+            await bot.pin_chat_message(chat_id=user_id, message_id=message_id, disable_notification=True)
+        except TelegramBadRequest as e:
+            print(f"Не удалось закрепить доску исполнителя {user_id}: {e}")
+
+    await database.pool.execute("""
+        INSERT INTO executor_boards (id_user_telegram, message_id, content_hash, updated_at)
+        VALUES ($1, $2, $3, CURRENT_TIMESTAMP)
+        ON CONFLICT (id_user_telegram) DO UPDATE
+        SET message_id = EXCLUDED.message_id,
+            content_hash = EXCLUDED.content_hash,
+            updated_at = EXCLUDED.updated_at
+    """, user_id, message_id, text_hash)
+    return True
+
+
+async def show_board(bot: Bot, user_id: int) -> bool:
+    """Доска по нажатию исполнителя. Возвращает False, если пользователь не найден."""
+    access = await database.get_user_access(user_id)
+    if not access:
+        return False
+    pending = await database.get_pending_for_types(
+        database.executor_task_types(access['is_loader'], access['is_driver'])
+    )
+    mine = (await database.get_active_tasks_of_users([user_id]))[user_id]
+    board = await database.pool.fetchrow(
+        "SELECT message_id, content_hash FROM executor_boards WHERE id_user_telegram = $1", user_id
+    )
+    await publish(bot, user_id, render(pending, mine), board, pressed=True)
+    return True
+
+
+async def refresh_boards(bot: Bot, task_types: set) -> int:
+    """Обновляет доски активных исполнителей, которые видят задачи этих типов"""
+    all_types = None in task_types
+    boards = await database.pool.fetch("""
+        SELECT eb.id_user_telegram, eb.message_id, eb.content_hash, u.is_loader, u.is_driver
+        FROM executor_boards eb
+        JOIN users u ON u.id_user_telegram = eb.id_user_telegram
+        WHERE u.status = 'Активный'
+          AND ($1 OR (u.is_loader AND 'Погрузка' = ANY($2::text[]))
+                  OR (u.is_driver AND 'Доставка' = ANY($2::text[])))
+    """, all_types, [task_type for task_type in task_types if task_type])
+    if not boards:
+        return 0
+
+    mine = await database.get_active_tasks_of_users([board['id_user_telegram'] for board in boards])
+    interval = 1 / Config.OUTBOX_RATE
+    edited = 0
+    for board in boards:
+        user_id = board['id_user_telegram']
+        pending = await database.get_pending_for_types(
+            database.executor_task_types(board['is_loader'], board['is_driver'])
+        )
+        try:
+            if await publish(bot, user_id, render(pending, mine[user_id]), board):
+                edited += 1
+                await asyncio.sleep(interval)
+        except TelegramRetryAfter as e:
+            await asyncio.sleep(e.retry_after)
+            # Эта доска осталась старой - обновим ее следующим проходом
+            # (уже обновленные пропустятся по хэшу)
+            for task_type in task_types:
+                _on_task_change(task_type)
+        except TelegramForbiddenError:
+            # Бот заблокирован - доска больше не нужна
+            await database.pool.execute("DELETE FROM executor_boards WHERE id_user_telegram = $1", user_id)
+        except Exception as e:
+            print(f"Не удалось обновить доску исполнителя {user_id}: {e}")
+    return edited
+
+
+async def run_board_updates(bot: Bot):
+    """Бесконечный цикл обновления досок; останавливается отменой задачи"""
+    database.task_board.add_change_listener(_on_task_change)
+    while True:
+        await _changed.wait()
+        # Собираем изменения за несколько секунд в одно обновление
+        await asyncio.sleep(BOARD_DEBOUNCE)
+        task_types = set(_changed_types)
+        _changed_types.clear()
+        _changed.clear()
+        try:
+            edited = await refresh_boards(bot, task_types)
+            if edited:
+                print(f"Обновлено досок исполнителей: {edited}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Ошибка обновления досок исполнителей: {e}")
@@ -0,0 +1,155 @@
+"""Хранилище состояний FSM aiogram в PostgreSQL.
+
+Состояния диалогов (регистрация исполнителя, постановка задачи) переживают
+перезапуск бота и доступны всем процессам, работающим с одной базой.
+
+Хранилище одновременно служит изоляцией событий (events_isolation): пока
+aiogram обрабатывает обновление пользователя, запись FSM этого пользователя
+читается из базы один раз, а все изменения (update_data, set_state, clear)
+копятся в памяти и записываются одним запросом после обработчика.
+"""
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from datetime import date, datetime, time
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseEventIsolation, BaseStorage, DefaultKeyBuilder, StorageKey
+
+import database
+
+# Компактные метки для типов, которых нет в JSON
+TYPE_TAGS = {
+    datetime: "$dt",
+    date: "$d",
+    time: "$t",
+}
+DECODERS = {
+    "$dt": datetime.fromisoformat,
+    "$d": date.fromisoformat,
+    "$t": time.fromisoformat,
+}
+
+
+def _encode(value):
+    for value_type, tag in TYPE_TAGS.items():
+        if isinstance(value, value_type):
+            return {tag: value.isoformat()}
+    raise TypeError(f"Тип {type(value).__name__} нельзя сохранить в состоянии FSM")
+
+
+def _decode(obj):
+    if len(obj) == 1:
+        tag, value = next(iter(obj.items()))
+        if tag in DECODERS:
+            return DECODERS[tag](value)
+    return obj
+
+
+def dumps(data: dict):
+    if not data:
+        return None
+    return json.dumps(data, default=_encode, separators=(",", ":"), ensure_ascii=False)
+
+
+def loads(text) -> dict:
+    return json.loads(text, object_hook=_decode) if text else {}
+
+
+class _Record:
+    """Запись FSM одного пользователя на время обработки обновления"""
+
+    __slots__ = ("state", "data", "loaded", "dirty")
+
+    def __init__(self):
+        self.state = None
+        self.data = {}
+        self.loaded = False
+        self.dirty = False
+
+
+class PostgresStorage(BaseStorage, BaseEventIsolation):
+    """FSM-хранилище в таблице fsm_storage (см. migrations.py)"""
+
+    def __init__(self, key_builder=None):
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        # Обновления одного пользователя в этом процессе обрабатываются по очереди
+        self._locks = {}
+        self._waiters = {}
+        # Записи пользователей, чьи обновления сейчас обрабатываются
+        self._buffers = {}
+        self.reads = 0
+        self.writes = 0
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey):
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            async with lock:
+                record = self._buffers[key] = _Record()
+                try:
+                    yield
+                finally:
+                    del self._buffers[key]
+                    if record.dirty:
+                        await self._write(key, record.state, record.data)
+        finally:
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+                del self._locks[key]
+
+    async def _read(self, key: StorageKey) -> _Record:
+        record = self._buffers.get(key) or _Record()
+        if not record.loaded:
+            row = await database.pool.fetchrow(
+                "SELECT state, data FROM fsm_storage WHERE key = $1", self.key_builder.build(key)
+            )
+            self.reads += 1
+            if row:
+                record.state, record.data = row['state'], loads(row['data'])
+            record.loaded = True
+        return record
+
+    async def _write(self, key: StorageKey, state, data: dict):
+        storage_key = self.key_builder.build(key)
+        self.writes += 1
+        if state is None and not data:
+            # Диалог закончен - строка не нужна
+            await database.pool.execute("DELETE FROM fsm_storage WHERE key = $1", storage_key)
+            return
+        await database.pool.execute("""
+            INSERT INTO fsm_storage (key, state, data, updated_at)
+            VALUES ($1, $2, $3, CURRENT_TIMESTAMP)
+            ON CONFLICT (key) DO UPDATE
+            SET state = EXCLUDED.state,
+                data = EXCLUDED.data,
+                updated_at = EXCLUDED.updated_at
+        """, storage_key, state, dumps(data))
+
+    async def _change(self, key: StorageKey, **changes):
+        record = await self._read(key)
+        for name, value in changes.items():
+            setattr(record, name, value)
+        if key in self._buffers:
+            record.dirty = True
+        else:
+            # Вне обработки обновления пишем сразу
+            await self._write(key, record.state, record.data)
+
+    async def set_state(self, key: StorageKey, state=None) -> None:
+        await self._change(key, state=state.state if isinstance(state, State) else state)
+
+    async def get_state(self, key: StorageKey):
+        return (await self._read(key)).state
+
+    async def set_data(self, key: StorageKey, data: dict) -> None:
+        await self._change(key, data=dict(data))
+
+    async def get_data(self, key: StorageKey) -> dict:
+        return dict((await self._read(key)).data)
+
+    async def close(self) -> None:
+        # Пул соединений закрывает main.py
+        pass
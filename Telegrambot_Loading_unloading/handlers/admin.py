@@ -1,4 +1,3 @@
-import asyncio
 from datetime import datetime, timedelta, time
 from aiogram import F, types, Router, Bot
 from aiogram.client import bot
@@ -6,28 +5,19 @@ from aiogram.fsm.context import FSMContext
 from aiogram.utils.keyboard import ReplyKeyboardBuilder
 
 from config import Config
-from keyboards.admin_kb import get_admin_keyboard, performers_keyboard, tasks_keyboard
+from keyboards.admin_kb import get_admin_keyboard, performers_keyboard, tasks_keyboard, tasks_pages_keyboard
 from keyboards.executor_kb import acquaintance_keyboard
-from states import OrderStates, TaskNumber, IdUser, Text
-from database import create_task, change_status_user, get_all_users_type, complete_the_task_database, \
+from states import OrderStates, ImportTasks, TaskNumber, IdUser, Text
+from database import create_task, change_status_user, complete_the_task_database, \
     delete_the_task_database, all_order_admin_database, my_data, contractor_delite_database, \
-    contractor_statistics_database, contractor_commentary_database, connect_to_database, my_data_admin
+    contractor_statistics_database, contractor_commentary_database, get_active_users, my_data_admin, \
+    enqueue_notifications
+from notifications import dispatch_new_task
+from reminders import scheduler
+from task_import import IMPORT_MAX_SIZE, IMPORT_TEMPLATE, MAX_ERRORS_SHOWN, import_tasks, read_file, validate
 
 router = Router()
 
-async def send_temp_message(
-    bot: Bot,
-    chat_id: int,
-    text: str,
-    delete_after: int = 5  # Через сколько секунд удалить
-):
-    """Сообщение, которое исчезает."""
-    msg = await bot.send_message(chat_id=chat_id, text=text)
-    await asyncio.sleep(delete_after)
-    await bot.delete_message(chat_id=chat_id, message_id=msg.message_id)
-
-
-
 # АВТОРИЗАЦИЯ РАБОТНИКА
 @router.callback_query(F.data.startswith("add_worker_"))
 async def add_worker_callback(callback: types.CallbackQuery, bot: Bot):
@@ -35,16 +25,14 @@ async def add_worker_callback(callback: types.CallbackQuery, bot: Bot):
 
     user_id = int(callback.data.split("_")[2])
     # Меняем статус работника на Активный.
-    change_status_user(user_id)
+    await change_status_user(user_id)
 
-    # Отправляем исчезающее сообщение всем администраторам.
-    for admin_id in Config.get_admins():
-        try:
-            text = f"Пользователя {user_id} принял администратор: {callback.from_user.id}"
-            # if admin_id != callback.from_user.id:  # Не уведомляем себя
-            await send_temp_message(bot, admin_id, text, delete_after=5)
-        except Exception as e:
-            print(f"Не удалось отправить сообщение админу {admin_id}: {e}")
+    # Исчезающее сообщение всем администраторам (через очередь уведомлений).
+    await enqueue_notifications(
+        Config.get_admins(),
+        f"Пользователя {user_id} принял администратор: {callback.from_user.id}",
+        delete_after=5
+    )
 
     # Отправляем одобрившему администратору главное меню
     await bot.send_message(
@@ -54,24 +42,12 @@ async def add_worker_callback(callback: types.CallbackQuery, bot: Bot):
     )
 
     # Сообщение работнику.
-    try:
-        worker_message = (
-            "Вас добавили. Поработаем! 💪 "
-            "Чат-бот поможет вам эффективно работать с заявками "
-            "и своевременно получать оплаты. Для начала давайте познакомимся."
-        )
-        await bot.send_message(
-            chat_id=user_id,
-            text=worker_message,
-            reply_markup=acquaintance_keyboard()
-        )
-    except Exception as e:
-        print(f"Не удалось отправить сообщение работнику {user_id}: {e}")
-        for admin_id in Config.get_admins():
-            await bot.send_message(
-                chat_id=admin_id,
-                text=f"⚠ Не удалось отправить приветствие работнику {user_id}"
-            )
+    worker_message = (
+        "Вас добавили. Поработаем! 💪 "
+        "Чат-бот поможет вам эффективно работать с заявками "
+        "и своевременно получать оплаты. Для начала давайте познакомимся."
+    )
+    await enqueue_notifications([user_id], worker_message, reply_markup=acquaintance_keyboard())
 
 # ИГНОРИРОВАТЬ ЗАЯВКУ НА АВТОРИЗАЦИЮ
 @router.callback_query(F.data.startswith("ignore_"))
@@ -276,13 +252,16 @@ async def process_worker_price(message: types.Message, state: FSMContext, bot: B
 
     try:
         # Сохраняем задачу в базу данных
-        task_id = create_task(data)
+        task_id = await create_task(data)
     except Exception as e:
         await message.answer("Произошла ошибка при создании задачи. Попробуйте позже.")
         print(f"Error creating task: {e}")
         await state.clear()
         return  # Прерываем выполнение функции, если задача не создана
 
+    # Напоминания исполнителям о начале смены
+    scheduler.add_task(task_id, datetime.combine(data['date_of_destination'], data['appointment_time']))
+
     # Формируем сообщение о новой задаче
     try:
         task_message = (
@@ -301,25 +280,14 @@ async def process_worker_price(message: types.Message, state: FSMContext, bot: B
         await state.clear()
         return
 
-    # Получаем всех активных пользователей связанных с текущим видом задачи
-    user_ids = get_all_users_type(data['type_of_task'])
-    print(f"Список исполнителей: ")
-
-    # Рассылаем задачу погрузку - грузчикам, доставку - водителям
-    sent_count = 0
-    for user_id in user_ids:
-        try:
-            await bot.send_message(
-                chat_id=user_id,
-                text=task_message
-            )
-            sent_count += 1
-        except Exception as e:
-            print(f"Ошибка при отправке сообщения пользователю {user_id}: {e}")
+    # Рассылаем задачу погрузку - грузчикам, доставку - водителям: сначала лучшим
+    # исполнителям, остальным волнами, пока есть свободные места
+    sent_count, waiting = await dispatch_new_task(task_id, data['type_of_task'], task_message)
 
     # Отправляем подтверждение создателю
+    waves_note = f" Остальные {waiting} получат ее волнами, пока есть места." if waiting else ""
     await message.answer(
-        f"✅ Задача #{task_id} успешно создана и отправлена {sent_count} исполнителям!\n"
+        f"✅ Задача #{task_id} успешно создана и отправлена {sent_count} исполнителям!{waves_note}\n"
         f"{task_message}",
         reply_markup=get_admin_keyboard(),
     )
@@ -329,11 +297,22 @@ async def process_worker_price(message: types.Message, state: FSMContext, bot: B
 # АКТИВНЫЕ ЗАДАЧИ
 @router.message(F.text == "Активные задачи 📋")
 async def all_order_admin(message: types.Message):
-    orders = all_order_admin_database()
+    orders, prev_cursor, next_cursor = await all_order_admin_database()
     await message.answer(
         text=orders,
-        reply_markup=tasks_keyboard(),
+        reply_markup=tasks_pages_keyboard(prev_cursor, next_cursor) or tasks_keyboard(),
+    )
+
+@router.callback_query(F.data.startswith("tasks_page_"))
+async def all_order_admin_page(callback: types.CallbackQuery):
+    # tasks_page_next_<дата>_<время>_<номер> или tasks_page_prev_...
+    _, _, direction, cursor = callback.data.split("_", 3)
+    orders, prev_cursor, next_cursor = await all_order_admin_database(cursor, backward=direction == "prev")
+    await callback.message.edit_text(
+        text=orders,
+        reply_markup=tasks_pages_keyboard(prev_cursor, next_cursor)
     )
+    await callback.answer()
 
 # ЗАВЕРШИТЬ ЗАДАЧУ
 @router.message(F.text == "Завершить задачу 📁")
@@ -345,13 +324,11 @@ async def complete_the_task(message: types.Message, state: FSMContext):
 @router.message(TaskNumber.waiting_task_number_complete)  # Обрабатываем только в нужном состоянии
 async def complete_the_task_2(message: types.Message, bot: Bot, state: FSMContext):
     task_text = message.text
-    status_task = complete_the_task_database(task_text)
+    status_task = await complete_the_task_database(task_text)
+    if task_text.isdigit():
+        scheduler.remove_task(int(task_text))
     # Сообщаем администраторам что задача завершена.
-    for admin_id in Config.get_admins():
-        try:
-            await send_temp_message(bot, admin_id, status_task, delete_after=5)
-        except Exception as e:
-            print(f"Не удалось отправить сообщение админу {admin_id}: {e}")
+    await enqueue_notifications(Config.get_admins(), status_task, delete_after=5)
     await state.clear()
 
 # УДАЛИТЬ ЗАДАЧУ
@@ -364,14 +341,12 @@ async def delete_the_task(message: types.Message, state: FSMContext):
 @router.message(TaskNumber.waiting_task_number_delete)
 async def delete_the_task_2(message: types.Message, bot: Bot, state: FSMContext):
     task_text = message.text
-    status_task = await delete_the_task_database(task_text, bot)
+    status_task = await delete_the_task_database(task_text)
+    if task_text.isdigit():
+        scheduler.remove_task(int(task_text))
 
     # Сообщаем администраторам
-    for admin_id in Config.get_admins():
-        try:
-            await send_temp_message(bot, admin_id, status_task, delete_after=5)
-        except Exception as e:
-            print(f"Не удалось отправить сообщение админу {admin_id}: {e}")
+    await enqueue_notifications(Config.get_admins(), status_task, delete_after=5)
 
     await state.clear()
 
@@ -395,10 +370,7 @@ async def performers(message: types.Message):
 @router.message(F.text == "Посмотреть анкету исполнителя 🗄")
 async def view_data_contractor(message: types.Message, state: FSMContext):
     await state.clear()
-    with connect_to_database() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT id_user_telegram, first_name, last_name FROM users WHERE status = 'Активный'")
-            active_users = cursor.fetchall()
+    active_users = await get_active_users()
 
     if not active_users:
         await message.answer("Нет активных исполнителей для блокировки.")
@@ -422,7 +394,7 @@ async def view_data_contractor_2(message: types.Message, state: FSMContext):
         return
 
     user_id = message.text
-    user = my_data_admin(user_id)  # Убедитесь, что функция асинхронная
+    user = await my_data_admin(user_id)
     await message.answer(user, reply_markup=performers_keyboard())
     await state.clear()
 
@@ -430,10 +402,7 @@ async def view_data_contractor_2(message: types.Message, state: FSMContext):
 # СТАТИСТИКА ИСПОЛНИТЕЛЯ
 @router.message(F.text == "Статистика исполнителя 📊")
 async def contractor_statistics(message: types.Message, state: FSMContext):
-    with connect_to_database() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT id_user_telegram, first_name, last_name FROM users WHERE status = 'Активный'")
-            active_users = cursor.fetchall()
+    active_users = await get_active_users()
 
     if not active_users:
         await message.answer("Нет активных исполнителей для блокировки.")
@@ -449,7 +418,7 @@ async def contractor_statistics(message: types.Message, state: FSMContext):
 @router.message(IdUser.waiting_contractor_statistics)
 async def contractor_statistics_2(message: types.Message, bot: Bot, state: FSMContext):
     user_id = message.text
-    statistics = contractor_statistics_database(user_id)
+    statistics = await contractor_statistics_database(user_id)
     await state.clear()  # Очищаем состояние после выполнения
     await message.answer(
         text=statistics,
@@ -504,7 +473,7 @@ async def handle_contractor_commentary(message: types.Message, state: FSMContext
         await state.clear()
         return
 
-    success = contractor_commentary_database(user_id, commentary)
+    success = await contractor_commentary_database(user_id, commentary)
     await state.clear()  # Закрываем состояние в любом случае
 
     if success:
@@ -521,10 +490,7 @@ async def handle_contractor_commentary(message: types.Message, state: FSMContext
 # ЗАБЛОКИРОВАТЬ ИСПОЛНИТЕЛЯ
 @router.message(F.text == "Заблокировать исполнителя 👊")
 async def contractor_delite(message: types.Message, state: FSMContext):
-    with connect_to_database() as conn:
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT id_user_telegram, first_name, last_name FROM users WHERE status = 'Активный'")
-            active_users = cursor.fetchall()
+    active_users = await get_active_users()
 
     if not active_users:
         await message.answer("Нет активных исполнителей для блокировки.")
@@ -548,10 +514,64 @@ async def contractor_delite_2(message: types.Message, bot: Bot, state: FSMContex
 
     try:
         user_id_int = int(user_id)
-        statistics = contractor_delite_database(user_id_int)
+        statistics = await contractor_delite_database(user_id_int)
         print(f"DEBUG: Результат операции: {statistics}")  # Логирование
         await message.answer(statistics, reply_markup=get_admin_keyboard())
     except Exception as e:
         print(f"ERROR: Ошибка при блокировке: {str(e)}")  # Логирование ошибки
         await message.answer(f"Произошла ошибка: {str(e)}")
 
+# ЗАГРУЗКА ЗАДАЧ ИЗ ФАЙЛА
+@router.message(F.text == "Загрузить задачи из файла 📥")
+async def import_tasks_start(message: types.Message, state: FSMContext):
+    await state.clear()
+    await state.set_state(ImportTasks.waiting_file)
+    await message.answer(IMPORT_TEMPLATE)
+
+@router.message(ImportTasks.waiting_file, F.document)
+async def import_tasks_file(message: types.Message, state: FSMContext, bot: Bot):
+    document = message.document
+    if document.file_size and document.file_size > IMPORT_MAX_SIZE:
+        await message.answer("Файл слишком большой. Разбейте задачи на несколько файлов.")
+        return
+
+    try:
+        file = await bot.download(document)
+        frame = read_file(file.read(), document.file_name or "")
+    except Exception as e:
+        await message.answer(f"Не удалось прочитать файл: {e}")
+        return
+
+    # Проверяем все строки сразу; при ошибках ничего не загружаем
+    tasks, errors = validate(frame)
+    if errors:
+        more = len(errors) - MAX_ERRORS_SHOWN
+        await message.answer(
+            "❌ Задачи не загружены. Исправьте файл и отправьте его снова:\n"
+            + "\n".join(errors[:MAX_ERRORS_SHOWN])
+            + (f"\n... и еще ошибок: {more}" if more > 0 else "")
+        )
+        return
+
+    try:
+        created = await import_tasks(tasks)
+    except Exception as e:
+        await message.answer("Произошла ошибка при загрузке задач. Попробуйте позже.")
+        print(f"Error importing tasks: {e}")
+        await state.clear()
+        return
+
+    # Напоминания исполнителям о начале смены
+    for task in created:
+        scheduler.add_task(task['id_tasks'], datetime.combine(task['assignment_date'], task['assignment_time']))
+
+    await message.answer(
+        f"✅ Загружено задач: {len(created)} (№ {created[0]['id_tasks']} - № {created[-1]['id_tasks']}).\n"
+        f"Исполнители получат список новых задач одним сообщением.",
+        reply_markup=get_admin_keyboard()
+    )
+    await state.clear()
+
+@router.message(ImportTasks.waiting_file)
+async def import_tasks_no_file(message: types.Message):
+    await message.answer("Отправьте файл .xlsx или .csv с задачами")
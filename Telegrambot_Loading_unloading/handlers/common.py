@@ -16,7 +16,7 @@ async def cmd_start(message: types.Message):
 
     try:
         print("Если пользователя нет в бд, добавляем.")
-        add_user_to_database(user_id)
+        await add_user_to_database(user_id)
 
         print("Распределение админ/работник.")
         if message.from_user.id in Config.ADMINS:
@@ -27,7 +27,7 @@ async def cmd_start(message: types.Message):
         else:
             print(f"Вошел работник {user_id} ")
             # Проверка на активность статуса.
-            status_verification_ = status_verification(user_id)
+            status_verification_ = await status_verification(user_id)
             print(f"status_verification_ = {status_verification_}")
             if not status_verification_:
                 print(f"Работник {user_id} не активный.")
@@ -39,7 +39,7 @@ async def cmd_start(message: types.Message):
                 return
             print(f"Работник {user_id} активный.")
             # Проверка на заполненность личного кабинета.
-            your_personal_account = checking_your_personal_account(user_id)
+            your_personal_account = await checking_your_personal_account(user_id)
             if not your_personal_account:
                 print(f"Личный кабинет работника {user_id} не заполнен.")
                 await message.answer(
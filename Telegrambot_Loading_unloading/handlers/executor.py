@@ -1,16 +1,15 @@
 import asyncio
 
-import psycopg2
 from aiogram.client import bot
-from psycopg2 import extras
 from aiogram import Router, types, F, Bot
 
 from config import Config
-from database import get_pending_tasks, get_connection, connect_to_database, add_to_assigned_performers, get_user_tasks, \
-    my_data, dell_to_assigned_performers, contractor_statistics_database, status_verification
+from database import save_user_registration, add_to_assigned_performers, \
+    my_data, dell_to_assigned_performers, contractor_statistics_database, status_verification, enqueue_notifications
+from executor_board import show_board
 from aiogram.fsm.context import FSMContext
+from reminders import scheduler
 
-from handlers.admin import send_temp_message
 from keyboards.admin_kb import authorization_keyboard
 from keyboards.executor_kb import yes_no_keyboard, get_executor_keyboard, personal_office_keyboard, update_data, support
 from states import UserRegistration, TaskNumber
@@ -38,17 +37,8 @@ async def get_executor_authorization(message: types.Message, bot: Bot):
         "Пожалуйста, обработайте заявку."
     )
 
-    # Отправляем сообщение всем админам
-    for admin_id in Config.get_admins():
-        try:
-            await bot.send_message(
-                chat_id=admin_id,
-                text=admin_message,
-                reply_markup=authorization_keyboard(user_id)
-            )
-            print(f"Отправили сообщение админу {admin_id} ")
-        except Exception as e:
-            print(f"Не удалось отправить сообщение админу {admin_id}: {e}")
+    # Отправляем сообщение всем админам (через очередь уведомлений)
+    await enqueue_notifications(Config.get_admins(), admin_message, reply_markup=authorization_keyboard(user_id))
 
     await message.answer("Ваша заявка отправлена администраторам. Мы свяжемся с вами в ближайшее время!")
 
@@ -131,64 +121,17 @@ async def complete_registration(message: types.Message, state: FSMContext, bot:
     user_id = message.from_user.id
 
     try:
-        connection = connect_to_database()
-        if not connection:
-            await message.answer("Ошибка подключения к базе данных. Пожалуйста, попробуйте позже.")
-            return False
-
         try:
-            with connection:
-                with connection.cursor() as cursor:
-                    # Проверяем, существует ли уже пользователь
-                    cursor.execute("SELECT 1 FROM users WHERE id_user_telegram = %s", (user_id,))
-                    user_exists = cursor.fetchone()
-
-                    if user_exists:
-                        # Обновляем существующего пользователя
-                        cursor.execute("""
-                            UPDATE users 
-                            SET first_name = %s,
-                                last_name = %s,
-                                phone = %s,
-                                is_loader = %s,
-                                is_driver = %s,
-                                is_self_employed = %s,
-                                inn = %s
-                            WHERE id_user_telegram = %s
-                        """, (
-                            first_name,
-                            last_name,
-                            phone,
-                            is_loader,
-                            is_driver,
-                            is_self_employed,
-                            inn,
-                            user_id
-                        ))
-                    else:
-                        # Создаем нового пользователя
-                        cursor.execute("""
-                            INSERT INTO users (
-                                id_user_telegram,
-                                first_name,
-                                last_name,
-                                phone,
-                                is_loader,
-                                is_driver,
-                                is_self_employed,
-                                inn
-                            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                        """, (
-                            user_id,
-                            first_name,
-                            last_name,
-                            phone,
-                            is_loader,
-                            is_driver,
-                            is_self_employed,
-                            inn
-                        ))
-
+            await save_user_registration(
+                user_id,
+                first_name,
+                last_name,
+                phone,
+                is_loader,
+                is_driver,
+                is_self_employed,
+                inn
+            )
         except Exception as e:
             await message.answer(f"Произошла ошибка при сохранении данных: {str(e)}")
             return False
@@ -206,14 +149,7 @@ async def complete_registration(message: types.Message, state: FSMContext, bot:
         )
 
         # Рассылаем всем админам
-        for admin_id in Config.get_admins():
-            try:
-                await bot.send_message(
-                    chat_id=admin_id,
-                    text=admin_text
-                )
-            except Exception as e:
-                print(f"Не удалось отправить сообщение администратору {admin_id}: {e}")
+        await enqueue_notifications(Config.get_admins(), admin_text)
 
         # Отправляем сообщение пользователю с клавиатурой главного меню
         await message.answer(
@@ -239,69 +175,29 @@ async def complete_registration(message: types.Message, state: FSMContext, bot:
 
 # СМОТРИМ АКТИВНЫЕ ЗАДАЧИ
 @router.message(F.text == "Список активных заказов 📋")
-async def all_order_executor(message: types.Message, state: FSMContext):
-    user_id = message.from_user.id
+async def all_order_executor(message: types.Message, state: FSMContext, bot: Bot):
+    await state.clear()
+    await open_board(message, bot)
 
-    try:
-        with get_connection() as conn:
-            with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cursor:
-                # Получаем информацию о пользователе из БД
-                cursor.execute("SELECT is_loader, is_driver FROM users WHERE id_user_telegram = %s", (user_id,))
-                user_data = cursor.fetchone()
-
-                if not user_data:
-                    await message.answer("Пользователь не найден.")
-                    return
-
-                is_loader = user_data['is_loader']
-                is_driver = user_data['is_driver']
-
-                # Определяем тип пользователя для фильтрации задач
-                user_type = None
-                if is_loader and not is_driver:
-                    user_type = "Погрузка"  # Изменил на значение из таблицы
-                elif is_driver and not is_loader:
-                    user_type = "Доставка"  # Изменил на значение из таблицы
-
-                # Получаем задачи с учетом типа пользователя
-                cursor.execute("""
-                    SELECT * FROM tasks 
-                    WHERE task_status = 'Назначена'
-                    AND (task_type = %s OR %s IS NULL)
-                    ORDER BY created_at DESC
-                """, (user_type, user_type))
-                tasks = cursor.fetchall()
-
-                if not tasks:
-                    await message.answer("Нет активных заказов для вас.")
-                    return
-
-                # Формируем сообщение с задачами
-                response = []
-                for task in tasks:
-                    task_info = (
-                        f"🆔 Номер задачи: {task['id_tasks']}\n"
-                        f"🔹 Тип: {task['task_type']}\n"
-                        f"📅 Дата: {task['assignment_date']}\n"
-                        f"⏰ Время: {task['assignment_time']}\n"
-                        f"🏡 Адрес: {task['main_address']}"
-                    )
-                    if task['additional_address']:
-                        task_info += f" ({task['additional_address']})"
-                    task_info += (
-                        f"\n📝 Описание: {task['description']}\n"
-                        f"👷 Требуется работников: {task['required_workers']}\n"
-                        f"💰 Цена за работу: {task['worker_price']} руб.\n"
-                        f"────────────────────"
-                    )
-                    response.append(task_info)
-
-                await message.answer("Активные задачи:\n\n" + "\n\n".join(response))
 
+async def open_board(message: types.Message, bot: Bot):
+    """Свободные и свои задачи - в закрепленной доске исполнителя, а не новым сообщением"""
+    try:
+        if not await show_board(bot, message.from_user.id):
+            await message.answer("Пользователь не найден.")
+            return
+        # Нажатие кнопки не оставляет в чате лишних сообщений: доска закреплена сверху
+        await message.delete()
     except Exception as e:
         await message.answer(f"Произошла ошибка: {str(e)}")
-    finally:
-        await state.clear()
+
+
+async def refresh_own_board(bot: Bot, user_id: int):
+    """Обновляет доску после взятия или отказа; ответ исполнителю к этому времени уже отправлен"""
+    try:
+        await show_board(bot, user_id)
+    except Exception as e:
+        print(f"Не удалось обновить доску исполнителя {user_id}: {e}")
 
 
 # ВЗЯТЬ ЗАКАЗ
@@ -310,7 +206,7 @@ async def take_the_task(message: types.Message, state: FSMContext):
     await state.clear()
     user_id = message.from_user.id
     # Проверяем статус пользователя
-    if not status_verification(user_id):
+    if not await status_verification(user_id):
         await message.answer("Извините, вы больше не можете брать задачи в этом боте. Обратитесь к администратору бота.")
         return
 
@@ -318,7 +214,7 @@ async def take_the_task(message: types.Message, state: FSMContext):
     await message.answer("Введите номер задачи которую хотите взять:")
 
 @router.message(TaskNumber.waiting_task_number_add)
-async def get_a_task(message: types.Message, state: FSMContext):
+async def get_a_task(message: types.Message, state: FSMContext, bot: Bot):
     user_id = message.from_user.id
     task_text = message.text
     # Проверяем, что введен номер задачи (число)
@@ -327,13 +223,18 @@ async def get_a_task(message: types.Message, state: FSMContext):
         return
 
     id_tasks = int(task_text)
-    status = add_to_assigned_performers(user_id, id_tasks)
+    status = await add_to_assigned_performers(user_id, id_tasks)
     print(f"status {status}")
+    if status.startswith("Вы взяли задачу"):
+        # Если часть напоминаний уже прошла, исполнитель получит ближайшее сразу
+        scheduler.task_claimed(id_tasks)
     await message.answer(
         text=status,
         reply_markup=get_executor_keyboard(),
     )
     await state.clear()
+    if status.startswith("Вы взяли задачу"):
+        await refresh_own_board(bot, user_id)
 
 # ОТЧЕТ О ВЫПОЛНЕННОМ ЗАКАЗЕ
 @router.message(F.text == "Заказ выполнен ✅")
@@ -349,12 +250,11 @@ async def application_is_completed_2(message: types.Message, state: FSMContext,
     task_text = message.text
 
     # Отправляем исчезающее сообщение всем администраторам
-    for admin_id in Config.get_admins():
-        try:
-            text = f"Пользователь {user_id} уведомляет о выполнении заказа # {task_text}"
-            await send_temp_message(bot, admin_id, text, delete_after=10)
-        except Exception as e:
-            print(f"Не удалось отправить сообщение админу {admin_id}: {e}")
+    await enqueue_notifications(
+        Config.get_admins(),
+        f"Пользователь {user_id} уведомляет о выполнении заказа # {task_text}",
+        delete_after=10
+    )
 
     # Отправляем подтверждение пользователю
     await message.answer(f"Уведомление о выполнении заказа #{task_text} отправлено администраторам!")
@@ -370,7 +270,7 @@ async def refusal_of_the_task(message: types.Message, state: FSMContext):
     await message.answer("Введите номер заказа от которого хотите отказаться:")
 
 @router.message(TaskNumber.waiting_task_number_dell)
-async def refusal_of_the_task_2(message: types.Message, state: FSMContext):
+async def refusal_of_the_task_2(message: types.Message, state: FSMContext, bot: Bot):
     user_id = message.from_user.id
     task_text = message.text
 
@@ -380,13 +280,15 @@ async def refusal_of_the_task_2(message: types.Message, state: FSMContext):
         return
 
     id_tasks = int(task_text)
-    status = dell_to_assigned_performers(user_id, id_tasks)
+    status = await dell_to_assigned_performers(user_id, id_tasks)
     print(f"status {status}")
     await message.answer(
         text=status,
         reply_markup=get_executor_keyboard(),
     )
     await state.clear()
+    if status.startswith("Вы отказались от задачи"):
+        await refresh_own_board(bot, user_id)
 
 
 @router.message(F.text == "Личный кабинет 👨‍💻")
@@ -398,18 +300,14 @@ async def personal_office(message: types.Message):
 
 
 @router.message(F.text == "Мои задачи 📖")
-async def personal_office(message: types.Message):
-    user_id = message.from_user.id
-    tasks = get_user_tasks(user_id)
-    await message.answer(
-        text=tasks
-    )
+async def personal_office(message: types.Message, bot: Bot):
+    await open_board(message, bot)
 
 
 @router.message(F.text == "Мои данные 📑")
 async def my_data_executor(message: types.Message):
     user_id = message.from_user.id
-    data = my_data(user_id)
+    data = await my_data(user_id)
     await message.answer(
         text=data,
         reply_markup=update_data()
@@ -435,7 +333,7 @@ async def basic_menu(message: types.Message):
 @router.message(F.text == "Статистика заявок 📊")
 async def statistics_of_applications(message: types.Message, state: FSMContext):
     user_id = message.from_user.id
-    statistics = contractor_statistics_database(user_id)
+    statistics = await contractor_statistics_database(user_id)
     await message.answer(
         text=statistics,
         reply_markup=get_executor_keyboard()
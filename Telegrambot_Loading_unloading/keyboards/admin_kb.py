@@ -10,6 +10,7 @@ def get_admin_keyboard():
 def tasks_keyboard():
     buttons = [
         [KeyboardButton(text="Поставить задачу 📝")],
+        [KeyboardButton(text="Загрузить задачи из файла 📥")],
         [KeyboardButton(text="Активные задачи 📋")],
         [KeyboardButton(text="Завершить задачу 📁")],
         [KeyboardButton(text="Удалить задачу ❌")],
@@ -36,7 +37,13 @@ def authorization_keyboard(user_id: int):
     ])
     return admin_keyboard
 
-
-
-
-
+def tasks_pages_keyboard(prev_cursor: str = None, next_cursor: str = None):
+    """Листание списка активных задач; курсор - ключ первой/последней задачи на странице"""
+    buttons = []
+    if prev_cursor:
+        buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"tasks_page_prev_{prev_cursor}"))
+    if next_cursor:
+        buttons.append(InlineKeyboardButton(text="Вперед ➡️", callback_data=f"tasks_page_next_{next_cursor}"))
+    if not buttons:
+        return None
+    return InlineKeyboardMarkup(inline_keyboard=[buttons])
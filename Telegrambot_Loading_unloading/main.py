@@ -2,23 +2,49 @@ from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 import asyncio
+from archive import run_archiver
 from config import Config
-from database import check_and_create_db, initialize_database
+from database import check_and_create_db, initialize_database, create_pool, close_pool, listen_task_changes
+from executor_board import run_board_updates
+from fsm_storage import PostgresStorage
+from migrations import migrate
+from outbox import run_outbox
+from reminders import scheduler
 from handlers import admin, executor, common
 
 
 async def main():
+    outbox_task = None
+    reminders_task = None
+    archive_task = None
+    board_task = None
+    boards_task = None
     try:
         # Инициализировать бота и диспетчера
         bot = Bot(
             token=Config.TELEGRAM_TOKEN,
             default=DefaultBotProperties(parse_mode=ParseMode.HTML)
         )
-        dp = Dispatcher()
+        # Состояния диалогов хранятся в базе: переживают перезапуск и общие для всех процессов
+        storage = PostgresStorage()
+        dp = Dispatcher(storage=storage, events_isolation=storage)
 
         # Проверка соединения и наличия, создание базы данных.
-        check_and_create_db()
-        initialize_database()
+        await check_and_create_db()
+        await create_pool()
+        await initialize_database()
+        await migrate()
+
+        # Фоновая отправка уведомлений из очереди
+        outbox_task = asyncio.create_task(run_outbox(bot))
+        # Напоминания исполнителям о начале смены
+        reminders_task = asyncio.create_task(scheduler.run())
+        # Перенос старых завершенных задач в архив
+        archive_task = asyncio.create_task(run_archiver())
+        # Доска свободных задач в памяти, обновляется по NOTIFY от базы
+        board_task = asyncio.create_task(listen_task_changes())
+        # Закрепленные доски исполнителей правятся при изменении свободных задач
+        boards_task = asyncio.create_task(run_board_updates(bot))
 
         # Включить маршрутизаторы
         dp.include_router(common.router)
@@ -30,6 +56,11 @@ async def main():
     except asyncio.CancelledError:
         print("\nРабота бота завершена пользователем")
     finally:
+        for background_task in (boards_task, board_task, archive_task, reminders_task, outbox_task):
+            if background_task:
+                background_task.cancel()
+                await asyncio.gather(background_task, return_exceptions=True)
+        await close_pool()
         await bot.session.close()
 
 if __name__ == "__main__":
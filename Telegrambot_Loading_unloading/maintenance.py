@@ -0,0 +1,57 @@
+"""Служебные команды для обслуживания базы.
+
+Запуск: python maintenance.py recompute-stats
+        python maintenance.py cleanup-fsm
+        python maintenance.py archive-tasks
+"""
+import argparse
+import asyncio
+
+import database
+from archive import archive_finished_tasks
+
+# Незаконченный диалог хранится неделю
+FSM_KEEP_DAYS = 7
+
+
+async def recompute_stats():
+    """Исправляет расхождения в performer_stats"""
+    repaired = await database.recompute_performer_stats()
+    print(f"Статистика исполнителей пересчитана, исправлено записей: {repaired}")
+
+
+async def cleanup_fsm():
+    """Удаляет брошенные диалоги (регистрация, постановка задачи)"""
+    deleted = await database.pool.execute(
+        "DELETE FROM fsm_storage WHERE updated_at < CURRENT_TIMESTAMP - make_interval(days => $1)",
+        FSM_KEEP_DAYS
+    )
+    print(f"Удалено брошенных диалогов: {deleted.split()[-1]}")
+
+
+async def archive_tasks():
+    """Переносит старые завершенные задачи в архив, не дожидаясь запуска в боте"""
+    moved = await archive_finished_tasks()
+    print(f"В архив перенесено задач: {moved}")
+
+COMMANDS = {
+    "recompute-stats": recompute_stats,
+    "cleanup-fsm": cleanup_fsm,
+    "archive-tasks": archive_tasks,
+}
+
+
+async def main(command):
+    await database.create_pool()
+    try:
+        await COMMANDS[command]()
+    finally:
+        await database.close_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Обслуживание базы бота")
+    parser.add_argument("command", choices=COMMANDS, help="команда")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.command))
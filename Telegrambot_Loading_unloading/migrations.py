@@ -0,0 +1,375 @@
+"""Версионные миграции схемы базы.
+
+Каждая миграция применяется один раз в своей транзакции, номер применённой
+миграции записывается в schema_migrations. Новые изменения схемы добавляются
+в конец списка MIGRATIONS со следующим номером.
+
+Запуск вручную: python migrations.py
+Проверка планов запросов: python migrations.py --explain
+"""
+import argparse
+import asyncio
+import json
+
+import database
+
+# Ключ advisory-блокировки: две копии бота не применяют миграции одновременно
+MIGRATIONS_LOCK_ID = 20240601
+
+# (номер, описание, SQL)
+MIGRATIONS = [
+    (1, "Индексы для списков задач и рассылки исполнителям", """
+        -- Новые задачи по типу и дате: get_pending_tasks
+        CREATE INDEX IF NOT EXISTS idx_tasks_pending_type_date
+            ON tasks (task_type, assignment_date, assignment_time)
+            WHERE task_status = 'Назначена';
+
+        -- Новые задачи от свежих к старым: список активных заказов исполнителя
+        CREATE INDEX IF NOT EXISTS idx_tasks_pending_created
+            ON tasks (created_at DESC)
+            WHERE task_status = 'Назначена';
+
+        -- Активные задачи в порядке ключа страниц all_order_admin_database
+        CREATE INDEX IF NOT EXISTS idx_tasks_active_schedule
+            ON tasks (
+                (COALESCE(assignment_date, 'infinity'::date)),
+                (COALESCE(assignment_time, '24:00'::time)),
+                id_tasks
+            )
+            WHERE task_status IN ('Назначена', 'Работники найдены');
+
+        -- Активные грузчики и водители: рассылка новых задач
+        CREATE INDEX IF NOT EXISTS idx_users_active_loaders
+            ON users (id_user_telegram)
+            WHERE status = 'Активный' AND is_loader;
+
+        CREATE INDEX IF NOT EXISTS idx_users_active_drivers
+            ON users (id_user_telegram)
+            WHERE status = 'Активный' AND is_driver;
+
+        -- Задачи исполнителя (первичный ключ начинается с task_id)
+        CREATE INDEX IF NOT EXISTS idx_task_performers_user
+            ON task_performers (id_user_telegram);
+    """),
+    (2, "Очередь исходящих уведомлений", """
+        CREATE TABLE IF NOT EXISTS notification_outbox (
+            id BIGSERIAL PRIMARY KEY,
+            chat_id BIGINT NOT NULL,
+            text TEXT NOT NULL,
+            reply_markup JSONB NULL,
+            delete_after INT NULL,
+            attempts INT NOT NULL DEFAULT 0,
+            next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            sent_at TIMESTAMP NULL,
+            failed_at TIMESTAMP NULL,
+            last_error TEXT NULL
+        );
+
+        -- Неотправленные сообщения в порядке очереди
+        CREATE INDEX IF NOT EXISTS idx_outbox_pending
+            ON notification_outbox (next_attempt_at, id)
+            WHERE sent_at IS NULL AND failed_at IS NULL;
+    """),
+    (3, "Хранилище состояний FSM", """
+        CREATE TABLE IF NOT EXISTS fsm_storage (
+            key TEXT PRIMARY KEY,
+            state TEXT NULL,
+            data TEXT NULL,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+    """),
+    (4, "Отправленные напоминания о сменах", """
+        CREATE TABLE IF NOT EXISTS task_reminders (
+            task_id BIGINT NOT NULL REFERENCES tasks(id_tasks) ON DELETE CASCADE,
+            id_user_telegram BIGINT NOT NULL REFERENCES users(id_user_telegram) ON DELETE CASCADE,
+            offset_minutes INT NOT NULL,
+            sent_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (task_id, id_user_telegram, offset_minutes)
+        );
+    """),
+    (5, "Исполнители задачи только в task_performers, счетчик claimed_count", """
+        -- Столбец с постоянным значением по умолчанию добавляется без перезаписи таблицы
+        ALTER TABLE tasks ADD COLUMN IF NOT EXISTS claimed_count INT NOT NULL DEFAULT 0;
+
+        -- Исполнители, которые были только в массиве
+        INSERT INTO task_performers (task_id, id_user_telegram)
+        SELECT DISTINCT t.id_tasks, performer_id
+        FROM tasks t
+        CROSS JOIN LATERAL unnest(t.assigned_performers) AS performer_id
+        JOIN users u ON u.id_user_telegram = performer_id
+        ON CONFLICT DO NOTHING;
+
+        -- Перезаписываются только задачи, у которых есть исполнители
+        UPDATE tasks t
+        SET claimed_count = tp.performers
+        FROM (
+            SELECT task_id, COUNT(*) AS performers
+            FROM task_performers
+            GROUP BY task_id
+        ) tp
+        WHERE t.id_tasks = tp.task_id;
+
+        -- Удаление столбца тоже меняет только каталог
+        ALTER TABLE tasks DROP COLUMN assigned_performers;
+    """),
+    (6, "Архив завершенных задач по месяцам", """
+        -- Разделы по месяцам создает archive.py перед переносом задач
+        CREATE TABLE IF NOT EXISTS tasks_archive (
+            id_tasks BIGINT NOT NULL,
+            created_at TIMESTAMP NOT NULL,
+            assignment_date DATE NULL,
+            assignment_time TIME NULL,
+            task_type VARCHAR(20) NOT NULL,
+            description TEXT NOT NULL,
+            main_address VARCHAR(200) NOT NULL,
+            additional_address VARCHAR(200) NULL,
+            required_workers INT NOT NULL,
+            worker_price NUMERIC(10, 2) NOT NULL,
+            claimed_count INT NOT NULL,
+            task_status VARCHAR(30) NOT NULL,
+            archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id_tasks, created_at)
+        ) PARTITION BY RANGE (created_at);
+
+        CREATE TABLE IF NOT EXISTS task_performers_archive (
+            task_id BIGINT NOT NULL,
+            task_created_at TIMESTAMP NOT NULL,
+            id_user_telegram BIGINT NOT NULL,
+            PRIMARY KEY (task_id, task_created_at, id_user_telegram)
+        ) PARTITION BY RANGE (task_created_at);
+
+        -- История исполнителя и пересчет статистики
+        CREATE INDEX IF NOT EXISTS idx_task_performers_archive_user
+            ON task_performers_archive (id_user_telegram);
+    """),
+    (7, "NOTIFY об изменении свободных задач", """
+        -- В уведомлении только тип задачи: одинаковые уведомления одной транзакции
+        -- PostgreSQL доставляет один раз, загрузка сотни задач - одно уведомление
+        CREATE OR REPLACE FUNCTION notify_task_change() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.task_status = 'Назначена' THEN
+                PERFORM pg_notify('task_changes', OLD.task_type);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.task_status = 'Назначена' THEN
+                PERFORM pg_notify('task_changes', NEW.task_type);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS tasks_notify_change ON tasks;
+        CREATE TRIGGER tasks_notify_change
+            AFTER INSERT OR UPDATE OR DELETE ON tasks
+            FOR EACH ROW EXECUTE FUNCTION notify_task_change();
+    """),
+    (8, "Закрепленные доски задач исполнителей", """
+        CREATE TABLE IF NOT EXISTS executor_boards (
+            id_user_telegram BIGINT PRIMARY KEY REFERENCES users(id_user_telegram) ON DELETE CASCADE,
+            message_id BIGINT NOT NULL,
+            content_hash TEXT NOT NULL,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+    """),
+    (9, "NOTIFY и об изменении задач с набранными исполнителями", """
+        -- Завершение или удаление задачи в статусе 'Работники найдены' меняет раздел
+        -- «Мои задачи» на досках ее исполнителей, поэтому тоже нужно уведомление
+        CREATE OR REPLACE FUNCTION notify_task_change() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.task_status IN ('Назначена', 'Работники найдены') THEN
+                PERFORM pg_notify('task_changes', OLD.task_type);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.task_status = 'Назначена' THEN
+                PERFORM pg_notify('task_changes', NEW.task_type);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """),
+]
+
+# Запросы бота и индексы, хотя бы один из которых должен быть в плане:
+# (название, запрос, параметры, индексы)
+EXPLAIN_CHECKS = [
+    (
+        "get_pending_tasks (грузчик)",
+        database.PENDING_TASKS_QUERY.format(type_filter=database.PENDING_TYPE_FILTERS["loader"]),
+        (),
+        # Новые задачи обычно вставляются по порядку created_at, и планировщик
+        # может предпочесть этот индекс с сортировкой результата
+        ("idx_tasks_pending_type_date", "idx_tasks_pending_created"),
+    ),
+    (
+        "get_board_tasks",
+        database.BOARD_TASKS_QUERY,
+        ("Погрузка",),
+        ("idx_tasks_pending_created",),
+    ),
+    (
+        "all_order_admin_database",
+        database.ACTIVE_TASKS_AFTER,
+        (None, None, None, database.TASKS_PAGE_SIZE + 1),
+        ("idx_tasks_active_schedule",),
+    ),
+    (
+        "get_all_users_type (Погрузка)",
+        database.ACTIVE_USERS_QUERY.format(type_filter=database.USER_TYPE_FILTERS["Погрузка"]),
+        (),
+        ("idx_users_active_loaders",),
+    ),
+    (
+        "get_all_users_type (Доставка)",
+        database.ACTIVE_USERS_QUERY.format(type_filter=database.USER_TYPE_FILTERS["Доставка"]),
+        (),
+        ("idx_users_active_drivers",),
+    ),
+    (
+        "get_user_tasks",
+        database.USER_TASKS_QUERY,
+        (-1,),
+        ("idx_task_performers_user",),
+    ),
+    (
+        "get_active_tasks_of_users",
+        database.ACTIVE_TASKS_OF_USERS_QUERY,
+        ([-1, -2],),
+        ("idx_task_performers_user",),
+    ),
+]
+
+# Объем данных для проверки планов: на пустых таблицах планировщику все равно,
+# каким путем читать. Отрицательные ID не пересекаются с настоящими и не сдвигают
+# последовательность номеров задач.
+SAMPLE_USERS = 2000
+SAMPLE_TASKS = 50000
+
+
+async def seed_sample(connection):
+    """Правдоподобные данные: большинство задач завершены, активна часть исполнителей"""
+    await connection.execute("""
+        INSERT INTO users (id_user_telegram, first_name, last_name, phone, is_loader, is_driver, status)
+        SELECT -i, 'Проверка', 'Планов', '79160000000', i % 3 <> 0, i % 3 <> 1,
+               CASE WHEN i % 10 = 0 THEN 'Активный' ELSE 'Заблокированный' END
+        FROM generate_series(1, $1) AS i
+    """, SAMPLE_USERS)
+    await connection.execute("""
+        INSERT INTO tasks (id_tasks, created_at, assignment_date, assignment_time, task_type,
+                           description, main_address, required_workers, worker_price, task_status)
+        SELECT -i,
+               now() - i * interval '10 minutes',
+               CURRENT_DATE - i / 50,
+               make_time(8 + i % 12, 0, 0),
+               CASE WHEN i % 3 = 0 THEN 'Погрузка' ELSE 'Доставка' END,
+               'Проверка планов', 'Адрес', 2, 1000,
+               CASE
+                   WHEN i % 40 = 0 THEN 'Назначена'
+                   WHEN i % 40 = 1 THEN 'Работники найдены'
+                   WHEN i % 40 = 2 THEN 'Отменено'
+                   ELSE 'Завершено'
+               END
+        FROM generate_series(1, $1) AS i
+    """, SAMPLE_TASKS)
+    await connection.execute("""
+        INSERT INTO task_performers (task_id, id_user_telegram)
+        SELECT -i, -(1 + (i * performer) % $2)
+        FROM generate_series(1, $1) AS i, (VALUES (7), (13)) AS p(performer)
+        ON CONFLICT DO NOTHING
+    """, SAMPLE_TASKS, SAMPLE_USERS)
+    await connection.execute("ANALYZE users, tasks, task_performers")
+
+
+async def apply_migrations(connection) -> int:
+    """Применяет недостающие миграции, возвращает их количество"""
+    await connection.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    await connection.execute("SELECT pg_advisory_lock($1)", MIGRATIONS_LOCK_ID)
+    try:
+        applied = {
+            row['version'] for row in await connection.fetch("SELECT version FROM schema_migrations")
+        }
+        count = 0
+        for version, description, sql in MIGRATIONS:
+            if version in applied:
+                continue
+            async with connection.transaction():
+                await connection.execute(sql)
+                await connection.execute(
+                    "INSERT INTO schema_migrations (version, description) VALUES ($1, $2)",
+                    version, description
+                )
+            print(f"Применена миграция {version}: {description}")
+            count += 1
+        return count
+    finally:
+        await connection.execute("SELECT pg_advisory_unlock($1)", MIGRATIONS_LOCK_ID)
+
+
+def plan_indexes(plan) -> set:
+    """Имена индексов во всех узлах плана EXPLAIN (FORMAT JSON)"""
+    indexes = set()
+    if "Index Name" in plan:
+        indexes.add(plan["Index Name"])
+    for child in plan.get("Plans", []):
+        indexes |= plan_indexes(child)
+    return indexes
+
+
+async def explain_check(connection) -> bool:
+    """Проверяет, что запросы бота используют свои индексы.
+
+    Данные для проверки вставляются в транзакции, которая затем откатывается,
+    вместе со статистикой ANALYZE.
+    """
+    ok = True
+    transaction = connection.transaction()
+    await transaction.start()
+    try:
+        await seed_sample(connection)
+        for name, query, params, indexes in EXPLAIN_CHECKS:
+            plan = json.loads(await connection.fetchval(f"EXPLAIN (FORMAT JSON) {query}", *params))
+            used = plan_indexes(plan[0]["Plan"])
+            if used & set(indexes):
+                print(f"✅ {name}: {', '.join(sorted(used & set(indexes)))}")
+            else:
+                ok = False
+                print(f"❌ {name}: нет {' или '.join(indexes)} в плане (индексы: {', '.join(sorted(used)) or 'нет'})")
+    finally:
+        await transaction.rollback()
+    return ok
+
+
+async def migrate():
+    """Миграции при запуске бота, после создания таблиц"""
+    async with database.pool.acquire() as connection:
+        count = await apply_migrations(connection)
+    if not count:
+        print("Схема базы в актуальной версии.")
+
+
+async def main(explain):
+    await database.check_and_create_db()
+    await database.create_pool()
+    try:
+        await database.initialize_database()
+        await migrate()
+        if explain:
+            async with database.pool.acquire() as connection:
+                return await explain_check(connection)
+        return True
+    finally:
+        await database.close_pool()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Миграции схемы базы")
+    parser.add_argument("--explain", action="store_true", help="проверить планы запросов бота")
+    args = parser.parse_args()
+
+    if not asyncio.run(main(args.explain)):
+        raise SystemExit(1)
@@ -0,0 +1,62 @@
+"""Рассылка новых задач исполнителям волнами.
+
+Первыми задачу получают исполнители с лучшей долей выполненных задач. Если
+через NOTIFY_WAVE_INTERVAL секунд места в задаче еще есть, рассылка
+расширяется на следующую волну, вдвое больше предыдущей. Как только задача
+перестает быть 'Назначена' (работники найдены, задача удалена или завершена),
+рассылка прекращается. Сами сообщения отправляет очередь уведомлений (outbox.py).
+"""
+import asyncio
+
+from config import Config
+from database import enqueue_notifications, get_ranked_users_type, get_task_status
+
+# Ссылки на фоновые рассылки, чтобы задачи asyncio не собрал сборщик мусора
+_running = set()
+
+
+def waves(user_ids: list, first_wave: int) -> list:
+    """Делит упорядоченный список исполнителей на волны: N, 2N, 4N, ..."""
+    result = []
+    size = max(first_wave, 1)
+    start = 0
+    while start < len(user_ids):
+        result.append(user_ids[start:start + size])
+        start += size
+        size *= 2
+    return result
+
+
+async def notify_in_waves(task_id: int, remaining_waves: list, text: str, interval: float = None) -> int:
+    """Рассылает оставшиеся волны, пока в задаче есть свободные места"""
+    interval = Config.NOTIFY_WAVE_INTERVAL if interval is None else interval
+    sent_count = 0
+    for number, wave in enumerate(remaining_waves, start=2):
+        await asyncio.sleep(interval)
+        status = await get_task_status(task_id)
+        if status != 'Назначена':
+            print(f"Рассылка задачи {task_id} остановлена перед волной {number}: {status or 'задача удалена'}")
+            break
+        sent_count += await enqueue_notifications(wave, text)
+    print(f"Рассылка задачи {task_id} завершена, дополнительно в очереди: {sent_count}")
+    return sent_count
+
+
+async def dispatch_new_task(task_id: int, task_type: str, text: str):
+    """Отправляет задачу первой волне и запускает остальные волны в фоне.
+
+    Возвращает (поставлено в очередь для первой волны, сколько исполнителей ждут следующих волн).
+    """
+    user_ids = await get_ranked_users_type(task_type)
+    if not user_ids:
+        return 0, 0
+
+    first, *rest = waves(user_ids, Config.NOTIFY_FIRST_WAVE)
+    sent_count = await enqueue_notifications(first, text)
+
+    if rest:
+        task = asyncio.create_task(notify_in_waves(task_id, rest, text))
+        _running.add(task)
+        task.add_done_callback(_running.discard)
+
+    return sent_count, len(user_ids) - len(first)
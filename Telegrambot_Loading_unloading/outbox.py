@@ -0,0 +1,163 @@
+"""Фоновая отправка уведомлений из очереди notification_outbox.
+
+Обработчики и функции базы только записывают сообщения в очередь (в той же
+транзакции, что и изменение данных), а этот обработчик отправляет их с
+ограничением скорости и повторами. Сообщение выдается обработчику в аренду на
+OUTBOX_LEASE секунд: если бот упадет до отправки, сообщение вернется в очередь.
+"""
+import asyncio
+import json
+import time
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+
+import database
+from config import Config
+
+# На сколько секунд сообщение закрепляется за обработчиком
+OUTBOX_LEASE = 60
+# Пауза перед повтором: 5, 10, 20, 40... секунд, но не больше 10 минут
+RETRY_BASE_DELAY = 5
+RETRY_MAX_DELAY = 600
+# Отправленные сообщения хранятся неделю
+KEEP_SENT_DAYS = 7
+CLEANUP_INTERVAL = 3600
+
+# Отложенные удаления сообщений (delete_after)
+_pending_deletes = set()
+
+
+async def claim_batch(limit: int) -> list:
+    """Забирает очередную порцию сообщений; другие копии бота их пропустят"""
+    return await database.pool.fetch("""
+        UPDATE notification_outbox
+        SET next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => $2),
+            attempts = attempts + 1
+        WHERE id IN (
+            SELECT id FROM notification_outbox
+            WHERE sent_at IS NULL AND failed_at IS NULL
+              AND next_attempt_at <= CURRENT_TIMESTAMP
+            ORDER BY next_attempt_at, id
+            LIMIT $1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, chat_id, text, reply_markup, delete_after, attempts
+    """, limit, OUTBOX_LEASE)
+
+
+async def mark_sent(message_id: int):
+    await database.pool.execute(
+        "UPDATE notification_outbox SET sent_at = CURRENT_TIMESTAMP, last_error = NULL WHERE id = $1",
+        message_id
+    )
+
+
+async def mark_failed(message, error: str, retry_in: float = None):
+    """Повтор через retry_in секунд или окончательная ошибка, если попытки кончились"""
+    if retry_in is None or message['attempts'] >= Config.OUTBOX_MAX_ATTEMPTS:
+        await database.pool.execute("""
+            UPDATE notification_outbox
+            SET failed_at = CURRENT_TIMESTAMP, last_error = $2
+            WHERE id = $1
+        """, message['id'], error)
+        print(f"Уведомление {message['id']} для {message['chat_id']} не отправлено: {error}")
+    else:
+        await database.pool.execute("""
+            UPDATE notification_outbox
+            SET next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => $2), last_error = $3
+            WHERE id = $1
+        """, message['id'], retry_in, error)
+
+
+async def postpone(message_ids: list, retry_in: float, error: str = None):
+    """
+    Возвращает сообщения в очередь через retry_in секунд, не засчитывая попытку:
+    после лимита Telegram (RetryAfter) сообщение не ошибочное, его просто рано отправлять.
+    """
+    await database.pool.execute("""
+        UPDATE notification_outbox
+        SET next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => $2),
+            attempts = attempts - 1,
+            last_error = COALESCE($3, last_error)
+        WHERE id = ANY($1::bigint[])
+    """, message_ids, retry_in, error)
+
+
+async def delete_later(bot: Bot, chat_id: int, message_id: int, delay: int):
+    await asyncio.sleep(delay)
+    try:
+        await bot.delete_message(chat_id=chat_id, message_id=message_id)
+    except Exception as e:
+        print(f"Не удалось удалить сообщение {message_id} в чате {chat_id}: {e}")
+
+
+async def deliver(bot: Bot, message):
+    """Отправляет одно сообщение из очереди и записывает результат"""
+    try:
+        sent = await bot.send_message(
+            chat_id=message['chat_id'],
+            text=message['text'],
+            reply_markup=json.loads(message['reply_markup']) if message['reply_markup'] else None
+        )
+    except TelegramRetryAfter as e:
+        # Превышен лимит Telegram: ждем столько, сколько он просит
+        await postpone([message['id']], e.retry_after, str(e))
+        return e.retry_after
+    except (TelegramForbiddenError, TelegramBadRequest) as e:
+        # Бот заблокирован или чат не существует - повтор не поможет
+        await mark_failed(message, str(e))
+    except Exception as e:
+        delay = min(RETRY_BASE_DELAY * 2 ** (message['attempts'] - 1), RETRY_MAX_DELAY)
+        await mark_failed(message, str(e), delay)
+    else:
+        await mark_sent(message['id'])
+        if message['delete_after']:
+            task = asyncio.create_task(
+                delete_later(bot, message['chat_id'], sent.message_id, message['delete_after'])
+            )
+            _pending_deletes.add(task)
+            task.add_done_callback(_pending_deletes.discard)
+    return 0
+
+
+async def cleanup_sent():
+    await database.pool.execute("""
+        DELETE FROM notification_outbox
+        WHERE sent_at < CURRENT_TIMESTAMP - make_interval(days => $1)
+    """, KEEP_SENT_DAYS)
+
+
+async def run_outbox(bot: Bot):
+    """Бесконечный цикл отправки; останавливается отменой задачи"""
+    interval = 1 / Config.OUTBOX_RATE
+    last_cleanup = 0
+    print("Очередь уведомлений запущена.")
+    while True:
+        try:
+            batch = await claim_batch(Config.OUTBOX_BATCH_SIZE)
+            if not batch:
+                if time.monotonic() - last_cleanup > CLEANUP_INTERVAL:
+                    await cleanup_sent()
+                    last_cleanup = time.monotonic()
+                await asyncio.sleep(Config.OUTBOX_POLL_INTERVAL)
+                continue
+
+            for position, message in enumerate(batch):
+                started = time.monotonic()
+                pause = await deliver(bot, message)
+                if pause:
+                    # Пока ждем, аренда остальных сообщений порции истекла бы, и их
+                    # могла бы отправить другая копия бота. Возвращаем их в очередь.
+                    rest = [queued['id'] for queued in batch[position + 1:]]
+                    if rest:
+                        await postpone(rest, pause)
+                    await asyncio.sleep(pause)
+                    break
+                # Не больше OUTBOX_RATE сообщений в секунду
+                await asyncio.sleep(max(0, interval - (time.monotonic() - started)))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Ошибка обработчика очереди уведомлений: {e}")
+            await asyncio.sleep(Config.OUTBOX_POLL_INTERVAL)
@@ -0,0 +1,145 @@
+"""Напоминания исполнителям о начале смены.
+
+Расписание хранится в памяти процесса в куче (heapq): элемент - момент
+отправки, номер задачи и за сколько минут до начала смены напоминаем. При
+запуске бота куча один раз заполняется из базы, дальше ее меняют обработчики:
+новая задача добавляет свои напоминания, удаленная или завершенная задача из
+расписания убирается. Планировщик спит до ближайшего напоминания и не опрашивает
+таблицу задач.
+
+Кому напоминать, решается в момент отправки по task_performers, поэтому
+исполнитель, отказавшийся от задачи, напоминание не получит. Отправленные
+напоминания записываются в task_reminders вместе с постановкой в очередь
+уведомлений, так что после перезапуска повторов не будет.
+"""
+import asyncio
+import heapq
+from datetime import datetime, timedelta
+
+from config import Config
+from database import get_upcoming_tasks, send_task_reminders
+
+# Даже без новых событий планировщик просыпается раз в час, чтобы
+# не зависеть от перевода системных часов
+MAX_SLEEP = 3600
+# Пауза перед повтором, если база недоступна
+RETRY_DELAY = 30
+
+
+class ReminderScheduler:
+    def __init__(self, offsets_minutes: list):
+        # От большего к меньшему: 720, 60
+        self.offsets = sorted({int(offset) for offset in offsets_minutes if offset > 0}, reverse=True)
+        self._heap = []
+        # Начало смены по номеру задачи; задачи, которых здесь нет, пропускаются
+        self._starts = {}
+        self._wakeup = asyncio.Event()
+        self.sent = 0
+
+    def _push(self, fire_at: datetime, task_id: int, offset: int):
+        if not self._heap or fire_at < self._heap[0][0]:
+            # Новое напоминание раньше, чем то, которого ждет планировщик
+            self._wakeup.set()
+        heapq.heappush(self._heap, (fire_at, task_id, offset))
+
+    def add_task(self, task_id: int, starts_at: datetime, catch_up: bool = False):
+        """
+        Добавляет напоминания задачи.
+        :param catch_up: отправить сразу ближайшее пропущенное напоминание
+                         (после перезапуска бота)
+        """
+        now = datetime.now()
+        if not self.offsets or starts_at <= now:
+            return
+        self._starts[task_id] = starts_at
+        missed = None
+        for offset in self.offsets:
+            fire_at = starts_at - timedelta(minutes=offset)
+            if fire_at > now:
+                self._push(fire_at, task_id, offset)
+            else:
+                missed = offset
+        if catch_up and missed is not None:
+            self._push(now, task_id, missed)
+        # Элемент с offset 0 убирает задачу из расписания в момент начала смены
+        heapq.heappush(self._heap, (starts_at, task_id, 0))
+
+    def task_claimed(self, task_id: int):
+        """Исполнитель взял задачу, когда часть напоминаний уже прошла - догоняем ближайшим"""
+        starts_at = self._starts.get(task_id)
+        if starts_at is None:
+            return
+        now = datetime.now()
+        passed = [offset for offset in self.offsets if starts_at - timedelta(minutes=offset) <= now]
+        if passed and starts_at > now:
+            # Остальным исполнителям это напоминание повторно не придет (task_reminders)
+            self._push(now, task_id, min(passed))
+
+    def remove_task(self, task_id: int):
+        """Задача удалена или завершена; ее элементы в куче будут пропущены"""
+        self._starts.pop(task_id, None)
+
+    def _pop_due(self) -> list:
+        now = datetime.now()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, task_id, offset = heapq.heappop(self._heap)
+            starts_at = self._starts.get(task_id)
+            if starts_at is None:
+                continue
+            if offset == 0 or starts_at <= now:
+                # Смена началась
+                self._starts.pop(task_id, None)
+            else:
+                due.append((task_id, offset))
+        return due
+
+    async def load(self) -> int:
+        """Заполняет расписание из базы при запуске бота"""
+        tasks = await get_upcoming_tasks()
+        for task in tasks:
+            self.add_task(task['id_tasks'], task['starts_at'], catch_up=True)
+        return len(tasks)
+
+    async def run(self):
+        """Бесконечный цикл отправки напоминаний; останавливается отменой задачи"""
+        if not self.offsets:
+            print("Напоминания о сменах отключены.")
+            return
+        while True:
+            try:
+                count = await self.load()
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Не удалось загрузить расписание напоминаний: {e}")
+                await asyncio.sleep(RETRY_DELAY)
+        print(f"Напоминания о сменах запущены, задач в расписании: {count}.")
+
+        while True:
+            self._wakeup.clear()
+            timeout = MAX_SLEEP
+            if self._heap:
+                timeout = min(max((self._heap[0][0] - datetime.now()).total_seconds(), 0), MAX_SLEEP)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+            due = self._pop_due()
+            if not due:
+                continue
+            try:
+                self.sent += await send_task_reminders(due)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Ошибка отправки напоминаний: {e}")
+                # Вернем в расписание и попробуем позже
+                retry_at = datetime.now() + timedelta(seconds=RETRY_DELAY)
+                for task_id, offset in due:
+                    heapq.heappush(self._heap, (retry_at, task_id, offset))
+
+
+scheduler = ReminderScheduler([hours * 60 for hours in Config.REMINDER_HOURS])
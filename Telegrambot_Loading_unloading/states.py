@@ -13,6 +13,10 @@ class OrderStates(StatesGroup):
     waiting_required_workers = State()  # Количество человек
     waiting_worker_price = State()  # Цена
 
+# Загружаем задачи из файла
+class ImportTasks(StatesGroup):
+    waiting_file = State()  # Файл .xlsx или .csv
+
 # РАБОТНИК
 # Собираем данные
 class UserRegistration(StatesGroup):
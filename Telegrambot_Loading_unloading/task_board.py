@@ -0,0 +1,107 @@
+"""Доска свободных задач ('Назначена') в памяти процесса.
+
+Список задач каждого типа читается из базы один раз и отдается исполнителям из
+памяти, пока задачи этого типа не изменятся. Об изменениях сообщает триггер на
+tasks (NOTIFY task_changes с типом задачи, см. migrations.py), поэтому доска
+остается актуальной, даже если задачу взяли или удалили в другой копии бота.
+
+Пока подписка на уведомления не работает (запуск, обрыв соединения), доска
+ничего не хранит и каждый запрос идет в базу.
+"""
+import asyncio
+
+from user_cache import MISSING
+
+TASK_CHANNEL = "task_changes"
+# Проверка соединения LISTEN: обрыв сети без закрытия сокета иначе не заметить
+KEEPALIVE_INTERVAL = 60
+LISTEN_RETRY_DELAY = 5
+
+
+class TaskBoard:
+    def __init__(self):
+        self.listening = False
+        self._tasks = {}
+        # Номер версии по типу задачи: растет при каждом изменении
+        self._versions = {}
+        # Кому сообщать об изменениях: callback(тип задачи или None - все типы)
+        self._change_listeners = []
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def version(self, task_type: str) -> int:
+        return self._versions.get(task_type, 0)
+
+    def get(self, task_type: str):
+        if task_type in self._tasks:
+            self.hits += 1
+            return self._tasks[task_type]
+        self.misses += 1
+        return MISSING
+
+    def set(self, task_type: str, tasks: list, version: int):
+        """Сохраняет список, если пока его читали из базы, задачи этого типа не менялись"""
+        if self.listening and version == self.version(task_type):
+            self._tasks[task_type] = tasks
+
+    def invalidate(self, task_type: str = None):
+        """Сбрасывает список задач одного типа или всю доску (task_type=None)"""
+        for key in [task_type] if task_type else list(set(self._versions) | set(self._tasks)):
+            self._versions[key] = self.version(key) + 1
+            self._tasks.pop(key, None)
+        self.invalidations += 1
+
+    def add_change_listener(self, callback):
+        self._change_listeners.append(callback)
+
+    def _changed(self, task_type=None):
+        for callback in self._change_listeners:
+            callback(task_type)
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self.invalidate(payload)
+        self._changed(payload)
+
+    async def listen(self, connect):
+        """Подписка на изменения задач; connect - корутина, открывающая отдельное соединение.
+        Переподключается при обрыве, останавливается отменой задачи."""
+        while True:
+            connection = None
+            terminated = asyncio.Event()
+            try:
+                connection = await connect()
+                connection.add_termination_listener(lambda _: terminated.set())
+                await connection.add_listener(TASK_CHANNEL, self._on_notify)
+                # Пока подписки не было, изменения могли пройти мимо
+                self.invalidate()
+                self.listening = True
+                self._changed()
+                print("Доска задач подписана на изменения.")
+                while not terminated.is_set():
+                    try:
+                        await asyncio.wait_for(terminated.wait(), KEEPALIVE_INTERVAL)
+                    except asyncio.TimeoutError:
+                        await connection.execute("SELECT 1", timeout=10)
+                print("Соединение подписки доски задач закрыто.")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Ошибка подписки доски задач: {e}")
+            finally:
+                self.listening = False
+                self.invalidate()
+                if connection and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(LISTEN_RETRY_DELAY)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "listening": self.listening,
+            "types": len(self._tasks),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,191 @@
+"""Загрузка задач из файла Excel (.xlsx) или CSV.
+
+Файл проверяется целиком (pandas, по столбцам, без цикла по строкам): если
+в какой-либо строке ошибка, ничего не загружается, администратор получает список
+ошибок. Проверенные строки копируются в базу через COPY во временную таблицу
+и одним запросом переносятся в tasks. Исполнители получают одно сообщение
+со всеми новыми задачами своего типа, а не по сообщению на задачу.
+"""
+import io
+from datetime import date
+
+import pandas as pd
+
+import database
+
+# Столбцы файла: заголовок -> поле задачи
+COLUMNS = {
+    "Тип": "task_type",
+    "Дата": "assignment_date",
+    "Время": "assignment_time",
+    "Описание": "description",
+    "Адрес": "main_address",
+    "Доп. адрес": "additional_address",
+    "Кол-во человек": "required_workers",
+    "Оплата": "worker_price",
+}
+OPTIONAL_COLUMNS = {"Доп. адрес"}
+TASK_TYPES = ("Погрузка", "Доставка")
+
+IMPORT_MAX_ROWS = 500
+IMPORT_MAX_SIZE = 5 * 1024 * 1024  # байт
+# Сколько ошибок показывать администратору
+MAX_ERRORS_SHOWN = 20
+
+IMPORT_TEMPLATE = (
+    "Отправьте файл .xlsx или .csv со столбцами:\n"
+    + "\n".join(f"• {column}" for column in COLUMNS)
+    + "\n\nТип - Погрузка или Доставка, дата - ДД.ММ.ГГГГ, время - ЧЧ:ММ, "
+      f"доп. адрес можно не заполнять. Не больше {IMPORT_MAX_ROWS} задач в файле."
+)
+
+
+def read_file(content: bytes, filename: str) -> pd.DataFrame:
+    """Читает таблицу как строки; ValueError, если формат не поддерживается"""
+    name = filename.lower()
+    if name.endswith(".xlsx"):
+        frame = pd.read_excel(io.BytesIO(content), dtype=str)
+    elif name.endswith(".csv"):
+        # Excel сохраняет CSV с разделителем ";", другие программы - с ","
+        frame = pd.read_csv(io.BytesIO(content), dtype=str, sep=None, engine="python", encoding="utf-8-sig")
+    else:
+        raise ValueError("Поддерживаются только файлы .xlsx и .csv")
+    frame.columns = [str(column).strip() for column in frame.columns]
+    return frame.dropna(how="all")
+
+
+def _parse_dates(values: pd.Series) -> pd.Series:
+    # Ячейки-даты Excel приходят как "2025-06-01 00:00:00", набранные вручную - как "01.06.2025"
+    parsed = pd.to_datetime(values, format="%d.%m.%Y", errors="coerce")
+    return parsed.fillna(pd.to_datetime(values, format="ISO8601", errors="coerce")).dt.date
+
+
+def _parse_times(values: pd.Series) -> pd.Series:
+    parsed = pd.to_datetime(values, format="%H:%M", errors="coerce")
+    return parsed.fillna(pd.to_datetime(values, format="%H:%M:%S", errors="coerce")).dt.time
+
+
+def validate(frame: pd.DataFrame):
+    """
+    Проверяет и приводит типы всех строк.
+    :return: (DataFrame с полями задачи, список ошибок "Строка N: ...")
+    """
+    missing = [column for column in COLUMNS if column not in frame.columns and column not in OPTIONAL_COLUMNS]
+    if missing:
+        return None, [f"Нет столбцов: {', '.join(missing)}"]
+    if frame.empty:
+        return None, ["В файле нет задач"]
+    if len(frame) > IMPORT_MAX_ROWS:
+        return None, [f"Слишком много задач: {len(frame)}, можно не больше {IMPORT_MAX_ROWS}"]
+
+    frame = frame.reindex(columns=list(COLUMNS)).rename(columns=COLUMNS)
+    text = frame.fillna("").apply(lambda column: column.str.strip())
+    # Номер строки в файле: заголовок - первая строка
+    text.index = frame.index + 2
+
+    tasks = pd.DataFrame(index=text.index)
+    tasks["task_type"] = text["task_type"].str.capitalize()
+    tasks["assignment_date"] = _parse_dates(text["assignment_date"])
+    tasks["assignment_time"] = _parse_times(text["assignment_time"])
+    tasks["description"] = text["description"]
+    tasks["main_address"] = text["main_address"]
+    tasks["additional_address"] = text["additional_address"].mask(
+        text["additional_address"].str.lower().isin(["", "нет"])
+    )
+    tasks["required_workers"] = pd.to_numeric(text["required_workers"], errors="coerce")
+    tasks["worker_price"] = pd.to_numeric(text["worker_price"].str.replace(",", ".", regex=False), errors="coerce")
+
+    checks = [
+        (~tasks["task_type"].isin(TASK_TYPES), "тип должен быть Погрузка или Доставка"),
+        (tasks["assignment_date"].isna(), "дата в формате ДД.ММ.ГГГГ"),
+        (tasks["assignment_date"].fillna(date.max) < date.today(), "дата уже прошла"),
+        (tasks["assignment_time"].isna(), "время в формате ЧЧ:ММ"),
+        (text["description"].str.len() < 10, "описание короче 10 символов"),
+        (text["main_address"].str.len() < 5, "адрес слишком короткий"),
+        (text["main_address"].str.len() > 200, "адрес длиннее 200 символов"),
+        (text["additional_address"].str.len() > 200, "доп. адрес длиннее 200 символов"),
+        (~(tasks["required_workers"] >= 1) | (tasks["required_workers"] % 1 != 0),
+         "кол-во человек - целое число от 1"),
+        (~(tasks["worker_price"] > 0) | (tasks["worker_price"] >= 10 ** 8), "оплата - положительное число"),
+    ]
+    problems = pd.concat(
+        [mask.map({True: message, False: None}).rename(message) for mask, message in checks], axis=1
+    )
+    errors = [
+        f"Строка {row}: {', '.join(messages.dropna())}"
+        for row, messages in problems[problems.notna().any(axis=1)].iterrows()
+    ]
+    if errors:
+        return None, errors
+
+    tasks["required_workers"] = tasks["required_workers"].astype(int)
+    return tasks, []
+
+
+def digest(tasks: list):
+    """Одно сообщение с новыми задачами (не длиннее MESSAGE_LIMIT); None, если задач нет"""
+    if not tasks:
+        return None
+    header = f"📌 Новые задачи: {len(tasks)}"
+    footer = "\n\nПодробности - «Список активных заказов 📋», взять задачу - «Взять заказ ➡️»"
+    # Запас под строку "... и еще N"
+    budget = database.MESSAGE_LIMIT - len(header) - len(footer) - 30
+    lines = []
+    for task in tasks:
+        line = database.format_task_line(task)
+        if len(line) + 1 > budget:
+            lines.append(f"... и еще {len(tasks) - len(lines)}")
+            break
+        lines.append(line)
+        budget -= len(line) + 1
+    return header + "\n" + "\n".join(lines) + footer
+
+
+async def import_tasks(tasks: pd.DataFrame) -> list:
+    """
+    Создает задачи одной транзакцией и ставит в очередь по одному сообщению каждому
+    активному исполнителю. Возвращает созданные задачи.
+    """
+    columns = list(COLUMNS.values())
+    # object - чтобы в COPY ушли int/float Python, а не типы numpy; пропуски - NULL
+    values = tasks[columns].astype(object)
+    records = list(values.where(values.notna(), None).itertuples(index=False, name=None))
+
+    async with database.pool.acquire() as conn:
+        async with conn.transaction():
+            await conn.execute("""
+                CREATE TEMP TABLE tasks_import (
+                    task_type VARCHAR(20),
+                    assignment_date DATE,
+                    assignment_time TIME,
+                    description TEXT,
+                    main_address VARCHAR(200),
+                    additional_address VARCHAR(200),
+                    required_workers INT,
+                    worker_price NUMERIC(10, 2)
+                ) ON COMMIT DROP
+            """)
+            await conn.copy_records_to_table("tasks_import", records=records, columns=columns)
+            created = await conn.fetch(f"""
+                INSERT INTO tasks ({', '.join(columns)}, task_status)
+                SELECT {', '.join(columns)}, 'Назначена' FROM tasks_import
+                RETURNING id_tasks, {', '.join(columns)}
+            """)
+            created = sorted(created, key=lambda task: task['id_tasks'])
+
+            loader_tasks = [task for task in created if task['task_type'] == 'Погрузка']
+            driver_tasks = [task for task in created if task['task_type'] == 'Доставка']
+            # Исполнителям с обеими ролями - все задачи
+            await conn.execute("""
+                INSERT INTO notification_outbox (chat_id, text)
+                SELECT id_user_telegram,
+                       CASE
+                           WHEN is_loader AND is_driver THEN $3
+                           WHEN is_loader THEN $1
+                           ELSE $2
+                       END
+                FROM users
+                WHERE status = 'Активный'
+                  AND ((is_loader AND $1::text IS NOT NULL) OR (is_driver AND $2::text IS NOT NULL))
+            """, digest(loader_tasks), digest(driver_tasks), digest(created))
+    return created
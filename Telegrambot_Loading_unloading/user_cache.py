@@ -0,0 +1,50 @@
+import time
+
+# Отличает "нет в кэше" от закэшированного None (пользователя нет в базе)
+MISSING = object()
+
+
+class UserCache:
+    """Кэш статуса и ролей пользователей в памяти процесса.
+
+    Запись живет ttl секунд; функции, меняющие статус или роли, сбрасывают ее сразу.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, user_id):
+        entry = self._entries.get(user_id)
+        if entry and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+        if entry:
+            del self._entries[user_id]
+        self.misses += 1
+        return MISSING
+
+    def set(self, user_id, value):
+        if self.ttl > 0:
+            self._entries[user_id] = (time.monotonic() + self.ttl, value)
+
+    def invalidate(self, user_id=None):
+        """Сбрасывает запись пользователя или весь кэш (user_id=None)"""
+        if user_id is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(user_id, None)
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "invalidations": self.invalidations,
+        }